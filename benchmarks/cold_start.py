@@ -0,0 +1,142 @@
+"""
+Cold-start profile for the API.
+
+Starts fresh interpreters that import `main` and serve one GET /api/health
+straight through the ASGI app, then reports import time, first-response time
+and the heaviest imports (from `python -X importtime`). Exits 1 when the
+median import + first response exceeds the target, so it can gate CI.
+
+Target: COLD_START_TARGET_MS (default 1000 ms) for import + first /api/health.
+Heavy dependencies (langgraph, moviepy, openai, google.generativeai, edge_tts,
+playwright) must stay off this path; they load on the first workflow or via
+POST /api/warmup.
+
+Usage (from the repo root):
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 10 --target-ms 800 --output benchmarks/results/cold_start.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("agents", "langgraph", "moviepy", "openai", "google.generativeai", "edge_tts", "playwright")
+
+CHILD = r"""
+import sys, time, json, asyncio
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+
+async def health():
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "path": "/api/health", "raw_path": b"/api/health", "query_string": b"", "headers": [],
+        "scheme": "http", "server": ("cold-start", 80), "client": ("127.0.0.1", 1), "root_path": "",
+    }
+    await main.app(scope, receive, send)
+    return messages[0]["status"]
+
+status = asyncio.run(health())
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_response_ms": (t2 - t1) * 1000,
+    "status": status,
+    "heavy_loaded": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_PATH", os.path.join(tempfile.gettempdir(), "asm_cold_start.db"))
+    env.pop("WARMUP_ON_STARTUP", None)
+    return env
+
+def measure_once() -> Dict:
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + CHILD
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=_child_env(), capture_output=True, text=True)
+    process_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"cold start child failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = process_ms
+    return result
+
+def import_offenders(limit: int = 15) -> List[Dict]:
+    """Top-level imports of `main` ranked by cumulative import time."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=REPO_ROOT, env=_child_env(), capture_output=True, text=True)
+    offenders, pending = [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        # Children are printed before their parent, indented two spaces per level
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            pending.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+        elif depth == 0:
+            if name.strip() == "main":
+                offenders = pending
+            pending = []
+    return sorted(offenders, key=lambda o: o["cumulative_ms"], reverse=True)[:limit]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API cold start (import main + first /api/health).")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=float(os.environ.get("COLD_START_TARGET_MS", "1000")))
+    parser.add_argument("--output", default=None, help="Optional JSON output path")
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.runs)]
+    cold = [r["import_ms"] + r["first_response_ms"] for r in runs]
+    report = {
+        "benchmark": "cold_start",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target_ms": args.target_ms,
+        "runs": args.runs,
+        "import_ms_median": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "first_response_ms_median": round(statistics.median(r["first_response_ms"] for r in runs), 1),
+        "cold_start_ms_median": round(statistics.median(cold), 1),
+        "cold_start_ms_max": round(max(cold), 1),
+        "process_ms_median": round(statistics.median(r["process_ms"] for r in runs), 1),
+        "health_status": runs[-1]["status"],
+        "heavy_modules_loaded": sorted({m for r in runs for m in r["heavy_loaded"]}),
+        "top_imports": import_offenders(),
+    }
+    report["within_target"] = report["cold_start_ms_median"] <= args.target_ms and report["health_status"] == 200
+
+    print(f"import main:        {report['import_ms_median']} ms (median of {args.runs})")
+    print(f"first /api/health:  {report['first_response_ms_median']} ms")
+    print(f"cold start:         {report['cold_start_ms_median']} ms (target {args.target_ms:.0f} ms)")
+    print(f"whole process:      {report['process_ms_median']} ms (includes interpreter start)")
+    if report["heavy_modules_loaded"]:
+        print(f"Heavy modules on the health path: {', '.join(report['heavy_modules_loaded'])}")
+    print("Heaviest imports:")
+    for offender in report["top_imports"][:8]:
+        print(f"  {offender['cumulative_ms']:>8} ms  {offender['module']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if not report["within_target"]:
+        print("Cold start is over target.")
+        sys.exit(1)
+    return report
+
+if __name__ == "__main__":
+    main()
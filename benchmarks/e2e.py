@@ -0,0 +1,305 @@
+"""
+Offline end-to-end benchmark.
+
+Runs complete workflows against deterministic stub providers (see
+stub_providers.py) at several concurrency levels, either straight through
+`app_graph` or through the FastAPI app, and writes a JSON baseline with
+per-stage and end-to-end p50/p95, CPU utilization and peak RSS.
+
+Usage (from the repo root):
+    python -m benchmarks.e2e
+    python -m benchmarks.e2e --mode api --levels 1,4,16 --output benchmarks/results/baseline.json
+    python -m benchmarks.e2e --latency image=3,tts=1 --scenes 3
+
+Nothing leaves the machine; assets and the SQLite database live in a temp
+directory that is removed afterwards (pass --keep to inspect it).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROVIDER_KEYS = ("GOOGLE_API_KEY", "GEMINI_API_KEY", "ELEVENLABS_API_KEY", "OTEL_EXPORTER_OTLP_ENDPOINT")
+RATE_LIMITED = ("openai_images", "openai_tts", "openai_chat", "gemini", "elevenlabs_tts", "elevenlabs_sound")
+FINAL_STATUSES = ("READY_FOR_APPROVAL", "PENDING_APPROVAL", "ERROR")
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summarize(values: List[float]) -> Dict:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 4) if values else None,
+        "p95": round(percentile(values, 95), 4) if values else None,
+        "max": round(max(values), 4) if values else None,
+    }
+
+class RssSampler:
+    """
+    Samples the resident set of this process plus all descendants (scene render
+    workers, ffmpeg) from /proc. Falls back to ru_maxrss where /proc is missing.
+    """
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak_bytes = 0
+        self.peak_self_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _rss(self, pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def _descendants(self) -> List[int]:
+        parents: Dict[int, List[int]] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            parents.setdefault(ppid, []).append(int(entry))
+        found, frontier = [], [os.getpid()]
+        while frontier:
+            children = parents.get(frontier.pop(), [])
+            found.extend(children)
+            frontier.extend(children)
+        return found
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            own = self._rss(os.getpid())
+            total = own + sum(self._rss(pid) for pid in self._descendants())
+            self.peak_self_bytes = max(self.peak_self_bytes, own)
+            self.peak_bytes = max(self.peak_bytes, total)
+
+    def __enter__(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if not self.peak_self_bytes:
+            # ru_maxrss is KiB on Linux, bytes on macOS; lifetime high-water mark only
+            scale = 1 if sys.platform == "darwin" else 1024
+            self.peak_self_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+            self.peak_bytes = self.peak_self_bytes
+
+def cpu_seconds() -> float:
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime
+
+async def _wait_for_post(db, post_id: str, timeout: float) -> str:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        post = db.get_post(post_id)
+        if post and post.get("status") in FINAL_STATUSES:
+            return post["status"]
+        await asyncio.sleep(0.1)
+    return "TIMEOUT"
+
+async def _run_graph_workflow(index: int, level: int, timeout: float) -> Dict:
+    from agents import app_graph
+    from tools.checkpointer import workflow_config
+    from database import db
+    from models import PostRecord
+    from tools.tracing import tracer
+
+    topic = f"benchmark-{level}-{index}"
+    post_id = db.save_post(PostRecord(topic=topic, trend_source_url="", status="INITIALIZING"))["id"]
+    state = {
+        "topic": topic, "tone": "Professional", "duration": 15, "platform": "TikTok", "use_captions": True,
+        "trends": [], "selected_trend": None, "analysis": None, "draft": None, "post_id": post_id,
+        "voice_path": None, "music_path": None, "video_path": None, "scene_video_paths": [], "error": None,
+    }
+    started = time.perf_counter()
+    try:
+        with tracer.start_trace(post_id, topic=topic):
+            result = await asyncio.wait_for(app_graph.ainvoke(state, workflow_config(post_id)), timeout=timeout)
+        status = "ERROR" if result.get("error") else "READY_FOR_APPROVAL"
+    except asyncio.TimeoutError:
+        status = "TIMEOUT"
+    except Exception as e:
+        print(f"Benchmark workflow {post_id} failed: {e}")
+        status = "ERROR"
+    return {"post_id": post_id, "status": status, "seconds": time.perf_counter() - started}
+
+async def _run_api_workflow(client, index: int, level: int, timeout: float) -> Dict:
+    from database import db
+
+    topic = f"benchmark-{level}-{index}"
+    started = time.perf_counter()
+    response = await client.post("/api/run-workflow", json={"topic": topic, "duration": 15})
+    if response.status_code != 200:
+        return {"post_id": None, "status": f"HTTP_{response.status_code}", "seconds": time.perf_counter() - started}
+    post_id = str(response.json()["post_id"])
+    status = await _wait_for_post(db, post_id, timeout)
+    # The trace is written when _run_agent leaves its span, just after the status flips
+    await asyncio.sleep(0.2)
+    return {"post_id": post_id, "status": status, "seconds": time.perf_counter() - started}
+
+def _stage_durations(post_ids: List[str]) -> Dict[str, List[float]]:
+    from database import db
+
+    durations: Dict[str, List[float]] = {}
+    for post_id in post_ids:
+        if not post_id:
+            continue
+        for span in db.get_trace(post_id)["spans"]:
+            if span["end_time"] is None:
+                continue
+            durations.setdefault(span["name"], []).append(span["end_time"] - span["start_time"])
+    return durations
+
+async def run_level(level: int, mode: str, timeout: float) -> Dict:
+    from tools.scene_pipeline import scene_pipeline
+
+    print(f"=== Benchmark: {level} concurrent workflow(s) via {mode} ===")
+    cpu_before = cpu_seconds()
+    started = time.perf_counter()
+    with RssSampler() as rss:
+        if mode == "api":
+            import httpx
+            import main
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                runs = await asyncio.gather(*[_run_api_workflow(client, i, level, timeout) for i in range(level)])
+        else:
+            runs = await asyncio.gather(*[_run_graph_workflow(i, level, timeout) for i in range(level)])
+        # Reap the render workers so their CPU time lands in RUSAGE_CHILDREN
+        if scene_pipeline._executor is not None:
+            scene_pipeline._executor.shutdown(wait=True)
+            scene_pipeline._executor = None
+    wall = time.perf_counter() - started
+    cpu = cpu_seconds() - cpu_before
+    cores = os.cpu_count() or 1
+
+    stages = {name: summarize(values) for name, values in sorted(_stage_durations([r["post_id"] for r in runs]).items())}
+    statuses: Dict[str, int] = {}
+    for run in runs:
+        statuses[run["status"]] = statuses.get(run["status"], 0) + 1
+    return {
+        "concurrency": level,
+        "wall_seconds": round(wall, 3),
+        "throughput_per_minute": round(level * 60.0 / wall, 3) if wall else None,
+        "end_to_end": summarize([r["seconds"] for r in runs]),
+        "stages": stages,
+        "statuses": statuses,
+        "cpu_seconds": round(cpu, 3),
+        "cpu_utilization": round(cpu / (wall * cores), 4) if wall else None,
+        "peak_rss_mb": round(rss.peak_bytes / 1048576, 1),
+        "peak_rss_main_mb": round(rss.peak_self_bytes / 1048576, 1),
+    }
+
+def _parse_latency(value: str) -> Dict[str, float]:
+    latency = {}
+    for part in filter(None, value.split(",")):
+        key, _, seconds = part.partition("=")
+        latency[key.strip()] = float(seconds)
+    return latency
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end workflow benchmark with stub providers.")
+    parser.add_argument("--mode", choices=("graph", "api"), default="graph", help="Drive app_graph directly or POST /api/run-workflow")
+    parser.add_argument("--levels", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency", default="", help="Stub latency overrides, e.g. image=2,tts=0.5 (kinds: chat, sanitize, image, download, tts, music, scrape)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Relative latency jitter (seeded)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--scenes", type=int, default=2)
+    parser.add_argument("--scene-duration", type=float, default=1.5)
+    parser.add_argument("--voice-seconds", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=900.0, help="Per-workflow timeout in seconds")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep production provider budgets instead of lifting them")
+    parser.add_argument("--output", default=None, help="JSON output path (default benchmarks/results/e2e_<mode>_<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temp working directory")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results", f"e2e_{args.mode}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    output = os.path.abspath(output)
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    # Isolate the run: no real keys, throwaway DB and asset directories
+    for key in PROVIDER_KEYS:
+        os.environ.pop(key, None)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    if not args.keep_rate_limits:
+        for provider in RATE_LIMITED:
+            os.environ[f"RATE_LIMIT_{provider.upper()}"] = "rpm:0,tpm:0,concurrency:0"
+    workdir = tempfile.mkdtemp(prefix="asm_bench_")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    os.makedirs(os.path.join(workdir, "frontend", "assets"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "local_assets", "music"), exist_ok=True)
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+
+    from benchmarks.stub_providers import StubConfig, install
+    import agents  # noqa: F401 - singletons must exist before install()
+    if args.mode == "api":
+        import main as _app  # noqa: F401
+
+    config = StubConfig(
+        latency=_parse_latency(args.latency), jitter=args.jitter, seed=args.seed, scenes=args.scenes,
+        scene_duration=args.scene_duration, voice_seconds=args.voice_seconds,
+    )
+    stub_calls = install(config)
+
+    results = []
+    try:
+        for level in levels:
+            results.append(asyncio.run(run_level(level, args.mode, args.timeout)))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "e2e",
+        "mode": args.mode,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+        "stub_config": config.to_dict(),
+        "rate_limits": "production" if args.keep_rate_limits else "lifted",
+        "stub_calls": stub_calls.calls,
+        "levels": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n=== Benchmark Summary ===")
+    for level in results:
+        e2e = level["end_to_end"]
+        print(
+            f"{level['concurrency']:>3} concurrent | e2e p50 {e2e['p50']}s p95 {e2e['p95']}s | "
+            f"{level['throughput_per_minute']}/min | CPU {level['cpu_utilization']:.0%} | "
+            f"peak RSS {level['peak_rss_mb']} MB | {level['statuses']}"
+        )
+    print(f"Baseline written to {output}")
+    return report
+
+if __name__ == "__main__":
+    main()
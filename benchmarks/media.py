@@ -0,0 +1,284 @@
+"""
+Micro-benchmarks for the CPU-bound media kernels.
+
+Kernels (synthetic inputs only: fixed images, sine tones):
+  - video:    CinematicVideoGenerator.generate_video (Ken Burns encode), both aspect ratios
+  - assemble: CharacterAnimator.assemble_multi_scene_video, varied scene counts and durations
+  - mix:      CharacterAnimator.mix_background_music rendered to AAC
+
+Every run is appended to a JSON-lines history file; `compare` diffs two runs
+and exits non-zero when any case slowed down beyond the threshold.
+
+Usage (from the repo root):
+    python -m benchmarks.media run                  # full grid, 3 repeats
+    python -m benchmarks.media run --quick          # smallest case per kernel, 1 repeat
+    python -m benchmarks.media run --kernels video --compare
+    python -m benchmarks.media compare              # latest run vs the one before it
+    python -m benchmarks.media compare --baseline 20240101_120000 --threshold 0.10
+    python -m benchmarks.media history
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_HISTORY = os.path.join(REPO_ROOT, "benchmarks", "results", "media_history.jsonl")
+
+# name -> parameters. The first case of each kernel is the --quick set.
+CASES = {
+    "video": [
+        {"aspect_ratio": "9:16", "duration": 1.0},
+        {"aspect_ratio": "16:9", "duration": 1.0},
+        {"aspect_ratio": "9:16", "duration": 3.0},
+        {"aspect_ratio": "16:9", "duration": 3.0},
+    ],
+    "assemble": [
+        {"scenes": 2, "scene_duration": 1.5, "music": True},
+        {"scenes": 4, "scene_duration": 1.5, "music": True},
+        {"scenes": 2, "scene_duration": 4.0, "music": True},
+        {"scenes": 4, "scene_duration": 1.5, "music": False},
+    ],
+    "mix": [
+        {"voice_seconds": 10.0, "music_seconds": 4.0},
+        {"voice_seconds": 30.0, "music_seconds": 4.0},
+        {"voice_seconds": 30.0, "music_seconds": 45.0},
+    ],
+}
+
+def case_id(kernel: str, params: Dict) -> str:
+    return kernel + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+def _cpu_seconds() -> float:
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime
+
+class Fixtures:
+    """Synthetic inputs, created once per run and shared across repeats."""
+    def __init__(self, workdir: str):
+        from benchmarks.stub_providers import fixed_image, synthetic_wav
+        self.workdir = workdir
+        self._fixed_image = fixed_image
+        self._synthetic_wav = synthetic_wav
+        self._cache: Dict[str, str] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.workdir, name)
+
+    def image(self, size: int = 1024) -> str:
+        key = f"image_{size}.png"
+        if key not in self._cache:
+            with open(self._path(key), "wb") as f:
+                f.write(self._fixed_image("benchmark", size))
+            self._cache[key] = self._path(key)
+        return self._cache[key]
+
+    def tone(self, seconds: float, frequency: float = 220.0) -> str:
+        key = f"tone_{seconds}_{frequency}.wav"
+        if key not in self._cache:
+            with open(self._path(key), "wb") as f:
+                f.write(self._synthetic_wav(seconds, frequency=frequency))
+            self._cache[key] = self._path(key)
+        return self._cache[key]
+
+    def scene_clip(self, index: int, duration: float) -> str:
+        """Pre-rendered 9:16 scene, produced by the real encoder (untimed)."""
+        key = f"scene_{index}_{duration}.mp4"
+        if key not in self._cache:
+            from tools.video_gen import video_generator
+            video_generator.generate_video(self.image(), self._path(key), duration=duration, aspect_ratio="9:16", seed=index)
+            self._cache[key] = self._path(key)
+        return self._cache[key]
+
+def _bench_video(fixtures: Fixtures, params: Dict, output: str):
+    from tools.video_gen import video_generator
+    path = video_generator.generate_video(fixtures.image(), output + ".mp4", duration=params["duration"], aspect_ratio=params["aspect_ratio"], seed=0)
+    return {"ok": bool(path), "frames": params["duration"] * 24}
+
+def _bench_assemble(fixtures: Fixtures, params: Dict, output: str):
+    from tools.animator import CharacterAnimator
+    clips = [fixtures.scene_clip(i, params["scene_duration"]) for i in range(params["scenes"])]
+    total = params["scenes"] * params["scene_duration"] - 0.5 * (params["scenes"] - 1)
+    voice = fixtures.tone(round(total, 2))
+    music = fixtures.tone(4.0, frequency=330.0) if params["music"] else None
+    animator = CharacterAnimator(output_dir=os.path.dirname(output))
+    report = {}
+    path = animator.assemble_multi_scene_video(clips, voice, os.path.basename(output) + ".mp4", music_path=music, report=report)
+    return {"ok": bool(path), "frames": total * 24, "peak_mb": report.get("peak_mb")}
+
+def _bench_mix(fixtures: Fixtures, params: Dict, output: str):
+    from moviepy import AudioFileClip
+    from tools.animator import CharacterAnimator
+    voice = AudioFileClip(fixtures.tone(params["voice_seconds"]))
+    music = fixtures.tone(params["music_seconds"], frequency=330.0)
+    try:
+        mixed = CharacterAnimator(output_dir=os.path.dirname(output)).mix_background_music(voice, music, voice.duration)
+        mixed.write_audiofile(output + ".m4a", fps=44100, codec="aac", logger=None)
+        ok = mixed is not voice
+    finally:
+        voice.close()
+    return {"ok": ok, "audio_seconds": params["voice_seconds"]}
+
+KERNELS = {"video": _bench_video, "assemble": _bench_assemble, "mix": _bench_mix}
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def run(kernels: List[str], repeats: int, quick: bool, history: str, note: str = "") -> Dict:
+    import moviepy
+
+    workdir = tempfile.mkdtemp(prefix="asm_media_bench_")
+    fixtures = Fixtures(workdir)
+    results = {}
+    try:
+        for kernel in kernels:
+            cases = CASES[kernel][:1] if quick else CASES[kernel]
+            for params in cases:
+                name = case_id(kernel, params)
+                walls, cpus, extra = [], [], {}
+                for attempt in range(repeats):
+                    output = os.path.join(workdir, f"out_{kernel}_{attempt}")
+                    # Fixtures are built outside the timed region
+                    if kernel == "assemble":
+                        for i in range(params["scenes"]):
+                            fixtures.scene_clip(i, params["scene_duration"])
+                    cpu_before = _cpu_seconds()
+                    started = time.perf_counter()
+                    extra = KERNELS[kernel](fixtures, params, output)
+                    walls.append(time.perf_counter() - started)
+                    cpus.append(_cpu_seconds() - cpu_before)
+                    if not extra.get("ok"):
+                        print(f"!!! {name} failed on attempt {attempt + 1}")
+                results[name] = {
+                    "kernel": kernel,
+                    "params": params,
+                    "ok": bool(extra.get("ok")),
+                    "repeats": repeats,
+                    "median_seconds": round(statistics.median(walls), 4),
+                    "min_seconds": round(min(walls), 4),
+                    "runs_seconds": [round(w, 4) for w in walls],
+                    "cpu_seconds": round(statistics.median(cpus), 4),
+                }
+                if "frames" in extra:
+                    results[name]["fps"] = round(extra["frames"] / statistics.median(walls), 2)
+                print(f"{name}: median {results[name]['median_seconds']}s (min {results[name]['min_seconds']}s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    record = {
+        "run_id": time.strftime("%Y%m%d_%H%M%S"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "note": note,
+        "quick": quick,
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count(), "moviepy": moviepy.__version__},
+        "cases": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(history)), exist_ok=True)
+    with open(history, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Appended run {record['run_id']} to {history}")
+    return record
+
+def load_history(history: str) -> List[Dict]:
+    if not os.path.exists(history):
+        return []
+    with open(history) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _pick(runs: List[Dict], ref: Optional[str], default_index: int) -> Optional[Dict]:
+    if ref is None:
+        return runs[default_index] if len(runs) >= abs(default_index) else None
+    for run_record in runs:
+        if run_record["run_id"] == ref or run_record.get("commit") == ref:
+            return run_record
+    return None
+
+def compare(history: str, baseline: Optional[str] = None, candidate: Optional[str] = None, threshold: float = 0.15) -> int:
+    """
+    Compares median wall time per case. Returns the number of regressions,
+    i.e. cases whose candidate median exceeds baseline * (1 + threshold).
+    """
+    runs = load_history(history)
+    new = _pick(runs, candidate, -1)
+    old = _pick([r for r in runs if r is not new], baseline, -1)
+    if not new or not old:
+        print("Need at least two runs in the history to compare.")
+        return 0
+
+    print(f"Baseline {old['run_id']} ({old.get('commit')}) -> candidate {new['run_id']} ({new.get('commit')}), threshold +{threshold:.0%}")
+    if old["host"] != new["host"]:
+        print(f"Note: host differs ({old['host']} vs {new['host']})")
+    regressions = 0
+    for name, result in new["cases"].items():
+        before = old["cases"].get(name)
+        if not before:
+            print(f"  NEW        {name}: {result['median_seconds']}s")
+            continue
+        change = result["median_seconds"] / before["median_seconds"] - 1 if before["median_seconds"] else 0.0
+        if change > threshold or (before["ok"] and not result["ok"]):
+            flag = "REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            flag = "faster"
+        else:
+            flag = "ok"
+        print(f"  {flag:<10} {name}: {before['median_seconds']}s -> {result['median_seconds']}s ({change:+.1%})")
+    print(f"{regressions} regression(s)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Media kernel micro-benchmarks with JSON history and regression gates.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks and append to the history")
+    run_parser.add_argument("--kernels", default=",".join(KERNELS), help="Comma-separated subset of: " + ", ".join(KERNELS))
+    run_parser.add_argument("--repeats", type=int, default=None, help="Repeats per case (default 3, 1 with --quick)")
+    run_parser.add_argument("--quick", action="store_true", help="Only the first case of each kernel")
+    run_parser.add_argument("--note", default="", help="Free-text label stored with the run")
+    run_parser.add_argument("--compare", action="store_true", help="Compare against the previous run afterwards and exit 1 on regression")
+    run_parser.add_argument("--threshold", type=float, default=0.15)
+    run_parser.add_argument("--history", default=DEFAULT_HISTORY)
+
+    compare_parser = sub.add_parser("compare", help="Compare two runs from the history")
+    compare_parser.add_argument("--baseline", default=None, help="run_id or commit (default: the run before the candidate)")
+    compare_parser.add_argument("--candidate", default=None, help="run_id or commit (default: latest)")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown as a fraction (0.15 = 15%%)")
+    compare_parser.add_argument("--history", default=DEFAULT_HISTORY)
+
+    history_parser = sub.add_parser("history", help="List recorded runs")
+    history_parser.add_argument("--history", default=DEFAULT_HISTORY)
+
+    args = parser.parse_args(argv)
+    sys.path.insert(0, REPO_ROOT)
+
+    if args.command == "run":
+        kernels = [k.strip() for k in args.kernels.split(",") if k.strip()]
+        unknown = [k for k in kernels if k not in KERNELS]
+        if unknown:
+            parser.error(f"unknown kernels: {', '.join(unknown)}")
+        repeats = args.repeats or (1 if args.quick else 3)
+        run(kernels, repeats, args.quick, args.history, note=args.note)
+        if args.compare and compare(args.history, threshold=args.threshold):
+            sys.exit(1)
+    elif args.command == "compare":
+        if compare(args.history, args.baseline, args.candidate, args.threshold):
+            sys.exit(1)
+    else:
+        for record in load_history(args.history):
+            print(f"{record['run_id']}  {record.get('commit') or '-':<10} {len(record['cases'])} cases  {record.get('note', '')}")
+
+if __name__ == "__main__":
+    main()
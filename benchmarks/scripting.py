@@ -0,0 +1,101 @@
+"""
+Scripting-phase comparison: two-call (analysis, then draft) vs fused (one
+structured-output request).
+
+Runs the real strategist and creator nodes in each mode and reports, per
+mode, LLM calls, latency and prompt/completion tokens as recorded by
+ContentGenerator.record_script_run. Offline by default against the stub
+providers, whose chat latency is per call (use --latency chat=... to model
+your provider's round trip); --live uses the configured Gemini/OpenAI keys
+and their reported token usage.
+
+Usage (from the repo root):
+    python -m benchmarks.scripting
+    python -m benchmarks.scripting --runs 10 --latency chat=2.5
+    python -m benchmarks.scripting --live --runs 3 --output benchmarks/results/scripting.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+from typing import Dict
+
+from benchmarks.e2e import PROVIDER_KEYS, RATE_LIMITED, REPO_ROOT, _parse_latency
+
+MODES = ("two_call", "fused")
+
+async def _script_once(topic: str) -> Dict:
+    import agents
+    state = {
+        "topic": topic, "tone": "Professional", "duration": 30, "platform": "TikTok",
+        "selected_trend": None, "analysis": None, "draft": None, "post_id": None, "script_run": None,
+    }
+    state.update(await agents.creative_strategist_agent(state))
+    state.update(await agents.content_creator_agent(state))
+    return state
+
+def run(runs: int, modes) -> Dict:
+    from tools.content_gen import generator
+    report = {}
+    for mode in modes:
+        generator.script_mode = mode
+        generator.stats.clear()
+        failures = 0
+        for i in range(runs):
+            state = asyncio.run(_script_once(f"scripting benchmark {i}"))
+            if not state.get("draft") or not state["draft"].visual_scenes:
+                failures += 1
+        stats = generator.script_stats()
+        report[mode] = {"runs": runs, "failures": failures, "by_mode": stats}
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare fused and two-call scripting latency and token cost.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--live", action="store_true", help="Use the real providers from the environment")
+    parser.add_argument("--latency", default="", help="Stub latency overrides, e.g. chat=2")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+    modes = [m for m in args.modes.split(",") if m]
+
+    workdir = tempfile.mkdtemp(prefix="asm_scripting_")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    sys.path.insert(0, REPO_ROOT)
+    try:
+        if not args.live:
+            for key in PROVIDER_KEYS:
+                os.environ.pop(key, None)
+            os.environ["OPENAI_API_KEY"] = "stub"
+            for provider in RATE_LIMITED:
+                os.environ[f"RATE_LIMIT_{provider.upper()}"] = "rpm:0,tpm:0,concurrency:0"
+            from benchmarks.stub_providers import StubConfig, install
+            import agents  # noqa: F401 - singletons must exist before install()
+            install(StubConfig(latency=_parse_latency(args.latency), jitter=0.0))
+        report = {
+            "benchmark": "scripting",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "live": args.live,
+            "modes": run(args.runs, modes),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for mode, result in report["modes"].items():
+        for recorded, stats in result["by_mode"].items():
+            print(
+                f"{mode:>9} -> {recorded:<15} {stats['runs']} runs | {stats['llm_calls_per_run']} LLM calls | "
+                f"{stats['avg_seconds']:.2f}s | {stats['avg_prompt_tokens']:.0f} prompt + {stats['avg_completion_tokens']:.0f} completion tokens"
+            )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return report
+
+if __name__ == "__main__":
+    main()
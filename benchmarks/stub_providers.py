@@ -0,0 +1,242 @@
+import io
+import os
+import json
+import math
+import time
+import wave
+import random
+import struct
+import hashlib
+import threading
+from typing import Dict, Optional
+
+# Deterministic local stand-ins for every external provider the workflow calls.
+# They replace the clients on the module singletons (not the wrapper methods), so
+# rate limiting, routing, hedging, tracing and metrics all run exactly as in
+# production; only the network round trip is swapped for an injectable delay.
+
+DEFAULT_LATENCY = {
+    "chat": 0.8,       # Gemini / OpenAI chat (analysis + draft)
+    "sanitize": 0.3,   # Gemini prompt sanitizer
+    "image": 1.5,      # DALL-E 3 generate
+    "download": 0.1,   # DALL-E image download
+    "tts": 0.6,        # OpenAI tts-1
+    "music": 0.8,      # ElevenLabs sound generation
+    "scrape": 0.5,     # TikTok trend scrape
+}
+
+class StubConfig:
+    """Knobs for the fake providers; latencies are seconds per call."""
+    def __init__(self, latency: Optional[Dict[str, float]] = None, jitter: float = 0.1, seed: int = 7,
+                 scenes: int = 2, scene_duration: float = 1.5, voice_seconds: float = 3.0,
+                 music_seconds: float = 4.0, image_size: int = 512):
+        self.latency = dict(DEFAULT_LATENCY)
+        self.latency.update(latency or {})
+        self.jitter = jitter
+        self.seed = seed
+        self.scenes = scenes
+        self.scene_duration = scene_duration
+        self.voice_seconds = voice_seconds
+        self.music_seconds = music_seconds
+        self.image_size = image_size
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+class _Delay:
+    """Seeded latency injector shared by all stubs (one RNG, serialised)."""
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def __call__(self, kind: str):
+        time.sleep(self._draw(kind))
+
+    def _draw(self, kind: str) -> float:
+        base = self.config.latency.get(kind, 0.0)
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            spread = self._rng.uniform(-self.config.jitter, self.config.jitter) if self.config.jitter else 0.0
+        return max(0.0, base * (1 + spread)) if base > 0 else 0.0
+
+    def stream(self, kind: str, text: str, pieces: int = 12):
+        """Yields `text` in pieces spread evenly over one call's latency (token streaming)."""
+        total = self._draw(kind)
+        size = max(1, -(-len(text) // pieces))
+        for i in range(0, len(text), size):
+            time.sleep(total / pieces)
+            yield text[i:i + size]
+
+def synthetic_wav(seconds: float, frequency: float = 220.0, rate: int = 22050) -> bytes:
+    """Mono 16-bit sine tone. ffmpeg sniffs the container, so .mp3 paths are fine."""
+    buffer = io.BytesIO()
+    frames = int(seconds * rate)
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * frequency * i / rate))) for i in range(frames)
+        ))
+    return buffer.getvalue()
+
+def fixed_image(prompt: str, size: int) -> bytes:
+    """PNG whose colour is derived from the prompt, so reruns are byte-identical."""
+    from PIL import Image, ImageDraw
+    digest = hashlib.sha256(prompt.encode()).digest()
+    image = Image.new("RGB", (size, size), tuple(digest[:3]))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, size, max(1, size // 8)):
+        draw.line([(i, 0), (size - i, size)], fill=tuple(digest[3:6]), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def canned_analysis() -> Dict:
+    return {
+        "hook_technique": "Question Hook",
+        "hook_variations": ["What if it all changed?", "Nobody tells you this.", "Watch to the end."],
+        "emotional_trigger": "Curiosity",
+        "structural_pattern": "Problem - Reveal - Payoff",
+        "target_audience_insight": "Benchmark audience",
+        "virality_score": 7,
+    }
+
+def canned_draft(config: StubConfig) -> Dict:
+    return {
+        "title": "Benchmark Mission",
+        "script": "This is a deterministic benchmark narration. " * 4,
+        "hook_selected": "What if it all changed?",
+        "emotional_payoff": "Clarity",
+        "caption": "#benchmark",
+        "visual_style_description": "Flat colour test card",
+        "visual_prompt": "Test card",
+        "music_mood_prompt": "Calm ambient",
+        "visual_scenes": [
+            {"prompt": f"Benchmark scene {i}", "duration": config.scene_duration, "aspect_ratio": "9:16"}
+            for i in range(config.scenes)
+        ],
+    }
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+def canned_chat(prompt: str, config: StubConfig) -> str:
+    """Fused prompts get analysis + draft, draft prompts a draft, anything else an analysis."""
+    if '"analysis"' in prompt and "visual_scenes" in prompt:
+        return json.dumps({"analysis": canned_analysis(), "draft": canned_draft(config)})
+    return json.dumps(canned_draft(config) if "visual_scenes" in prompt else canned_analysis())
+
+class StubGeminiModel:
+    """Mimics google.generativeai.GenerativeModel.generate_content."""
+    def __init__(self, config: StubConfig, delay: _Delay):
+        self.config = config
+        self.delay = delay
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        prompt = json.dumps(contents) if not isinstance(contents, str) else contents
+        if "Scene Batch:" in contents:
+            self.delay("sanitize")
+            batch = json.loads(contents.split("Scene Batch:")[-1].strip())
+            return _Obj(text=json.dumps(batch))
+        if "Original Prompt:" in prompt:
+            self.delay("sanitize")
+            return _Obj(text=prompt.split("Original Prompt:")[-1].strip(' "]}'))
+        text = canned_chat(prompt, self.config)
+        usage = _Obj(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        if stream:
+            return (_Obj(text=piece, usage_metadata=usage) for piece in self.delay.stream("chat", text))
+        self.delay("chat")
+        return _Obj(text=text, usage_metadata=usage)
+
+class StubOpenAI:
+    """Mimics the parts of the OpenAI client the tools use: chat, images, speech."""
+    def __init__(self, config: StubConfig, delay: _Delay):
+        stub = self
+
+        class _Completions:
+            def create(self, model=None, messages=None, stream=False, **kwargs):
+                prompt = messages[-1]["content"] if messages else ""
+                text = canned_chat(prompt, config)
+                usage = _Obj(prompt_tokens=len(prompt) // 4, completion_tokens=len(text) // 4)
+                if stream:
+                    def chunks():
+                        for piece in delay.stream("chat", text):
+                            yield _Obj(choices=[_Obj(delta=_Obj(content=piece))], usage=None)
+                        yield _Obj(choices=[], usage=usage)
+                    return chunks()
+                delay("chat")
+                return _Obj(choices=[_Obj(message=_Obj(content=text))], usage=usage)
+
+        class _Images:
+            def generate(self, prompt="", **kwargs):
+                delay("image")
+                return _Obj(data=[_Obj(url=f"stub://image/{hashlib.sha1(prompt.encode()).hexdigest()}")])
+
+        class _Speech:
+            def create(self, input="", **kwargs):
+                delay("tts")
+                return _Obj(content=stub.voice_bytes)
+
+        self.chat = _Obj(completions=_Completions())
+        self.images = _Images()
+        self.audio = _Obj(speech=_Speech())
+        self.voice_bytes = synthetic_wav(config.voice_seconds)
+
+class StubRequests:
+    """Stands in for the `requests` module: image downloads and ElevenLabs sound generation."""
+    def __init__(self, config: StubConfig, delay: _Delay):
+        self.config = config
+        self.delay = delay
+        self._music = synthetic_wav(config.music_seconds, frequency=330.0)
+
+    def get(self, url, **kwargs):
+        self.delay("download")
+        return _Obj(status_code=200, content=fixed_image(url, self.config.image_size), text="")
+
+    def post(self, url, **kwargs):
+        self.delay("music")
+        return _Obj(status_code=200, content=self._music, text="")
+
+def install(config: StubConfig) -> _Delay:
+    """
+    Points every provider singleton at the stubs. Call after importing `agents`
+    (and `main`, if driving the API) with provider keys removed from the environment.
+    Returns the latency injector, whose `calls` counts stub calls by kind.
+    """
+    import agents
+    from tools import video_gen, music_gen
+    from tools.content_gen import generator
+    from tools.gemini_director import gemini_director
+    from tools.audio_gen import audio_generator
+    from tools.video_gen import video_generator
+    from tools.music_gen import music_generator
+    from models import TrendData
+
+    delay = _Delay(config)
+    openai_stub = StubOpenAI(config, delay)
+    requests_stub = StubRequests(config, delay)
+
+    # Build the lazy clients first so a later warm_up() cannot replace the stubs
+    for provider in (generator, gemini_director, audio_generator, video_generator):
+        provider.warm_up()
+
+    generator.use_gemini = True
+    generator.model = StubGeminiModel(config, delay)
+    gemini_director.model = StubGeminiModel(config, delay)
+    audio_generator.api_key = "stub"
+    audio_generator.client = openai_stub
+    video_generator.openai_client = openai_stub
+    video_gen.requests = requests_stub
+    music_generator.api_key = "stub"
+    music_gen.requests = requests_stub
+
+    async def fetch_trends(topic, *args, **kwargs):
+        import asyncio
+        await asyncio.to_thread(delay, "scrape")
+        return [TrendData(video_id="stub", description=f"Trend about {topic}", hashtags=["benchmark"], author="stub", url="stub://trend")]
+    agents.fetch_trends = fetch_trends
+    return delay
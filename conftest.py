@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Tests get a throwaway database, never the working one
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="trend-tests-"), "test.db")
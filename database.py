@@ -1,18 +1,35 @@
 import os
 import sqlite3
 import json
+import time
+import functools
 from datetime import datetime
 from dotenv import load_dotenv
 from models import PostRecord, TrendData, ScriptAnalysis, ContentDraft
+from tools.metrics import metrics
 
 load_dotenv()
 
+def timed_query(method):
+    """
+    Records each Database method's latency in the asm_db_query_duration_seconds histogram.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.db_duration.observe(time.perf_counter() - started, method=method.__name__)
+    return wrapper
+
 class Database:
     def __init__(self):
         default_db = "/tmp/database.db" if os.environ.get("VERCEL") else "./prototype_data.db"
         self.db_path = os.environ.get("DATABASE_PATH", default_db)
         self.init_db()
 
+    @timed_query
     def init_db(self):
         """Initialize the SQLite database with the posts table."""
         conn = sqlite3.connect(self.db_path)
@@ -32,9 +49,155 @@ class Database:
                 created_at TEXT
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trace_spans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                post_id TEXT,
+                trace_id TEXT,
+                span_id TEXT,
+                parent_id TEXT,
+                name TEXT,
+                start_time REAL,
+                end_time REAL,
+                status TEXT,
+                attributes TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trace_spans_post ON trace_spans (post_id, trace_id)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                post_id TEXT,
+                created_at REAL,
+                duration REAL,
+                interval REAL,
+                samples INTEGER,
+                stages TEXT,
+                collapsed TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_profiles_post ON profiles (post_id)')
+        # LangGraph checkpoints (tools/checkpointer.py), one thread per post id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS workflow_checkpoints (
+                thread_id TEXT,
+                checkpoint_ns TEXT DEFAULT '',
+                checkpoint_id TEXT,
+                parent_checkpoint_id TEXT,
+                created_at REAL,
+                checkpoint_type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS workflow_checkpoint_writes (
+                thread_id TEXT,
+                checkpoint_ns TEXT DEFAULT '',
+                checkpoint_id TEXT,
+                task_id TEXT,
+                idx INTEGER,
+                channel TEXT,
+                value_type TEXT,
+                value BLOB,
+                task_path TEXT DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS artifact_manifests (
+                post_id TEXT PRIMARY KEY,
+                manifest_hash TEXT,
+                updated_at REAL,
+                manifest TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_index (
+                image_path TEXT PRIMARY KEY,
+                post_id TEXT,
+                prompt TEXT,
+                created_at REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_reuse (
+                post_id TEXT,
+                scene_index INTEGER,
+                image_path TEXT,
+                source_path TEXT,
+                similarity REAL,
+                prompt TEXT,
+                source_prompt TEXT,
+                created_at REAL,
+                PRIMARY KEY (post_id, image_path)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS post_degradations (
+                post_id TEXT,
+                stage TEXT,
+                name TEXT,
+                detail TEXT,
+                created_at REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS batches (
+                id TEXT PRIMARY KEY,
+                status TEXT,
+                concurrency INTEGER,
+                created_at REAL,
+                finished_at REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS batch_items (
+                batch_id TEXT,
+                position INTEGER,
+                run_order INTEGER,
+                group_key TEXT,
+                spec TEXT,
+                post_id TEXT,
+                status TEXT,
+                error TEXT,
+                submitted_at REAL,
+                PRIMARY KEY (batch_id, position)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trend_tags (
+                tag TEXT PRIMARY KEY,
+                seen INTEGER,
+                last_seen REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS speculative_drafts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic_key TEXT,
+                topic TEXT,
+                tone TEXT,
+                duration INTEGER,
+                platform TEXT,
+                source TEXT,
+                status TEXT,
+                analysis TEXT,
+                draft TEXT,
+                images INTEGER,
+                cost_usd REAL,
+                created_at REAL,
+                used_by TEXT,
+                used_at REAL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_speculative_topic ON speculative_drafts (topic_key, tone, duration, platform)')
         conn.commit()
         conn.close()
 
+    @timed_query
     def save_post(self, post: PostRecord):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -55,6 +218,7 @@ class Database:
         
         return {"id": str(post_id), "status": "success"}
 
+    @timed_query
     def check_duplicate_trend(self, video_id: str) -> bool:
         """Check if a trend from this video URL has already been used."""
         conn = sqlite3.connect(self.db_path)
@@ -64,6 +228,7 @@ class Database:
         conn.close()
         return result is not None
 
+    @timed_query
     def update_post_status(self, post_id: str, status: str):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -71,6 +236,7 @@ class Database:
         conn.commit()
         conn.close()
 
+    @timed_query
     def update_post_analysis(self, post_id: str, analysis: ScriptAnalysis):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -78,6 +244,7 @@ class Database:
         conn.commit()
         conn.close()
 
+    @timed_query
     def update_post_draft(self, post_id: str, draft: ContentDraft):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -85,6 +252,7 @@ class Database:
         conn.commit()
         conn.close()
 
+    @timed_query
     def update_post_image(self, post_id: str, image_url: str):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -92,6 +260,7 @@ class Database:
         conn.commit()
         conn.close()
 
+    @timed_query
     def update_post_video(self, post_id: str, video_url: str):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -99,25 +268,402 @@ class Database:
         conn.commit()
         conn.close()
 
+    @timed_query
     def delete_post(self, post_id: str):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+        cursor.execute('DELETE FROM trace_spans WHERE post_id = ?', (str(post_id),))
+        cursor.execute('DELETE FROM profiles WHERE post_id = ?', (str(post_id),))
+        cursor.execute('DELETE FROM artifact_manifests WHERE post_id = ?', (str(post_id),))
+        cursor.execute('DELETE FROM image_reuse WHERE post_id = ?', (str(post_id),))
+        cursor.execute('DELETE FROM post_degradations WHERE post_id = ?', (str(post_id),))
+        cursor.execute("UPDATE batch_items SET post_id = NULL, status = 'DELETED' WHERE post_id = ?", (str(post_id),))
+        cursor.execute('DELETE FROM workflow_checkpoints WHERE thread_id = ?', (str(post_id),))
+        cursor.execute('DELETE FROM workflow_checkpoint_writes WHERE thread_id = ?', (str(post_id),))
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def save_trace_spans(self, post_id: str, spans: list):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO trace_spans (post_id, trace_id, span_id, parent_id, name, start_time, end_time, status, attributes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (str(post_id), s['trace_id'], s['span_id'], s['parent_id'], s['name'], s['start_time'], s['end_time'], s['status'], json.dumps(s['attributes'], default=str))
+            for s in spans
+        ])
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def get_trace(self, post_id: str, trace_id: str = None):
+        """Spans of the given trace, or of the post's most recent run, ordered by start time."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        if trace_id is None:
+            cursor.execute('SELECT trace_id FROM trace_spans WHERE post_id = ? ORDER BY start_time DESC LIMIT 1', (str(post_id),))
+            row = cursor.fetchone()
+            trace_id = row['trace_id'] if row else None
+        cursor.execute('SELECT * FROM trace_spans WHERE post_id = ? AND trace_id = ? ORDER BY start_time', (str(post_id), trace_id))
+        rows = cursor.fetchall()
+        cursor.execute('SELECT DISTINCT trace_id FROM trace_spans WHERE post_id = ?', (str(post_id),))
+        trace_ids = [r['trace_id'] for r in cursor.fetchall()]
+        conn.close()
+
+        spans = []
+        for row in rows:
+            span = dict(row)
+            del span['id']
+            try:
+                span['attributes'] = json.loads(span['attributes']) if span['attributes'] else {}
+            except:
+                span['attributes'] = {}
+            spans.append(span)
+        return {"post_id": str(post_id), "trace_id": trace_id, "trace_ids": trace_ids, "spans": spans}
+
+    @timed_query
+    def save_profile(self, post_id: str, profile: dict):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO profiles (post_id, created_at, duration, interval, samples, stages, collapsed)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            str(post_id), profile['created_at'], profile['duration'], profile['interval'],
+            profile['samples'], json.dumps(profile['stages'], default=str), profile['collapsed']
+        ))
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def get_profile(self, post_id: str, include_stacks: bool = False):
+        """The post's most recent profile, or None. Collapsed stacks only when asked for."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM profiles WHERE post_id = ? ORDER BY created_at DESC LIMIT 1', (str(post_id),))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+        profile = dict(row)
+        del profile['id']
+        profile['stages'] = json.loads(profile['stages']) if profile['stages'] else []
+        if not include_stacks:
+            del profile['collapsed']
+        return profile
+
+    @timed_query
+    def save_manifest(self, post_id: str, manifest: dict):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO artifact_manifests (post_id, manifest_hash, updated_at, manifest) VALUES (?, ?, ?, ?)',
+            (str(post_id), manifest['hash'], time.time(), json.dumps(manifest))
+        )
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def get_manifest(self, post_id: str):
+        """The artifact manifest of the post's last successful render, or None."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT manifest FROM artifact_manifests WHERE post_id = ?', (str(post_id),))
+        row = cursor.fetchone()
+        conn.close()
+        return json.loads(row[0]) if row else None
+
+    @timed_query
+    def add_index_image(self, image_path: str, prompt: str, post_id: str = None):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO image_index (image_path, post_id, prompt, created_at) VALUES (?, ?, ?, ?)',
+            (image_path, str(post_id) if post_id is not None else None, prompt, time.time())
+        )
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def get_index_images(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM image_index ORDER BY created_at')
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+
+    @timed_query
+    def save_image_reuse(self, post_id: str, scene_index, image_path: str, source_path: str, similarity: float, prompt: str, source_prompt: str):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR REPLACE INTO image_reuse VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (str(post_id), scene_index, image_path, source_path, similarity, prompt, source_prompt, time.time())
+        )
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def get_image_reuse(self, post_id: str):
+        """Scene images of the post that were reused from earlier posts, in scene order."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM image_reuse WHERE post_id = ? ORDER BY scene_index', (str(post_id),))
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+
+    @timed_query
+    def find_image_reuse(self, image_path: str):
+        """Latest reuse record of any post for a content-keyed image path, or None."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM image_reuse WHERE image_path = ? ORDER BY created_at DESC LIMIT 1', (image_path,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    @timed_query
+    def add_degradations(self, post_id: str, stage: str, names: list, detail: dict = None):
+        """Records the cheaper paths a deadline forced on one stage of the post's run."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.executemany(
+            'INSERT INTO post_degradations (post_id, stage, name, detail, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(str(post_id), stage, name, json.dumps(detail or {}), time.time()) for name in names]
+        )
+        conn.commit()
+        conn.close()
+
+    def _degradations(self, cursor, post_id: str = None) -> dict:
+        """Degradations of one post's (or every post's) latest run, by post id."""
+        found = {}
+        if post_id is None:
+            cursor.execute('SELECT post_id, stage, name, detail, created_at FROM post_degradations ORDER BY created_at')
+        else:
+            cursor.execute('SELECT post_id, stage, name, detail, created_at FROM post_degradations WHERE post_id = ? ORDER BY created_at', (str(post_id),))
+        for post_id, stage, name, detail, created_at in cursor.fetchall():
+            found.setdefault(post_id, []).append({"stage": stage, "name": name, "detail": json.loads(detail or "{}"), "created_at": created_at})
+        return found
+
+    @timed_query
+    def save_batch(self, batch_id: str, items: list, concurrency: int):
+        """Stores a batch and its items ({"position", "run_order", "group_key", "spec"}) as PENDING."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO batches VALUES (?, ?, ?, ?, ?)', (batch_id, "RUNNING", concurrency, time.time(), None))
+        cursor.executemany(
+            'INSERT INTO batch_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(batch_id, i["position"], i["run_order"], i["group_key"], json.dumps(i["spec"]), None, "PENDING", None, None) for i in items]
+        )
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def update_batch_item(self, batch_id: str, position: int, status: str, post_id: str = None, error: str = None):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE batch_items SET status = ?, post_id = COALESCE(?, post_id), error = ?, submitted_at = COALESCE(submitted_at, ?) WHERE batch_id = ? AND position = ?',
+            (status, str(post_id) if post_id is not None else None, error, time.time() if post_id is not None else None, batch_id, position)
+        )
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def cancel_batch(self, batch_id: str) -> bool:
+        """Marks the batch and its not yet submitted items CANCELLED; False if it was not running."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE batches SET status = 'CANCELLED', finished_at = ? WHERE id = ? AND status = 'RUNNING'", (time.time(), batch_id))
+        running = cursor.rowcount > 0
+        cursor.execute("UPDATE batch_items SET status = 'CANCELLED' WHERE batch_id = ? AND status = 'PENDING'", (batch_id,))
+        conn.commit()
+        conn.close()
+        return running
+
+    @timed_query
+    def get_batch_ids(self, status: str):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM batches WHERE status = ? ORDER BY created_at', (status,))
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return ids
+
+    @timed_query
+    def finish_batch(self, batch_id: str, status: str = "DONE"):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('UPDATE batches SET status = ?, finished_at = ? WHERE id = ?', (status, time.time(), batch_id))
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def get_batch(self, batch_id: str):
+        """The batch with its items in submission order, joined with their posts."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM batches WHERE id = ?', (batch_id,))
+        row = cursor.fetchone()
+        if not row:
+            conn.close()
+            return None
+        batch = dict(row)
+        cursor.execute('''
+            SELECT i.*, p.status AS post_status, p.progress, p.video_url, p.draft, p.created_at AS post_created_at
+            FROM batch_items i LEFT JOIN posts p ON p.id = i.post_id
+            WHERE i.batch_id = ? ORDER BY i.position
+        ''', (batch_id,))
+        batch['items'] = []
+        for item in cursor.fetchall():
+            item = dict(item)
+            item['spec'] = json.loads(item['spec'])
+            try:
+                item['draft'] = json.loads(item['draft']) if item['draft'] else None
+            except:
+                item['draft'] = None
+            batch['items'].append(item)
+        conn.close()
+        return batch
+
+    @timed_query
+    def record_trend_tags(self, tags: list):
+        """Counts hashtags seen on scraped trends (candidates for speculative drafts)."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        now = time.time()
+        cursor.executemany(
+            'INSERT INTO trend_tags VALUES (?, 1, ?) ON CONFLICT(tag) DO UPDATE SET seen = seen + 1, last_seen = excluded.last_seen',
+            [(tag.lstrip("#").lower(), now) for tag in tags if tag and tag.lstrip("#")]
+        )
+        conn.commit()
+        conn.close()
+
+    @timed_query
+    def get_trend_tags(self, since: float, limit: int = 20):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT tag, seen FROM trend_tags WHERE last_seen >= ? ORDER BY seen DESC, last_seen DESC LIMIT ?', (since, limit))
+        rows = [{"tag": tag, "seen": seen} for tag, seen in cursor.fetchall()]
+        conn.close()
+        return rows
+
+    @timed_query
+    def get_recent_topics(self, limit: int = 20):
+        """Distinct topics of the latest posts, most recent first, with how often each was run."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT topic, COUNT(*) AS runs, MAX(created_at) AS last_run FROM posts
+            WHERE topic IS NOT NULL AND topic != ''
+            GROUP BY lower(trim(topic)) ORDER BY last_run DESC LIMIT ?
+        ''', (limit,))
+        rows = [{"topic": topic, "runs": runs, "last_run": last_run} for topic, runs, last_run in cursor.fetchall()]
+        conn.close()
+        return rows
+
+    @timed_query
+    def save_speculative_draft(self, entry: dict) -> int:
+        """Stores a speculative pre-generation attempt (READY with its draft, or ABORTED with what it spent)."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO speculative_drafts (topic_key, topic, tone, duration, platform, source, status, analysis, draft, images, cost_usd, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            entry["topic_key"], entry["topic"], entry["tone"], entry["duration"], entry["platform"], entry["source"], entry["status"],
+            entry["analysis"].model_dump_json() if entry.get("analysis") else None,
+            entry["draft"].model_dump_json() if entry.get("draft") else None,
+            entry.get("images", 0), entry.get("cost_usd", 0.0), time.time()
+        ))
+        row_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return row_id
+
+    @timed_query
+    def has_speculative_draft(self, topic_key: str, tone: str, duration: int, platform: str, since: float) -> bool:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM speculative_drafts WHERE topic_key = ? AND tone = ? AND duration = ? AND platform = ? AND status = 'READY' AND used_by IS NULL AND created_at >= ? LIMIT 1",
+            (topic_key, tone, duration, platform, since)
+        )
+        found = cursor.fetchone() is not None
+        conn.close()
+        return found
+
+    @timed_query
+    def take_speculative_draft(self, topic_key: str, tone: str, duration: int, platform: str, since: float, post_id: str):
+        """Claims the newest unused speculative draft for these settings for the post; None if there is none."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM speculative_drafts WHERE topic_key = ? AND tone = ? AND duration = ? AND platform = ? AND status = 'READY' AND used_by IS NULL AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+            (topic_key, tone, duration, platform, since)
+        )
+        row = cursor.fetchone()
+        if row:
+            cursor.execute('UPDATE speculative_drafts SET used_by = ?, used_at = ? WHERE id = ? AND used_by IS NULL', (str(post_id), time.time(), row['id']))
+            if cursor.rowcount == 0:
+                row = None
+        conn.commit()
+        conn.close()
+        if not row:
+            return None
+        entry = dict(row)
+        entry['analysis'] = json.loads(entry['analysis'])
+        entry['draft'] = json.loads(entry['draft'])
+        return entry
+
+    @timed_query
+    def get_speculative_summary(self, since: float):
+        """Attempts, hits and spend of speculative pre-generation since `since`."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*), SUM(status = 'READY'), SUM(status = 'ABORTED'), SUM(used_by IS NOT NULL), COALESCE(SUM(cost_usd), 0), COALESCE(SUM(images), 0)
+            FROM speculative_drafts WHERE created_at >= ?
+        ''', (since,))
+        attempts, ready, aborted, used, spent, images = cursor.fetchone()
+        conn.close()
+        return {"attempts": attempts, "ready": ready or 0, "aborted": aborted or 0, "used": used or 0, "spent_usd": round(spent, 4), "images": images}
+
+    @timed_query
+    def clear_degradations(self, post_id: str):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM post_degradations WHERE post_id = ?', (str(post_id),))
         conn.commit()
         conn.close()
 
+    @timed_query
     def get_post(self, post_id: str):
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM posts WHERE id = ?', (post_id,))
         row = cursor.fetchone()
+        degradations = self._degradations(cursor, post_id) if row else {}
         conn.close()
         
         if not row:
             return None
             
         post_dict = dict(row)
+        post_dict['degradations'] = degradations.get(str(post_id), [])
         try:
             if post_dict['analysis']:
                 post_dict['analysis'] = json.loads(post_dict['analysis'])
@@ -132,11 +678,13 @@ class Database:
         post_dict['use_captions'] = bool(post_dict.get('use_captions', 1))
         return post_dict
 
+    @timed_query
     def find_failed_post_by_topic(self, topic: str):
+        """The latest post for the topic whose run failed or was cancelled (it can be resumed)."""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM posts WHERE topic = ? AND status = "ERROR" ORDER BY created_at DESC LIMIT 1', (topic,))
+        cursor.execute('SELECT * FROM posts WHERE topic = ? AND status IN ("ERROR", "CANCELLED") ORDER BY created_at DESC LIMIT 1', (topic,))
         row = cursor.fetchone()
         conn.close()
         
@@ -144,16 +692,19 @@ class Database:
             return None
         return self.get_post(str(row['id']))
 
+    @timed_query
     def get_all_posts(self):
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM posts ORDER BY created_at DESC')
         rows = cursor.fetchall()
+        degradations = self._degradations(cursor)
         
         posts = []
         for row in rows:
             post_dict = dict(row)
+            post_dict['degradations'] = degradations.get(str(row['id']), [])
             # Parse JSON strings back to dicts
             try:
                 if post_dict['analysis']:
@@ -174,6 +725,7 @@ class Database:
         conn.close()
         return posts
 
+    @timed_query
     def update_post_status(self, post_id: str, status: str):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
@@ -181,6 +733,7 @@ class Database:
         conn.commit()
         conn.close()
 
+    @timed_query
     def update_post_progress(self, post_id: str, progress: int):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
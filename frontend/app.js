@@ -182,7 +182,7 @@ function renderPosts(postData) {
     postsContainer.innerHTML = '';
 
     displayData.forEach(post => {
-        if (['INITIALIZING', 'SEARCHING', 'ANALYZING', 'GENERATING', 'ERROR'].includes(post.status)) {
+        if (['QUEUED', 'INITIALIZING', 'SEARCHING', 'ANALYZING', 'GENERATING', 'ERROR'].includes(post.status)) {
             renderProgressCard(post);
             return;
         }
@@ -323,6 +323,10 @@ function renderPosts(postData) {
         const downloadBtn = clone.querySelector('.download-btn');
         downloadBtn.addEventListener('click', () => downloadVideo(post));
 
+        const traceBtn = clone.querySelector('.trace-btn');
+        const tracePanel = clone.querySelector('.trace-panel');
+        traceBtn.addEventListener('click', () => toggleTrace(post.id, tracePanel));
+
         postsContainer.appendChild(clone);
     });
 }
@@ -340,6 +344,75 @@ function downloadVideo(post) {
     }
 }
 
+async function toggleTrace(postId, panel) {
+    if (!panel.classList.contains('hidden')) {
+        panel.classList.add('hidden');
+        return;
+    }
+    panel.innerHTML = '<p class="trace-empty">Loading trace...</p>';
+    panel.classList.remove('hidden');
+    try {
+        const res = await fetch(`${API_BASE}/posts/${postId}/trace`);
+        if (!res.ok) {
+            panel.innerHTML = '<p class="trace-empty">No trace recorded for this post yet.</p>';
+            return;
+        }
+        renderTraceWaterfall(panel, await res.json());
+    } catch (err) {
+        console.error("Trace Error:", err);
+        panel.innerHTML = '<p class="trace-empty">Could not load trace.</p>';
+    }
+}
+
+function renderTraceWaterfall(panel, trace) {
+    const spans = trace.spans;
+    const start = Math.min(...spans.map(s => s.start_time));
+    const end = Math.max(...spans.map(s => s.end_time || s.start_time));
+    const total = Math.max(end - start, 0.001);
+
+    // Depth-first order so children sit under their parent
+    const children = {};
+    spans.forEach(s => (children[s.parent_id || 'root'] = children[s.parent_id || 'root'] || []).push(s));
+    const ordered = [];
+    const walk = (parentId, depth) => {
+        (children[parentId] || [])
+            .sort((a, b) => a.start_time - b.start_time)
+            .forEach(s => {
+                ordered.push({ span: s, depth });
+                walk(s.span_id, depth + 1);
+            });
+    };
+    walk('root', 0);
+
+    panel.innerHTML = `<div class="trace-header">Total ${total.toFixed(1)}s &middot; ${spans.length} spans</div>`;
+    ordered.forEach(({ span, depth }) => {
+        const duration = (span.end_time || span.start_time) - span.start_time;
+        const row = document.createElement('div');
+        row.className = 'trace-row';
+        row.title = `${span.name}: ${duration.toFixed(2)}s` + (span.attributes && span.attributes.error ? ` (${span.attributes.error})` : '');
+
+        const label = document.createElement('span');
+        label.className = 'trace-label';
+        label.style.paddingLeft = `${depth * 10}px`;
+        label.textContent = span.name;
+
+        const track = document.createElement('div');
+        track.className = 'trace-track';
+        const bar = document.createElement('div');
+        bar.className = `trace-bar${span.status === 'ERROR' ? ' error' : ''}`;
+        bar.style.left = `${((span.start_time - start) / total) * 100}%`;
+        bar.style.width = `${Math.max((duration / total) * 100, 0.5)}%`;
+        track.appendChild(bar);
+
+        const time = document.createElement('span');
+        time.className = 'trace-time';
+        time.textContent = `${duration.toFixed(1)}s`;
+
+        row.append(label, track, time);
+        panel.appendChild(row);
+    });
+}
+
 async function handleApproval(postId, action) {
     try {
         const res = await fetch(`${API_BASE}/approve/${postId}`, {
@@ -402,6 +475,11 @@ function renderProgressCard(post) {
         });
     } else {
         renderProgressSteps(stepsContainer, post);
+        if (post.eta) {
+            const minutes = Math.max(1, Math.round(post.eta.eta_seconds / 60));
+            const queueText = post.eta.queue_position ? `Queued (#${post.eta.queue_position}). ` : '';
+            clone.querySelector('.progress-footer-text').textContent = `${queueText}Estimated ready in ~${minutes} min.`;
+        }
     }
 
     postsContainer.appendChild(clone);
@@ -2,12 +2,28 @@ from typing import List, Optional
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from pydantic import BaseModel
-from agents import app_graph
 from models import PostRecord
 from database import db
+from tools.rate_limiter import rate_limiter
+from tools.render_scheduler import render_scheduler
+from tools.provider_router import provider_router
+from tools.hedging import hedger
+from tools.latency import stage_latency
+from tools.metrics import metrics
+from tools.tracing import tracer
+from tools.profiler import profiler
+from tools.warmup import warmup
+from tools.cancellation import cancellation, WorkflowCancelled
+from tools.deadline import deadline_planner
+from tools.coalescer import coalescer, IdempotencyConflict
+from tools.admission import admission
+from tools.batch import batch_scheduler
+from tools.speculative import speculative_worker
 import os
+import json
+import time
 import asyncio
 from dotenv import load_dotenv
 
@@ -27,12 +43,38 @@ app.add_middleware(
 # Ensure frontend directory exists
 os.makedirs("frontend", exist_ok=True)
 
+def get_app_graph():
+    """
+    The LangGraph workflow. Importing `agents` pulls in langgraph, moviepy and the
+    provider SDKs, so it is deferred until a workflow (or the warm-up) needs it.
+    """
+    from agents import app_graph
+    return app_graph
+
+@app.on_event("startup")
+async def schedule_warmup():
+    # Long-running servers can pay the import cost up front; serverless leaves it lazy
+    if os.environ.get("WARMUP_ON_STARTUP", "0") == "1":
+        warmup.start_background()
+    # Idle-time pre-generation of likely topics (off unless SPECULATIVE_PREGEN=1)
+    speculative_worker.start()
+    # Batches a previous process was still running carry on
+    batch_scheduler.resume(submit_batch_item)
+
 class WorkflowRequest(BaseModel):
     topic: str
     tone: Optional[str] = "Professional"
     duration: Optional[int] = 60
     platform: Optional[str] = "TikTok"
     use_captions: Optional[bool] = True
+    profile: Optional[bool] = False
+    deadline_seconds: Optional[float] = None # overrides WORKFLOW_DEADLINE_SECONDS; 0 disables
+    idempotency_key: Optional[str] = None # retries with the same key get the same post id
+    visual_style: Optional[str] = None # pins the style instead of taking the draft's
+    music_mood: Optional[str] = None # pins the music mood; one track per mood and duration
+
+class BatchWorkflowRequest(BaseModel):
+    workflows: List[WorkflowRequest]
 
 class ApprovalRequest(BaseModel):
     action: str # "APPROVE" or "REJECT"
@@ -41,20 +83,265 @@ class ApprovalRequest(BaseModel):
 
 @app.get("/api/health")
 def read_root():
-    return {"status": "Social Media Agent is Active", "version": VERSION}
+    return {"status": "Social Media Agent is Active", "version": VERSION, "warm": warmup.warm}
+
+@app.post("/api/warmup")
+def warm_up():
+    """
+    Imports the workflow graph and builds the provider clients ahead of the
+    first workflow. Returns per-step timings; repeated calls are free.
+    """
+    return warmup.run()
+
+@app.get("/api/rate-limits")
+def get_rate_limits():
+    """
+    Per-provider budgets, queue depth and wait-time stats of the shared rate limiter.
+    """
+    return rate_limiter.snapshot()
+
+@app.get("/api/render-scheduler")
+def get_render_scheduler():
+    """
+    Encoder thread slots of the global render scheduler: jobs running and
+    queued, utilization since start and wait time per job kind.
+    """
+    return render_scheduler.snapshot()
+
+@app.get("/api/deadlines")
+def get_deadlines():
+    """
+    Deadline hit rate of finished runs, how often each degradation was
+    needed, and the expected remaining seconds from each node.
+    """
+    return deadline_planner.snapshot()
+
+@app.get("/api/coalescing")
+def get_coalescing():
+    """
+    Identical workflow requests served by an already running job (or an
+    idempotency key) instead of a new pipeline, and the work that saved.
+    """
+    return coalescer.snapshot()
+
+@app.get("/api/admission")
+def get_admission():
+    """
+    Admission control: runs executing and queued, the backlog of expected
+    work against its budget, per-run ETAs and how accurate past ETAs were.
+    """
+    return admission.snapshot()
+
+@app.get("/api/speculative")
+def get_speculative():
+    """
+    Idle-time pre-generation: today's spend against the daily budget, drafts
+    made and used by real runs, preemptions, and the next candidate topic.
+    """
+    return speculative_worker.snapshot()
+
+@app.get("/api/trends")
+async def get_trends(topic: str):
+    """
+    Scrapes current trends for a topic. Their hashtags are recorded as
+    candidate topics for idle-time pre-generation.
+    """
+    from tools.scraper import fetch_trends
+    try:
+        trends = await asyncio.wait_for(fetch_trends(topic), timeout=30.0)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Trend discovery timed out")
+    return {"topic": topic, "trends": trends}
+
+@app.get("/api/providers")
+def get_providers():
+    """
+    Current fallback-chain order, circuit breaker state and rolling health per provider.
+    """
+    return provider_router.snapshot()
+
+@app.get("/api/latency")
+def get_latency():
+    """
+    Rolling p50/p95/p99 per graph node and provider chain, plus hedging stats.
+    """
+    return {"stages": stage_latency.snapshot(), "hedging": hedger.snapshot()}
+
+@app.get("/api/scripting")
+def get_scripting_stats():
+    """
+    Active scripting mode and per-mode latency and token cost of the
+    strategy + draft phase (fused, two_call, fused_fallback).
+    """
+    from tools.content_gen import generator
+    return {"mode": generator.script_mode, "modes": generator.script_stats()}
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus scrape endpoint: stage/provider/DB latency histograms, provider
+    errors, queue depth, cache hit ratios and render throughput.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/posts/{post_id}/trace")
+def get_post_trace(post_id: str, trace_id: Optional[str] = None, format: Optional[str] = None):
+    """
+    Span waterfall for a post's latest workflow run (or a specific trace_id).
+    Pass format=otlp for OpenTelemetry JSON that any OTLP viewer can import.
+    """
+    trace = db.get_trace(post_id, trace_id)
+    if not trace["spans"]:
+        raise HTTPException(status_code=404, detail="No trace recorded for this post")
+    if format == "otlp":
+        return tracer.to_otlp(trace["spans"])
+    return trace
+
+@app.get("/api/posts/{post_id}/profile")
+def get_post_profile(post_id: str):
+    """
+    Summary of the post's latest profiled run: per-stage wall time, tracemalloc
+    peak and top allocations, including scene render worker processes.
+    """
+    profile = db.get_profile(post_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="No profile recorded for this post")
+    return profile
+
+@app.get("/api/posts/{post_id}/profile/download")
+def download_post_profile(post_id: str):
+    """
+    Collapsed stacks ("frame;frame;frame count") for flamegraph.pl or speedscope.
+    """
+    profile = db.get_profile(post_id, include_stacks=True)
+    if not profile:
+        raise HTTPException(status_code=404, detail="No profile recorded for this post")
+    return Response(
+        profile["collapsed"],
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile_{post_id}.folded"'}
+    )
+
+@app.post("/api/otel/v1/traces")
+async def collect_traces(payload: dict):
+    """
+    Minimal OTLP/JSON sink for local use: point OTEL_EXPORTER_OTLP_ENDPOINT at
+    http://localhost:8000/api/otel and exports are appended to OTEL_COLLECTOR_FILE.
+    """
+    path = os.environ.get("OTEL_COLLECTOR_FILE", "otel_traces.jsonl")
+    with open(path, "a") as f:
+        f.write(json.dumps({"received_at": time.time(), **payload}) + "\n")
+    return {"partialSuccess": {}}
 
 @app.get("/api/posts")
 def get_posts():
-    return db.get_all_posts()
+    posts = db.get_all_posts()
+    # Live ETA for runs that are queued or executing
+    etas = admission.etas()
+    for post in posts:
+        if str(post['id']) in etas:
+            post['eta'] = etas[str(post['id'])]
+    return posts
 
 @app.post("/api/run-workflow")
 async def run_workflow(request: WorkflowRequest, background_tasks: BackgroundTasks):
     """
     Manually triggers the agent workflow for a given topic.
-    Resumes if a failed mission with the same topic exists.
+    Resumes if a failed mission with the same topic exists, and attaches to
+    the running job if an identical request is already in flight.
+    """
+    return start_workflow(request)
+
+@app.post("/api/run-workflows")
+async def run_workflows(request: BatchWorkflowRequest):
     """
+    Starts a batch of workflows (e.g. a day of a content calendar) and
+    returns its id. Items with the same pinned style and music mood run back
+    to back so they share cached work; see tools/batch.py for the ordering.
+    """
+    if not request.workflows:
+        raise HTTPException(status_code=400, detail="No workflows in batch")
+    return batch_scheduler.start([w.model_dump() for w in request.workflows], submit_batch_item)
+
+async def submit_batch_item(spec: dict) -> str:
+    """Starts the workflow for one batch item, waiting out a full backlog."""
+    while True:
+        try:
+            return start_workflow(WorkflowRequest(**spec))["post_id"]
+        except HTTPException as e:
+            if e.status_code != 429:
+                raise
+            await asyncio.sleep(int(e.headers["Retry-After"]))
+
+@app.get("/api/batches/{batch_id}")
+def get_batch(batch_id: str):
+    """Aggregate progress of a batch, and each item with its post's status."""
+    batch = db.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {
+        "batch_id": batch_id,
+        "status": batch["status"],
+        "concurrency": batch["concurrency"],
+        "created_at": batch["created_at"],
+        "finished_at": batch["finished_at"],
+        **batch_scheduler.progress(batch),
+        "results": batch_scheduler.export_rows(batch),
+    }
+
+@app.get("/api/batches/{batch_id}/export")
+def export_batch(batch_id: str, format: str = "csv"):
+    """Batch results as a CSV (default) or JSON download."""
+    batch = db.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if format == "json":
+        body, media_type = json.dumps(batch_scheduler.export_rows(batch), indent=2), "application/json"
+    else:
+        body, media_type = batch_scheduler.export_csv(batch), "text/csv"
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="batch_{batch_id}.{"json" if format == "json" else "csv"}"'}
+    )
+
+@app.post("/api/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    """Stops submitting the batch's remaining items and cancels its running workflows."""
+    batch = db.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    stopped = await batch_scheduler.cancel(batch_id)
+    reports = [
+        await cancellation.cancel(item["post_id"], reason=f"batch {batch_id} cancelled")
+        for item in batch["items"] if item.get("post_id") and cancellation.get(item["post_id"])
+    ]
+    return {"batch_id": batch_id, "stopped": stopped, "cancelled_workflows": len(reports)}
+
+def start_workflow(request: WorkflowRequest) -> dict:
+    """
+    Starts (or resumes, or attaches to) the workflow for a request and
+    returns the response for it. Raises HTTPException on 409/429.
+    """
+    try:
+        running_id = coalescer.attach(request, request.idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if running_id:
+        return {"message": f"Workflow already accepted for topic: {request.topic}", "post_id": running_id, "coalesced": True, "eta": admission.eta(running_id)}
+
+    # Shed load instead of slowing every run down once the backlog is over budget
+    retry_after = admission.retry_after()
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Workflow backlog is full, retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)}
+        )
+
     # Check for existing failed post to resume
     existing_post = db.find_failed_post_by_topic(request.topic)
+    resuming = bool(existing_post)
     
     if existing_post:
         post_id = str(existing_post['id'])
@@ -74,12 +361,22 @@ async def run_workflow(request: WorkflowRequest, background_tasks: BackgroundTas
         result = db.save_post(initial_post)
         post_id = result.get("id")
         print(f"Starting new workflow for topic: {request.topic} (ID: {post_id})")
+    flight = coalescer.lead(request, post_id, request.idempotency_key)
+    eta = admission.admit(post_id)
+
+    # The clock starts when the request is accepted
+    deadline = deadline_planner.new(request.deadline_seconds)
 
     async def _run_agent(p_id: str):
+        # Everything this task starts (nodes, threads, provider calls) sees the token
+        token = cancellation.start(p_id)
         # Fetch current record to populate state for resumption
         current_data = db.get_post(p_id)
         if not current_data:
             print(f"Error: Post {p_id} not found in database.")
+            cancellation.finish(token)
+            coalescer.finish(flight, p_id)
+            admission.finish(p_id)
             return
 
         # Ensure we have all keys expected by AgentState
@@ -98,12 +395,51 @@ async def run_workflow(request: WorkflowRequest, background_tasks: BackgroundTas
             "music_path": None,
             "video_path": current_data.get('video_url'),
             "scene_video_paths": [],
+            "script_run": None,
+            "deadline": deadline,
+            "visual_style": request.visual_style,
+            "music_mood": request.music_mood,
             "error": None
         }
         
+        # Degradations describe the latest run only
+        db.clear_degradations(p_id)
+        completed = False
+        metrics.workflows_in_flight.inc()
         try:
+            # Waits here while WORKFLOW_CONCURRENCY runs are executing
+            if admission.queued(p_id):
+                db.update_post_status(p_id, "QUEUED")
+                await admission.start(p_id)
+                db.update_post_status(p_id, "INITIALIZING")
+            else:
+                await admission.start(p_id)
+            app_graph = get_app_graph()
+            from agents import NodeError, resume_point
+            from tools.checkpointer import workflow_config
+
+            # A failed run restarts at the node that failed, with the state checkpointed before it
+            graph_input = initial_state
+            next_nodes = await resume_point(p_id) if resuming else None
+            if next_nodes:
+                print(f"Resuming post {p_id} from checkpoint at node(s): {', '.join(next_nodes)}")
+                graph_input = None
+                # The resumed run gets this request's deadline, not the checkpointed one
+                await app_graph.aupdate_state(workflow_config(p_id), {"deadline": deadline})
+
             # Run the agent graph
-            result = await app_graph.ainvoke(initial_state)
+            with tracer.start_trace(p_id, topic=request.topic, platform=request.platform) as root, \
+                    profiler.session(p_id, enabled=profiler.should_profile(request.profile)):
+                if root and next_nodes:
+                    root.set_attribute("resumed_at", ",".join(next_nodes))
+                if root and deadline:
+                    root.set_attribute("deadline_seconds", deadline["budget"])
+                try:
+                    result = await app_graph.ainvoke(graph_input, workflow_config(p_id))
+                except NodeError as e:
+                    result = {"error": str(e)}
+                if result.get('error') and root:
+                    root.set_error(str(result['error']))
             
             if result.get('error'):
                 print(f"Workflow Finished with Error: {result['error']}")
@@ -131,16 +467,60 @@ async def run_workflow(request: WorkflowRequest, background_tasks: BackgroundTas
 
                 db.update_post_status(p_id, "READY_FOR_APPROVAL")
                 print(f"Workflow Finished Successfully for ID: {p_id}")
+                completed = True
+
+            post = db.get_post(p_id)
+            deadline_planner.finish(deadline, [d["name"] for d in post["degradations"]] if post else [])
                 
+        except (WorkflowCancelled, asyncio.CancelledError):
+            print(f"Workflow cancelled for ID: {p_id} ({token.reason})")
+            if db.get_post(p_id):
+                db.update_post_status(p_id, "CANCELLED")
         except Exception as e:
             import traceback
             print(f"CRITICAL ERROR in WorkflowRunner (ID: {p_id}): {e}")
             traceback.print_exc()
             db.update_post_status(p_id, "ERROR")
+        finally:
+            metrics.workflows_in_flight.dec()
+            cancellation.finish(token)
+            coalescer.finish(flight, p_id)
+            admission.finish(p_id, completed)
     
     # Use asyncio.create_task instead of BackgroundTasks
     asyncio.create_task(_run_agent(post_id))
-    return {"message": f"Workflow started for topic: {request.topic}", "post_id": post_id}
+    return {"message": f"Workflow started for topic: {request.topic}", "post_id": post_id, "coalesced": False, "eta": eta}
+
+@app.get("/api/posts/{post_id}/workflow-history")
+async def get_workflow_history(post_id: str):
+    """
+    Checkpoints saved for the post's workflow, newest first. A non-empty
+    `next` on the latest one is where a resumed run will start.
+    """
+    get_app_graph()
+    from agents import workflow_history
+    history = await workflow_history(post_id)
+    return {
+        "post_id": post_id,
+        "resumable_at": history[0]["next"] if history and history[0]["next"] else None,
+        "checkpoints": history
+    }
+
+@app.get("/api/posts/{post_id}/image-reuse")
+def get_image_reuse(post_id: str):
+    """
+    Scenes of the post whose base image was reused from an earlier post
+    instead of generated, with the source image and prompt similarity.
+    """
+    from tools.image_index import image_index
+    scenes = db.get_image_reuse(post_id)
+    return {
+        "post_id": post_id,
+        "threshold": image_index.threshold,
+        "max_per_post": image_index.max_per_post,
+        "reused": len(scenes),
+        "scenes": scenes
+    }
 
 @app.post("/api/approve/{post_id}")
 async def approve_post(post_id: str, request: ApprovalRequest, background_tasks: BackgroundTasks):
@@ -157,13 +537,29 @@ async def approve_post(post_id: str, request: ApprovalRequest, background_tasks:
     background_tasks.add_task(_post_to_tiktok)
     return {"message": "Post approved for publication"}
 
+@app.post("/api/posts/{post_id}/cancel")
+async def cancel_workflow(post_id: str):
+    """
+    Stops the post's running workflow: pending provider calls are refused,
+    its ffmpeg encodes are killed and partially written files removed. The
+    post keeps its checkpoints, so a later run resumes where it stopped.
+    """
+    report = await cancellation.cancel(post_id, reason="cancelled by user")
+    if not report["running"]:
+        raise HTTPException(status_code=404, detail="No running workflow for this post")
+    return report
+
 @app.delete("/api/posts/{post_id}")
 async def delete_post(post_id: str):
     """
-    Permanently removes a post from history.
+    Permanently removes a post from history, cancelling its workflow first
+    and deleting its partial and final video.
     """
+    from tools.animator import animator
+    final_video = os.path.join(animator.output_dir, f"animated_{post_id}.mp4")
+    report = await cancellation.cancel(post_id, reason="post deleted", extra_paths=[final_video])
     db.delete_post(post_id)
-    return {"message": "Post deleted successfully"}
+    return {"message": "Post deleted successfully", "cancellation": report}
 
 # --- Static Files (Must be last) ---
 
@@ -26,6 +26,7 @@ class Scene(BaseModel):
     prompt: str = Field(description="The cinematic visual prompt for this scene.")
     duration: float = Field(default=5.0, description="Suggested duration of this scene in seconds.")
     aspect_ratio: str = Field(default="9:16", description="Aspect ratio of the scene (9:16 for TikTok/Reels, 16:9 for YouTube).")
+    planned_duration: Optional[float] = Field(default=None, description="Rendered clip length planned against the measured voiceover; duration stays the suggested weight.")
 
 class ContentDraft(BaseModel):
     """Generated content script and details."""
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+import tools.admission
+from tools.admission import AdmissionController
+from tools.deadline import DEFAULT_STAGE_SECONDS
+
+WORKFLOW = sum(DEFAULT_STAGE_SECONDS.values())  # 118 s
+
+@pytest.fixture(autouse=True)
+def default_stage_seconds(monkeypatch):
+    monkeypatch.setattr(tools.admission, "stage_seconds", DEFAULT_STAGE_SECONDS.__getitem__)
+
+def controller(concurrency=2, max_backlog=300.0):
+    admission = AdmissionController()
+    admission.concurrency, admission.max_backlog = concurrency, max_backlog
+    return admission
+
+def test_queued_run_eta_includes_the_runs_ahead_of_it():
+    admission = controller()
+
+    async def main():
+        for post_id in ("a", "b", "c"):
+            admission.admit(post_id)
+        await admission.start("a")
+        await admission.start("b")
+        admission.enter_stage("a", "animation")
+        return admission.etas()
+
+    etas = asyncio.run(main())
+    assert etas["a"]["eta_seconds"] == pytest.approx(DEFAULT_STAGE_SECONDS["animation"], abs=0.5)
+    assert etas["b"]["eta_seconds"] == pytest.approx(WORKFLOW, abs=0.5)
+    # c takes the slot a frees first
+    assert etas["c"]["eta_seconds"] == pytest.approx(DEFAULT_STAGE_SECONDS["animation"] + WORKFLOW, abs=0.5)
+    assert (etas["a"]["queue_position"], etas["c"]["queue_position"]) == (0, 1)
+    assert admission.queued("c") and not admission.queued("missing")
+
+def test_backlog_over_budget_is_refused_with_retry_after():
+    admission = controller()
+    assert admission.retry_after() is None  # idle always admits
+    admission.admit("a")
+    assert admission.retry_after() is None
+    admission.admit("b")
+    # 236 s queued + 118 s for the new run is 54 s over budget, drained by two slots
+    assert admission.retry_after() == 27
+    assert admission.snapshot()["rejected"] == 1
+
+def test_finish_frees_the_slot_for_the_next_run_in_order():
+    admission = controller(concurrency=1)
+    order = []
+
+    async def run(post_id):
+        await admission.start(post_id)
+        order.append(post_id)
+
+    async def main():
+        await admission.start("first")
+        waiting = [asyncio.create_task(run(post_id)) for post_id in ("second", "third")]
+        await asyncio.sleep(0.01)
+        assert order == []
+        admission.finish("first", completed=True)
+        await asyncio.sleep(0.01)
+        assert order == ["second"]
+        admission.finish("second")
+        await asyncio.gather(*waiting)
+        admission.finish("third")
+
+    asyncio.run(main())
+    assert order == ["second", "third"] and admission.idle()
@@ -0,0 +1,86 @@
+import sys
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from tools.animator import CharacterAnimator
+from tools.memory import PeakMemorySampler, processes_naming
+
+def test_concurrent_assemblies_keep_their_own_reports(tmp_path, monkeypatch):
+    animator = CharacterAnimator(output_dir=str(tmp_path))
+
+    def assemble(video_paths, voice_path, output_path, music_path, preset, report):
+        timeline = 10.0 if output_path.endswith("a.mp4") else 20.0
+        animator._report_alignment(timeline, 12.0, report)
+        time.sleep(0.2)  # the other job runs meanwhile
+        report["threads"] = 1
+        return output_path
+
+    monkeypatch.setattr(animator, "_assemble_streaming", assemble)
+    reports = {"a": {}, "b": {}}
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for name, report in reports.items():
+            pool.submit(animator.assemble_multi_scene_video, [], "voice.mp3", f"{name}.mp4", report=report)
+
+    assert reports["a"]["looped_seconds"] == 2.0 and reports["a"]["trimmed_seconds"] == 0.0
+    assert reports["b"]["looped_seconds"] == 0.0 and reports["b"]["trimmed_seconds"] == 8.0
+    assert reports["a"]["output"] == "a.mp4" and reports["b"]["output"] == "b.mp4"
+    assert reports["a"]["scope"] == "process_tree" and "peak_job_ffmpeg_mb" in reports["a"]
+
+def test_job_memory_only_counts_processes_naming_its_files(tmp_path):
+    mine, other = str(tmp_path / "scene_mine.mp4"), str(tmp_path / "scene_other.mp4")
+    sleeper = "import time; time.sleep(2)"
+    procs = [subprocess.Popen([sys.executable, "-c", sleeper, path]) for path in (mine, other)]
+    try:
+        time.sleep(0.2)
+        assert processes_naming([mine]) == [procs[0].pid]
+        with PeakMemorySampler(paths=[mine]) as memory:
+            time.sleep(0.25)
+        report = memory.report()
+        assert 0 < memory.peak_job_bytes < memory.peak_bytes
+        assert report["peak_job_ffmpeg_mb"] <= report["peak_mb"]
+    finally:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+
+class FakeClip:
+    """Decoder stand-in that records whether it is open."""
+    open_now = []
+
+    def __init__(self, path, **kwargs):
+        self.path, self.duration = path, 2.0
+        FakeClip.open_now.append(self)
+
+    def get_frame(self, t):
+        return (self.path, t)
+
+    def close(self):
+        FakeClip.open_now.remove(self)
+
+    def with_effects(self, effects):
+        raise RuntimeError("decode failed")
+
+def test_scene_window_keeps_one_decoder_open(monkeypatch):
+    import moviepy
+    from tools.animator import SceneWindow
+    monkeypatch.setattr(moviepy, "VideoFileClip", FakeClip)
+    FakeClip.open_now = []
+    window = SceneWindow([("a.mp4", 2.0, (8, 8)), ("b.mp4", 2.0, (8, 8)), ("c.mp4", 2.0, (8, 8))], (8, 8), fade=0.5)
+
+    frames = [window.frame(t / 4) for t in range(0, 40)]  # past the end, so the timeline loops
+
+    assert [path for path, _ in frames[:8:3]] == ["a.mp4", "a.mp4", "b.mp4"]
+    assert window.peak_open == 1 and len(FakeClip.open_now) == 1
+    window.close()
+    assert FakeClip.open_now == []
+
+def test_single_scene_video_closes_its_clips_on_failure(tmp_path, monkeypatch):
+    import moviepy
+    monkeypatch.setattr(moviepy, "VideoFileClip", FakeClip)
+    monkeypatch.setattr(moviepy, "AudioFileClip", FakeClip)
+    FakeClip.open_now = []
+    video = tmp_path / "scene.mp4"
+    video.write_bytes(b"")
+
+    assert CharacterAnimator(output_dir=str(tmp_path)).create_cinematic_video(str(video), "voice.mp3", "out.mp4") is None
+    assert FakeClip.open_now == []
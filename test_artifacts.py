@@ -0,0 +1,56 @@
+import os
+from PIL import Image
+from moviepy import VideoClip
+from tools.artifacts import ArtifactStore, temp_path
+from tools.video_gen import video_generator
+
+def scene(store: ArtifactStore, index: int, prompt: str, **kwargs):
+    return store.scene(index, prompt, "noir", 5.0, "9:16", **kwargs)
+
+def test_scene_keys_follow_their_inputs(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    first = scene(store, 0, "A lighthouse at dusk")
+    assert first == scene(store, 0, "A lighthouse at dusk")
+    assert first["image_path"].startswith(str(tmp_path))
+    # The motion of a scene differs by duration; its image does not
+    longer = store.scene(0, "A lighthouse at dusk", "noir", 6.0, "9:16")
+    assert longer["image_key"] == first["image_key"] and longer["video_key"] != first["video_key"]
+    fast = scene(store, 0, "A lighthouse at dusk", preset="veryfast")
+    assert fast["video_key"] != first["video_key"]
+
+def test_manifest_diff_reports_only_changed_scenes(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    music = store.music("calm", 60)
+    scenes = [scene(store, 0, "A lighthouse at dusk"), scene(store, 1, "Waves on rocks")]
+    previous = store.manifest("7", "voice.mp3", scenes, music)
+
+    assert store.diff(previous, store.manifest("7", "voice.mp3", scenes, music)) == {"changed_scenes": [], "unchanged": True}
+    edited = [scenes[0], scene(store, 1, "Waves on sand")]
+    changes = store.diff(previous, store.manifest("7", "voice.mp3", edited, music))
+    assert changes == {"changed_scenes": [1], "unchanged": False}
+    assert store.diff(None, previous)["changed_scenes"] == [0, 1]
+
+def test_temp_path_keeps_the_extension_last():
+    assert temp_path("/a/scene_raw_ab12.mp4") == "/a/scene_raw_ab12.tmp.mp4"
+
+def test_interrupted_scene_encode_never_lands_under_its_key(tmp_path, monkeypatch):
+    image = tmp_path / "scene.png"
+    Image.new("RGB", (64, 64), (40, 80, 120)).save(image)
+    output = tmp_path / "scene_raw.mp4"
+
+    def killed_encode(self, filename, **kwargs):
+        with open(filename, "wb") as f:
+            f.write(b"truncated")
+        raise OSError("ffmpeg was killed")
+
+    monkeypatch.setattr(VideoClip, "write_videofile", killed_encode)
+    assert video_generator.generate_video(str(image), str(output), duration=0.5, aspect_ratio="9:16", threads=1) is None
+    assert not os.path.exists(output) and not os.path.exists(temp_path(str(output)))
+
+    def encode(self, filename, **kwargs):
+        with open(filename, "wb") as f:
+            f.write(b"complete")
+
+    monkeypatch.setattr(VideoClip, "write_videofile", encode)
+    assert video_generator.generate_video(str(image), str(output), duration=0.5, aspect_ratio="9:16", threads=1) == str(output)
+    assert output.read_bytes() == b"complete" and not os.path.exists(temp_path(str(output)))
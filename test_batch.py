@@ -0,0 +1,76 @@
+import asyncio
+from database import db
+from models import PostRecord
+from tools.batch import BatchScheduler
+
+def spec(topic, style=None, mood=None):
+    return {"topic": topic, "duration": 30, "visual_style": style, "music_mood": mood}
+
+def scheduler():
+    batches = BatchScheduler()
+    batches.concurrency_override = 1
+    batches.poll_seconds = 0.01
+    return batches
+
+def new_post(topic, status="INITIALIZING"):
+    return str(db.save_post(PostRecord(topic=topic, status=status))["id"])
+
+def test_plan_groups_shared_pins_largest_first_and_regroups_from_storage():
+    specs = [spec("a"), spec("b", "noir"), spec("c", "noir"), spec("d", "pastel", "calm"), spec("e", "noir")]
+    groups = BatchScheduler().plan(specs)
+    assert [[item["position"] for item in group] for group in groups] == [[1, 2, 4], [3], [0]]
+    items = [item for group in groups for item in group]
+    assert [item["run_order"] for item in items] == [0, 1, 2, 3, 4]
+    assert BatchScheduler.regroup(list(reversed(items))) == groups
+
+def test_cancel_marks_unsubmitted_items_cancelled():
+    batches = scheduler()
+
+    async def submit(item_spec):
+        return new_post(item_spec["topic"])  # never finishes
+
+    async def main():
+        started = batches.start([spec("cancel one"), spec("cancel two"), spec("cancel three")], submit)
+        await asyncio.sleep(0.05)
+        assert await batches.cancel(started["batch_id"]) is True
+        await asyncio.sleep(0.01)
+        return started["batch_id"]
+
+    batch = db.get_batch(asyncio.run(main()))
+    assert batch["status"] == "CANCELLED"
+    assert [item["status"] for item in batch["items"]] == ["SUBMITTED", "CANCELLED", "CANCELLED"]
+
+def test_cancel_without_a_running_task_still_persists():
+    db.save_batch("orphaned", [{"position": 0, "run_order": 0, "group_key": None, "spec": spec("orphan")}], 1)
+
+    assert asyncio.run(scheduler().cancel("orphaned")) is True
+    batch = db.get_batch("orphaned")
+    assert batch["status"] == "CANCELLED" and batch["items"][0]["status"] == "CANCELLED"
+    assert asyncio.run(scheduler().cancel("orphaned")) is False
+
+def test_resume_picks_up_a_batch_left_running():
+    specs = [spec("resume done"), spec("resume interrupted"), spec("resume pending")]
+    db.save_batch("restarted", [{"position": i, "run_order": i, "group_key": None, "spec": s} for i, s in enumerate(specs)], 1)
+    done, interrupted = new_post("resume done", "READY_FOR_APPROVAL"), new_post("resume interrupted", "GENERATING")
+    db.update_batch_item("restarted", 0, "SUBMITTED", post_id=done)
+    db.update_batch_item("restarted", 1, "SUBMITTED", post_id=interrupted)
+    submitted = []
+
+    async def submit(item_spec):
+        # The interrupted post is marked failed, so the real submit resumes it
+        post_id = interrupted if item_spec["topic"] == "resume interrupted" else new_post(item_spec["topic"])
+        submitted.append((item_spec["topic"], db.get_post(post_id)["status"]))
+        db.update_post_status(post_id, "READY_FOR_APPROVAL")
+        return post_id
+
+    async def main():
+        batches = scheduler()
+        assert batches.resume(submit) == ["restarted"]
+        assert batches.resume(submit) == []  # already running
+        await asyncio.wait_for(batches._tasks["restarted"], timeout=2)
+
+    asyncio.run(main())
+    assert submitted == [("resume interrupted", "ERROR"), ("resume pending", "INITIALIZING")]
+    batch = db.get_batch("restarted")
+    assert batch["status"] == "DONE"
+    assert [item["post_id"] for item in batch["items"]][:2] == [done, interrupted]
@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from tools.artifacts import temp_path
+from tools.cancellation import CancellationRegistry, WorkflowCancelled, check_cancelled, writing
+
+def test_cancel_stops_the_run_and_removes_only_its_temp_files(tmp_path):
+    registry = CancellationRegistry()
+    shared = tmp_path / "scene_raw_ab12.mp4"
+    partial = temp_path(str(tmp_path / "scene_raw_cd34.mp4"))
+    shared.write_bytes(b"another post's scene")
+
+    async def run():
+        registry.start("42")
+        # Even if a shared file were registered, a cancel must not delete it
+        with writing(partial, str(shared)):
+            with open(partial, "wb") as f:
+                f.write(b"half an encode")
+            await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(run())
+        await asyncio.sleep(0.05)
+        report = await registry.cancel("42", reason="test")
+        return task, report
+
+    task, report = asyncio.run(main())
+
+    assert task.cancelled()
+    assert report["running"] and report["stopped"]
+    assert report["removed"] == [partial]
+    assert shared.exists()
+
+def test_cancelled_token_refuses_further_work():
+    registry = CancellationRegistry()
+
+    async def main():
+        token = registry.start("7")
+        token.cancel("stop")
+        with pytest.raises(WorkflowCancelled):
+            check_cancelled()
+        registry.finish(token)
+        return registry.get("7")
+
+    assert asyncio.run(main()) is None
+    # Outside a workflow there is nothing to cancel
+    check_cancelled()
+
+def test_cancel_of_an_idle_post_reports_not_running():
+    report = asyncio.run(CancellationRegistry().cancel("missing"))
+    assert report == {"post_id": "missing", "running": False, "stopped": True, "killed_processes": 0, "removed": []}
+
+def test_cancelled_post_is_picked_up_by_the_next_run_of_its_topic():
+    from database import db
+    from models import PostRecord
+    post_id = str(db.save_post(PostRecord(topic="cancel then rerun", status="GENERATING"))["id"])
+    assert db.find_failed_post_by_topic("cancel then rerun") is None
+    db.update_post_status(post_id, "CANCELLED")
+    assert str(db.find_failed_post_by_topic("cancel then rerun")["id"]) == post_id
@@ -0,0 +1,66 @@
+import asyncio
+from typing import List, Optional, TypedDict
+import pytest
+from langgraph.graph import StateGraph, END
+from models import Scene
+from tools.checkpointer import SQLiteCheckpointer, workflow_config
+
+class State(TypedDict):
+    topic: str
+    scene: Optional[Scene]
+    log: List[str]
+
+def graph(calls, fail_voice):
+    async def script(state):
+        calls.append("script")
+        return {"scene": Scene(prompt=f"{state['topic']} at dawn"), "log": state["log"] + ["script"]}
+
+    async def voice(state):
+        calls.append("voice")
+        if fail_voice:
+            raise RuntimeError("TTS down")
+        return {"log": state["log"] + [f"voice for {state['scene'].prompt}"]}
+
+    workflow = StateGraph(State)
+    workflow.add_node("script", script)
+    workflow.add_node("voice", voice)
+    workflow.set_entry_point("script")
+    workflow.add_edge("script", "voice")
+    workflow.add_edge("voice", END)
+    return workflow.compile(checkpointer=SQLiteCheckpointer())
+
+def test_failed_run_resumes_at_the_failed_node_with_its_state():
+    calls = []
+    config = workflow_config("checkpoint-resume")
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await graph(calls, fail_voice=True).ainvoke({"topic": "tides", "scene": None, "log": []}, config)
+        # A fresh graph (as after a restart) sees where the thread stopped
+        resumed = graph(calls, fail_voice=False)
+        snapshot = await resumed.aget_state(config)
+        assert list(snapshot.next) == ["voice"]
+        assert snapshot.values["scene"] == Scene(prompt="tides at dawn")
+        return await resumed.ainvoke(None, config)
+
+    final = asyncio.run(main())
+    assert calls == ["script", "voice", "voice"]
+    assert final["log"] == ["script", "voice for tides at dawn"]
+
+def test_history_lists_checkpoints_newest_first_and_delete_clears_the_thread():
+    saver = SQLiteCheckpointer()
+    config = workflow_config("checkpoint-history")
+    app = StateGraph(State)
+    app.add_node("script", lambda state: {"log": ["script"]})
+    app.set_entry_point("script")
+    app.add_edge("script", END)
+    app.compile(checkpointer=saver).invoke({"topic": "tides", "scene": None, "log": []}, config)
+
+    history = list(saver.list(config))
+    ids = [item.config["configurable"]["checkpoint_id"] for item in history]
+    assert len(ids) >= 2 and ids == sorted(ids, reverse=True)
+    assert saver.get_tuple(config).config == history[0].config
+    assert len(list(saver.list(config, limit=1))) == 1
+
+    saver.delete_thread("checkpoint-history")
+    assert saver.get_tuple(config) is None
@@ -1,6 +1,7 @@
 import asyncio
 import os
 from agents import app_graph
+from tools.checkpointer import workflow_config
 from database import db
 from models import PostRecord
 
@@ -32,7 +33,7 @@ async def test_full_flow():
     }
 
     try:
-        final_state = await app_graph.ainvoke(initial_state)
+        final_state = await app_graph.ainvoke(initial_state, workflow_config(post_id))
         print("\n--- Workflow Results ---")
         print(f"Post ID: {post_id}")
         if final_state.get("error"):
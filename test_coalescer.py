@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+import pytest
+from tools.coalescer import WorkflowCoalescer, IdempotencyConflict
+
+def request(**overrides):
+    fields = dict(topic="Ocean Tides", tone="Professional", duration=60, platform="TikTok", use_captions=True,
+                  profile=False, deadline_seconds=None, visual_style=None, music_mood=None)
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+def test_fingerprint_ignores_topic_case_and_spacing_only():
+    base = WorkflowCoalescer.fingerprint(request())
+    assert WorkflowCoalescer.fingerprint(request(topic="  ocean   TIDES ")) == base
+    for change in (dict(tone="Casual"), dict(duration=30), dict(visual_style="noir"), dict(music_mood="calm"),
+                   dict(profile=True), dict(deadline_seconds=120.0)):
+        assert WorkflowCoalescer.fingerprint(request(**change)) != base, change
+
+def test_identical_request_attaches_to_the_run_in_flight():
+    coalescer = WorkflowCoalescer()
+    coalescer.enabled = True
+    assert coalescer.attach(request()) is None
+    token = coalescer.lead(request(), "11")
+
+    assert coalescer.attach(request(topic="ocean tides")) == "11"
+    # A deadline or profiling run is a different run
+    assert coalescer.attach(request(deadline_seconds=90.0)) is None
+    assert coalescer.attach(request(profile=True)) is None
+
+    coalescer.finish(token, "11")
+    assert coalescer.attach(request()) is None
+    assert coalescer.stats["coalesced"] == 1 and coalescer.stats["workflows_saved"] == 1
+
+def test_idempotency_key_replays_and_rejects_a_different_request():
+    coalescer = WorkflowCoalescer()
+    token = coalescer.lead(request(), "12", idempotency_key="k1")
+    coalescer.finish(token, "12")
+
+    assert coalescer.attach(request(), idempotency_key="k1") == "12"
+    with pytest.raises(IdempotencyConflict):
+        coalescer.attach(request(tone="Casual"), idempotency_key="k1")
@@ -0,0 +1,87 @@
+import os
+import time
+import asyncio
+from types import SimpleNamespace
+import pytest
+import agents
+from database import db
+from models import PostRecord
+import tools.deadline as deadline
+from tools.deadline import DeadlinePlanner, DEFAULT_STAGE_SECONDS
+from tools.latency import StageLatencyTracker
+
+@pytest.fixture
+def latency(monkeypatch):
+    tracker = StageLatencyTracker()
+    monkeypatch.setattr(deadline, "stage_latency", tracker)
+    monkeypatch.setattr("tools.metrics.stage_latency", tracker)
+    return tracker
+
+def planner():
+    planner = DeadlinePlanner()
+    planner.safety, planner.severe, planner.min_scenes = 1.0, 1.5, 2
+    return planner
+
+def test_stage_seconds_uses_the_p50_once_there_is_history(latency):
+    assert deadline.stage_seconds("voice") == DEFAULT_STAGE_SECONDS["voice"]
+    for seconds in (2.0, 3.0, 40.0):
+        latency.record("node.voice", seconds)
+    assert deadline.stage_seconds("voice") == 3.0
+
+def test_plan_degrades_by_pressure_tier(latency):
+    expected = planner().expected("animation")  # defaults: 90 s of animation
+    assert planner().plan(None, "animation") == []
+    assert planner().plan(planner().new(expected * 2), "animation") == []
+    assert planner().plan(planner().new(expected / 1.2), "animation") == ["local_music", "fast_preset"]
+    assert planner().plan(planner().new(expected / 2), "animation") == ["local_music", "fast_preset", "skip_sanitization", "fewer_scenes"]
+    assert planner().plan(planner().new(expected / 2), "strategist") == []
+
+def test_scene_cap_keeps_the_scenes_that_fit(latency):
+    expected = planner().expected("animation")
+    assert planner().scene_cap(planner().new(expected * 0.55), 6) == 3
+    assert planner().scene_cap(planner().new(expected * 0.01), 6) == 2
+    assert planner().scene_cap(planner().new(expected * 3), 6) == 6
+    assert planner().new(0) is None
+
+def test_skipped_node_runs_stay_out_of_the_stage_p50(latency):
+    async def resumed(state):
+        agents.mark_reused()
+        return {"voice_path": "cached.mp3"}
+
+    async def generated(state):
+        await asyncio.sleep(0.05)
+        return {"voice_path": "new.mp3"}
+
+    for node in (resumed, resumed, resumed, generated):
+        asyncio.run(agents.timed_node("voice", node)({"post_id": None}))
+
+    assert latency.snapshot()["node.voice.reused"]["samples"] == 3
+    assert latency.snapshot()["node.voice"]["samples"] == 1
+    assert deadline.stage_seconds("voice") >= 0.05
+    agents.mark_reused()  # outside a node it is a no-op
+
+def test_cached_edge_voiceover_is_a_reused_run(latency, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(agents, "plan_degradations", lambda state, stage: ["edge_tts"])
+    script = "The tide turns twice a day."
+    os.makedirs("frontend/assets")
+    edge_path = os.path.join("frontend/assets", agents.artifact_store.voice(script, variant="edge")["filename"])
+    open(edge_path, "wb").close()
+    post_id = str(db.save_post(PostRecord(topic="cached edge voice", status="GENERATING"))["id"])
+
+    state = {"post_id": post_id, "draft": SimpleNamespace(script=script)}
+    result = asyncio.run(agents.timed_node("voice", agents.voice_generation_agent)(state))
+
+    assert result == {"voice_path": edge_path}
+    assert db.get_post(post_id)["progress"] == 60
+    assert latency.snapshot()["node.voice.reused"]["samples"] == 1
+    assert "node.voice" not in latency.snapshot()
+
+def test_finish_counts_met_and_missed(latency):
+    runs = planner()
+    runs.finish(runs.new(60), ["edge_tts"])
+    runs.finish({"at": time.time() - 1, "budget": 10.0}, [])
+    runs.finish(None, [])
+    stats = runs.snapshot()
+    assert (stats["runs"], stats["met"], stats["missed"], stats["hit_rate"]) == (2, 1, 1, 0.5)
+    assert stats["degradations"] == {"edge_tts": 1}
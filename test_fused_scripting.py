@@ -0,0 +1,57 @@
+import json
+from types import SimpleNamespace
+import pytest
+from tools.content_gen import ContentGenerator
+
+ANALYSIS = {
+    "hook_technique": "Question", "hook_variations": ["Why?", "How?", "What if?"], "emotional_trigger": "Awe",
+    "structural_pattern": "Reveal", "target_audience_insight": "Curious viewers", "virality_score": 8,
+}
+DRAFT = {
+    "title": "Tides", "script": "The moon pulls the sea.", "caption": "#ocean", "visual_prompt": "a beach",
+    "visual_style_description": "noir", "visual_scenes": [{"prompt": "a moonlit beach", "duration": 4.0, "aspect_ratio": "9:16"}],
+}
+
+class FakeGemini:
+    def __init__(self, payload):
+        self.text = "```json\n" + json.dumps(payload) + "\n```"
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(text=self.text, usage_metadata=SimpleNamespace(prompt_token_count=900, candidates_token_count=400))
+
+def generator(payload):
+    content = ContentGenerator()
+    content.model, content.use_gemini, content._ready = FakeGemini(payload), True, True
+    return content
+
+def test_one_request_returns_analysis_and_draft():
+    content = generator({"analysis": ANALYSIS, "draft": DRAFT})
+    usage = {}
+
+    analysis, draft = content.generate_strategy_and_draft("ocean tides", usage, duration=30)
+
+    assert analysis.hook_technique == "Question" and analysis.virality_score == 8
+    assert draft.script == DRAFT["script"] and [s.prompt for s in draft.visual_scenes] == ["a moonlit beach"]
+    assert content.model.calls == 1
+    assert usage == {"calls": 1, "prompt_tokens": 900, "completion_tokens": 400}
+
+@pytest.mark.parametrize("payload", [
+    {"draft": DRAFT},
+    {"analysis": dict(ANALYSIS, virality_score="very"), "draft": DRAFT},
+    {"analysis": ANALYSIS, "draft": dict(DRAFT, visual_scenes=[])},
+])
+def test_invalid_response_raises_so_the_caller_can_fall_back(payload):
+    with pytest.raises(ValueError):
+        generator(payload).generate_strategy_and_draft("ocean tides")
+
+def test_script_runs_are_averaged_per_mode():
+    content = ContentGenerator()
+    content.record_script_run("fused", 2.0, {"calls": 1, "prompt_tokens": 900, "completion_tokens": 400})
+    content.record_script_run("fused", 4.0, {"calls": 1, "prompt_tokens": 1100, "completion_tokens": 600})
+    content.record_script_run("two_call", 5.0, {"calls": 2, "prompt_tokens": 1500, "completion_tokens": 700})
+
+    stats = content.script_stats()
+    assert stats["fused"] == {"runs": 2, "llm_calls_per_run": 1.0, "avg_seconds": 3.0, "avg_prompt_tokens": 1000.0, "avg_completion_tokens": 500.0}
+    assert stats["two_call"]["llm_calls_per_run"] == 2.0
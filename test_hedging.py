@@ -0,0 +1,92 @@
+import time
+import asyncio
+import threading
+from tools.hedging import Hedger
+from tools.provider_router import provider_router
+from tools.rate_limiter import rate_limiter
+
+def quick_hedger(delay: float) -> Hedger:
+    hedger = Hedger()
+    hedger.default_delay = delay
+    hedger.min_delay = 0.0
+    return hedger
+
+def writer(body: bytes, seconds: float = 0.0):
+    async def provider(path):
+        await asyncio.sleep(seconds)
+        with open(path, "wb") as f:
+            f.write(body)
+        return path
+    return provider
+
+def test_slow_primary_is_hedged_and_loser_discarded(tmp_path):
+    hedger = quick_hedger(0.05)
+    output = tmp_path / "voice.mp3"
+    providers = {"slow": writer(b"slow", 0.5), "fast": writer(b"fast")}
+
+    result = asyncio.run(hedger.run_chain("test_hedge_async", providers, str(output)))
+
+    assert result == str(output)
+    assert output.read_bytes() == b"fast"
+    assert hedger.stats["hedges_fired"] == 1 and hedger.stats["hedges_won"] == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["voice.mp3"]
+
+def test_failed_primary_falls_through_without_hedging(tmp_path):
+    hedger = quick_hedger(5.0)
+    output = tmp_path / "voice.mp3"
+
+    async def broken(path):
+        raise RuntimeError("provider down")
+
+    result = asyncio.run(hedger.run_chain("test_hedge_fallback", {"broken": broken, "backup": writer(b"backup")}, str(output)))
+
+    assert output.read_bytes() == b"backup" and result == str(output)
+    assert hedger.stats["hedges_fired"] == 0
+
+def test_sync_chain_hedges_and_discards(tmp_path):
+    hedger = quick_hedger(0.05)
+    output = tmp_path / "scene.png"
+
+    def slow(path):
+        time.sleep(0.4)
+        with open(path, "wb") as f:
+            f.write(b"slow")
+        return path
+
+    def fast(path):
+        with open(path, "wb") as f:
+            f.write(b"fast")
+        return path
+
+    result = hedger.run_chain_sync("test_hedge_sync", {"slow": slow, "fast": fast}, str(output))
+    time.sleep(0.5)
+
+    assert result == str(output) and output.read_bytes() == b"fast"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["scene.png"]
+
+def test_limiter_queueing_neither_hedges_nor_counts_as_latency(tmp_path, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TEST_HEDGE_SLOT", "rpm:0,tpm:0,concurrency:1")
+    limiter = rate_limiter.get("test_hedge_slot")
+    limiter.acquire()
+    threading.Timer(0.4, limiter.release).start()
+    calls = []
+
+    async def limited(path):
+        async with rate_limiter.limit_async("test_hedge_slot"):
+            await asyncio.sleep(0.01)
+        with open(path, "wb") as f:
+            f.write(b"primary")
+        return path
+
+    async def backup(path):
+        calls.append(path)
+        return await writer(b"backup")(path)
+
+    hedger = quick_hedger(0.1)
+    output = tmp_path / "voice.mp3"
+    asyncio.run(hedger.run_chain("test_hedge_limited", {"limited": limited, "backup": backup}, str(output)))
+
+    assert output.read_bytes() == b"primary"
+    assert hedger.stats["hedges_fired"] == 0 and not calls
+    latency = provider_router._get("test_hedge_limited", "limited").latency.percentile(50)
+    assert latency < 0.2
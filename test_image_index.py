@@ -0,0 +1,54 @@
+import os
+import time
+from database import db
+from tools.image_index import ImageReuseIndex, tokenize
+
+def make_image(path, body=b"png"):
+    with open(path, "wb") as f:
+        f.write(body)
+    return str(path)
+
+def index_with(tmp_path, animal, max_per_post=2):
+    index = ImageReuseIndex()
+    index.threshold = 0.5
+    index.max_per_post = max_per_post
+    source = make_image(tmp_path / "scene_source.png", b"source")
+    index.add(f"a red {animal} sleeping under glowing northern lights", source, post_id=f"{animal}-1")
+    return index, source
+
+def test_tokenize_drops_stopwords_and_adds_bigrams():
+    assert tokenize("The red fox in the snow") == ["red", "fox", "snow", "red_fox", "fox_snow"]
+
+def test_similar_prompt_from_another_post_is_copied_and_recorded(tmp_path):
+    index, source = index_with(tmp_path, "fox")
+    target = str(tmp_path / "scene_target.png")
+
+    match = index.reuse("red fox sleeping under northern lights", target, "fox-2", scene_index=0)
+
+    assert match["image_path"] == source
+    assert open(target, "rb").read() == b"source"
+    assert [(r["scene_index"], r["source_path"]) for r in db.get_image_reuse("fox-2")] == [(0, source)]
+    # A post never reuses its own images
+    assert index.reuse("red fox sleeping under northern lights", str(tmp_path / "own.png"), "fox-1") is None
+
+def test_cache_hit_on_a_reused_copy_counts_for_the_consuming_post(tmp_path):
+    index, source = index_with(tmp_path, "lynx", max_per_post=1)
+    shared = str(tmp_path / "scene_shared.png")
+    index.reuse("red lynx sleeping under northern lights", shared, "lynx-3", scene_index=0)
+
+    # A later post whose scene has the same content key finds the copy on disk
+    assert index.adopt(shared, "lynx-4", scene_index=2) is True
+    assert index.adopt(shared, "lynx-4", scene_index=2) is False
+    assert [(r["scene_index"], r["image_path"], r["source_path"]) for r in db.get_image_reuse("lynx-4")] == [(2, shared, source)]
+    # ...and it used up that post's reuse budget
+    assert index.reuse("red lynx sleeping under northern lights", str(tmp_path / "more.png"), "lynx-4") is None
+
+def test_regenerated_file_is_not_taken_for_a_reuse(tmp_path):
+    index, _ = index_with(tmp_path, "hare")
+    shared = str(tmp_path / "scene_regenerated.png")
+    assert index.reuse("red hare sleeping under northern lights", shared, "hare-5", scene_index=0)
+    future = time.time() + 60
+    os.utime(shared, (future, future))
+
+    assert index.adopt(shared, "hare-6", scene_index=0) is False
+    assert index.adopt(str(tmp_path / "never_reused.png"), "hare-6") is False
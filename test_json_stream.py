@@ -0,0 +1,42 @@
+import json
+import pytest
+from tools.json_stream import DraftStreamParser
+
+DRAFT = {
+    "title": "Tides, \"explained\"",
+    "script": "The moon pulls {the ocean} [gently].",
+    "visual_scenes": [
+        {"prompt": "a moonlit beach", "duration": 4, "tags": ["night", "calm"]},
+        {"prompt": "waves \\ rolling in {slowly}", "duration": 6, "nested": {"a": [1, 2]}},
+    ],
+    "hashtags": ["#ocean"],
+}
+
+def stream(text, size):
+    parser = DraftStreamParser("visual_scenes")
+    arrivals = []
+    for i in range(0, len(text), size):
+        for item in parser.feed(text[i:i + size]):
+            arrivals.append((i, item))
+    return parser, arrivals
+
+@pytest.mark.parametrize("size", [1, 3, 17, 10000])
+def test_scenes_arrive_whole_in_any_chunking(size):
+    text = "```json\n" + json.dumps(DRAFT, indent=2) + "\n```"
+    parser, arrivals = stream(text, size)
+    assert [item for _, item in arrivals] == DRAFT["visual_scenes"]
+    assert parser.fields == {"title": DRAFT["title"], "script": DRAFT["script"]}
+    assert parser.result() == DRAFT
+
+def test_each_scene_is_returned_as_soon_as_it_closes():
+    text = json.dumps(DRAFT)
+    _, arrivals = stream(text, 1)
+    first_closes = text.index('"calm"]}') + len('"calm"]}') - 1
+    assert arrivals[0][0] == first_closes
+    assert arrivals[1][0] < text.index('"hashtags"')
+
+def test_result_rejects_a_response_without_an_object():
+    parser = DraftStreamParser()
+    assert parser.feed("I cannot help with that.") == []
+    with pytest.raises(ValueError):
+        parser.result()
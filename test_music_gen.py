@@ -0,0 +1,30 @@
+from tools.music_gen import MusicGenerator
+
+def library(tmp_path):
+    music = MusicGenerator()
+    music.local_music_dir = str(tmp_path / "library")
+    (tmp_path / "library").mkdir()
+    (tmp_path / "library" / "calm.mp3").write_bytes(b"library track")
+    return music
+
+def test_library_fallback_never_takes_the_generated_tracks_path(tmp_path, monkeypatch):
+    music = library(tmp_path)
+    music.api_key = "key"
+    monkeypatch.setattr(music, "_generate_elevenlabs", lambda prompt, path, duration: None)
+    generated, local = str(tmp_path / "music_full.mp3"), str(tmp_path / "music_local.mp3")
+
+    assert music.generate_background_music("calm", generated, duration=30, local_path=local) == local
+    assert not (tmp_path / "music_full.mp3").exists()
+
+    # The next run tries the generator again and keeps the same library pick otherwise
+    calls = []
+    monkeypatch.setattr(music, "_generate_elevenlabs", lambda prompt, path, duration: calls.append(path))
+    (tmp_path / "library" / "other.mp3").write_bytes(b"another track")
+    assert music.generate_background_music("calm", generated, duration=30, local_path=local) == local
+    assert open(local, "rb").read() == b"library track"
+    assert calls == [generated]
+
+def test_local_only_goes_straight_to_the_library(tmp_path, monkeypatch):
+    music = library(tmp_path)
+    local = str(tmp_path / "music_local.mp3")
+    assert music.generate_background_music("calm", local, local_only=True) == local
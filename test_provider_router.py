@@ -0,0 +1,93 @@
+import time
+import asyncio
+import pytest
+from tools.provider_router import CircuitBreaker, ProviderRouter, CLOSED, OPEN, HALF_OPEN
+
+def router():
+    router = ProviderRouter()
+    router.failure_threshold, router.cooldown = 2, 0.05
+    return router
+
+def test_breaker_opens_probes_once_and_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.available() and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.available()
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # a single probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 0
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+def test_order_skips_open_breakers_and_keeps_a_last_resort():
+    chain = router()
+    for _ in range(2):
+        chain.run("tts", "primary", lambda: None)
+    assert chain.order("tts", ["primary", "backup"]) == ["backup"]
+    for _ in range(2):
+        chain.run("tts", "backup", lambda: None)
+    assert chain.order("tts", ["primary", "backup"]) == ["backup"]
+    assert chain.snapshot()["tts"]["effective_order"] == []
+
+    # The last resort is really called, and a success closes its breaker
+    calls = []
+    assert chain.run("tts", "backup", lambda: calls.append("backup") or "edge audio") == "edge audio"
+    assert calls == ["backup"] and chain._get("tts", "backup").breaker.state == CLOSED
+    # ...while an open breaker that is not the last resort still blocks
+    for _ in range(2):
+        chain.run("tts", "backup", lambda: None)
+    assert chain.run("tts", "primary", lambda: calls.append("primary") or "audio") is None
+    assert calls == ["backup"]
+
+    time.sleep(0.06)
+    assert chain.run("tts", "primary", lambda: "audio") == "audio"
+    assert chain.order("tts", ["primary", "backup"]) == ["primary", "backup"]
+
+def test_async_last_resort_is_called_when_every_breaker_is_open():
+    chain = router()
+    for provider in ("primary", "backup"):
+        for _ in range(2):
+            chain.run("images", provider, lambda: None)
+
+    async def render():
+        return "image.png"
+
+    order = chain.order("images", ["primary", "backup"])
+    assert order == ["backup"]
+    assert asyncio.run(chain.run_async("images", order[0], render)) == "image.png"
+
+def test_error_prone_provider_is_demoted_behind_healthy_ones():
+    chain = router()
+    chain.failure_threshold = 100
+    for ok in (True, False, True, False, False, True):
+        chain.record("images", "flaky", 1.0, ok)
+    for _ in range(5):
+        chain.record("images", "steady", 1.0, True)
+    assert chain.order("images", ["flaky", "steady"]) == ["steady", "flaky"]
+
+def test_cancelled_probe_frees_the_half_open_slot():
+    chain = router()
+    for _ in range(2):
+        chain.run("music", "only", lambda: None)
+    time.sleep(0.06)
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(chain.run_async("music", "only", cancelled))
+    breaker = chain._get("music", "only").breaker
+    assert breaker.state == HALF_OPEN and not breaker.probe_in_flight
+    assert breaker.consecutive_failures == 2
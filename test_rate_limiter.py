@@ -0,0 +1,126 @@
+import time
+import asyncio
+import threading
+import pytest
+from tools.rate_limiter import ProviderLimiter, RateLimitRegistry, estimate_tokens
+from tools.cancellation import CancellationRegistry, WorkflowCancelled
+
+def test_request_bucket_refills_at_the_configured_rate():
+    limiter = ProviderLimiter("test", rpm=600)  # one request every 0.1 s once the burst is spent
+    limiter._request_bucket = 1.0
+    assert limiter.acquire() < 0.05
+    limiter.release()
+    waited = limiter.acquire()
+    limiter.release()
+    assert 0.05 < waited < 0.5
+
+def test_token_bucket_charges_the_estimate():
+    limiter = ProviderLimiter("test", tpm=6000)  # 100 tokens per second
+    limiter._token_bucket = 100.0
+    limiter.acquire(tokens=100)
+    limiter.release()
+    assert limiter.acquire(tokens=20) > 0.1
+    limiter.release()
+    assert estimate_tokens("x" * 400, completion_allowance=0) == 100
+
+def test_concurrency_cap_serves_waiters_in_arrival_order():
+    limiter = ProviderLimiter("test", concurrency=1)
+    limiter.acquire()
+    order = []
+
+    def call(name):
+        limiter.acquire()
+        order.append(name)
+        limiter.release()
+
+    threads = []
+    for name in "abc":
+        thread = threading.Thread(target=call, args=(name,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+    limiter.release()
+    for thread in threads:
+        thread.join(timeout=2)
+    assert order == ["a", "b", "c"]
+    assert limiter.snapshot()["in_flight"] == 0
+
+def test_async_waiters_queue_on_the_loop_in_order():
+    limiter = ProviderLimiter("test", concurrency=1)
+    order = []
+
+    async def call(name):
+        await limiter.acquire_async()
+        order.append(name)
+        limiter.release()
+
+    async def main():
+        limiter.acquire()
+        threads_before = threading.active_count()
+        tasks = []
+        for name in "abc":
+            tasks.append(asyncio.create_task(call(name)))
+            await asyncio.sleep(0.01)
+        assert threading.active_count() == threads_before
+        assert limiter.snapshot()["queued"] == 3
+        limiter.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a", "b", "c"]
+
+def test_cancelled_async_waiter_takes_no_slot(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_TEST_CANCEL", "rpm:0,tpm:0,concurrency:1")
+    registry = RateLimitRegistry()
+    limiter = registry.get("test_cancel")
+
+    async def main():
+        limiter.acquire()
+
+        async def call():
+            async with registry.limit_async("test_cancel"):
+                pass
+
+        waiter = asyncio.create_task(call())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+
+    asyncio.run(main())
+    stats = limiter.snapshot()
+    assert stats["in_flight"] == 0 and stats["queued"] == 0 and stats["calls"] == 1
+
+def test_cancelled_sync_waiter_leaves_without_spending_budget():
+    registry = CancellationRegistry()
+    limiter = ProviderLimiter("test", rpm=6)  # one request every 10 s once the burst is spent
+    limiter._request_bucket = 0.0
+    outcome = {}
+
+    def speculative_call():
+        token = registry.start("speculative")
+        outcome["token"] = token
+        try:
+            limiter.acquire()
+            outcome["result"] = "granted"
+        except WorkflowCancelled:
+            outcome["result"] = "cancelled"
+
+    thread = threading.Thread(target=speculative_call)
+    thread.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    outcome["token"].cancel("real work arrived")
+    thread.join(timeout=2)
+    assert outcome["result"] == "cancelled" and time.monotonic() - started < 1.0
+    stats = limiter.snapshot()
+    assert stats["queued"] == 0 and stats["in_flight"] == 0 and stats["calls"] == 0
+
+def test_refund_returns_the_grant_and_its_budget():
+    limiter = ProviderLimiter("test", rpm=60, tpm=600)
+    limiter.acquire(tokens=100)
+    limiter.refund(tokens=100)
+    stats = limiter.snapshot()
+    assert stats["in_flight"] == 0
+    assert limiter._request_bucket > 59.9 and limiter._token_bucket > 599.9
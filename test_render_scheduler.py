@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from tools.render_scheduler import RenderScheduler
+
+def test_grants_never_exceed_the_slot_budget():
+    scheduler = RenderScheduler(total_slots=4, threads_per_job=3)
+    first = scheduler.acquire("scene")
+    second = scheduler.acquire("scene")
+    assert (first["threads"], second["threads"]) == (3, 1)
+    assert scheduler.snapshot()["in_use"] == 4
+    scheduler.release(first)
+    scheduler.release(first)  # releasing twice is harmless
+    scheduler.release(second)
+    assert scheduler.snapshot()["in_use"] == 0
+
+def test_waiters_are_served_final_first_then_by_progress():
+    scheduler = RenderScheduler(total_slots=1, threads_per_job=1)
+    order = []
+
+    async def main():
+        held = scheduler.acquire("scene")
+
+        async def job(kind, progress, name):
+            async with scheduler.slot_async(kind, progress=progress, label=name):
+                order.append(name)
+
+        tasks = [
+            asyncio.create_task(job("scene", 0.1, "early scene")),
+            asyncio.create_task(job("scene", 0.9, "late scene")),
+            asyncio.create_task(job("final", 1.0, "final")),
+        ]
+        await asyncio.sleep(0.05)
+        scheduler.release(held)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["final", "late scene", "early scene"]
+
+def test_queued_async_waiters_hold_no_executor_threads():
+    scheduler = RenderScheduler(total_slots=1, threads_per_job=1)
+
+    async def main():
+        held = scheduler.acquire("scene")
+        threads_before = threading.active_count()
+        waiters = [asyncio.create_task(scheduler.acquire_async("scene")) for _ in range(64)]
+        await asyncio.sleep(0.05)
+        # to_thread work still runs while every waiter is parked
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "ran"), timeout=2) == "ran"
+        assert threading.active_count() - threads_before <= 1
+        assert scheduler.snapshot()["queued"] == 64
+        scheduler.release(held)
+        for waiter in waiters:
+            scheduler.release(await waiter)
+
+    asyncio.run(main())
+    assert scheduler.snapshot()["in_use"] == 0
+
+def test_cancelled_waiter_is_never_granted():
+    scheduler = RenderScheduler(total_slots=1, threads_per_job=1)
+
+    async def main():
+        held = scheduler.acquire("scene")
+        waiter = asyncio.create_task(scheduler.acquire_async("scene"))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.snapshot()["queued"] == 0
+        scheduler.release(held)
+
+    asyncio.run(main())
+    stats = scheduler.snapshot()
+    assert stats["in_use"] == 0 and stats["by_kind"]["scene"]["jobs"] == 1
+
+def test_sync_and_async_waiters_share_one_queue():
+    scheduler = RenderScheduler(total_slots=1, threads_per_job=1)
+    order = []
+
+    async def main():
+        held = scheduler.acquire("scene")
+
+        def final_render():
+            with scheduler.slot("final", progress=1.0):
+                order.append("final (thread)")
+
+        async def scene_render():
+            async with scheduler.slot_async("scene", progress=0.5):
+                order.append("scene (loop)")
+
+        scene = asyncio.create_task(scene_render())
+        final = asyncio.create_task(asyncio.to_thread(final_render))
+        await asyncio.sleep(0.05)
+        scheduler.release(held)
+        await asyncio.gather(scene, final)
+
+    asyncio.run(main())
+    assert order == ["final (thread)", "scene (loop)"]
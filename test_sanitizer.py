@@ -0,0 +1,59 @@
+import json
+from types import SimpleNamespace
+from tools.gemini_director import GeminiDirector, styled_prompt
+
+class FakeModel:
+    """Rewrites every batch scene but `skip`; single calls prefix the prompt."""
+    def __init__(self, skip=()):
+        self.skip = skip
+        self.requests = []
+
+    def generate_content(self, contents, **kwargs):
+        self.requests.append(contents)
+        if isinstance(contents, str) and "Scene Batch:" in contents:
+            batch = json.loads(contents.split("Scene Batch:")[-1].strip())
+            scenes = [{"index": s["index"], "prompt": f"safe {s['prompt']}"} for s in batch["scenes"] if s["index"] not in self.skip]
+            return SimpleNamespace(text=json.dumps({"visual_style": f"safe {batch['visual_style']}", "scenes": scenes}))
+        original = contents[0]["parts"][0].split("Original Prompt:")[-1].strip()
+        return SimpleNamespace(text=f"single {original}")
+
+def director(model, cache_size=1024):
+    director = GeminiDirector()
+    director.model, director._ready, director.cache_size = model, True, cache_size
+    return director
+
+def test_one_request_rewrites_every_scene_and_fills_the_cache():
+    model = FakeModel()
+    gemini = director(model)
+
+    result = gemini.sanitize_scene_prompts(["a battle", "a storm"], "noir")
+
+    assert result == {0: "safe a battle | STYLE: safe noir", 1: "safe a storm | STYLE: safe noir"}
+    assert len(model.requests) == 1
+    # generate_base_image asks for the styled prompt and gets the rewrite without a request
+    assert gemini.sanitize_visual_prompt(styled_prompt("a storm", "noir")) == result[1]
+    assert gemini.sanitize_scene_prompts(["a storm"], "noir") == {0: result[1]}
+    assert len(model.requests) == 1
+
+def test_scenes_missing_from_the_batch_fall_back_to_single_calls():
+    model = FakeModel(skip={1})
+    gemini = director(model)
+
+    result = gemini.sanitize_scene_prompts(["a duel", "a fire"], "pastel")
+
+    assert result[0] == "safe a duel | STYLE: safe pastel"
+    assert result[1] == "single a fire | STYLE: pastel"
+    assert len(model.requests) == 2
+
+def test_cache_keeps_the_most_recently_used_prompts():
+    gemini = director(FakeModel(), cache_size=2)
+    for prompt in ("one", "two"):
+        gemini.sanitize_visual_prompt(prompt)
+    gemini.sanitize_visual_prompt("one")  # refreshes "one"
+    gemini.sanitize_visual_prompt("three")
+    assert list(gemini._sanitized) == ["one", "three"]
+
+def test_without_a_model_prompts_pass_through():
+    gemini = director(None)
+    assert gemini.sanitize_scene_prompts(["a cliff"], "noir") == {0: styled_prompt("a cliff", "noir")}
+    assert gemini.sanitize_visual_prompt("a cliff") == "a cliff"
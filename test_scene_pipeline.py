@@ -0,0 +1,63 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import tools.scene_pipeline as scene_pipeline
+from tools.scene_pipeline import ScenePipeline, SceneJob
+from tools.tracing import tracer
+from tools.video_gen import video_generator
+
+def fake_image(prompt, image_path, post_id=None, scene_index=None, sanitize=True):
+    if prompt == "broken":
+        return None
+    with open(image_path, "w") as f:
+        f.write(prompt)
+    return image_path
+
+def fake_render(image_path, output_path, duration, aspect_ratio, seed=None, profile=False, threads=1, preset="medium"):
+    # Earlier scenes take longer, so renders finish out of scene order
+    time.sleep(duration)
+    with open(output_path, "w") as f:
+        f.write(open(image_path).read())
+    return output_path
+
+def pipeline(monkeypatch):
+    monkeypatch.setattr(video_generator, "generate_base_image", fake_image)
+    monkeypatch.setattr(scene_pipeline, "_render_scene", fake_render)
+    runner = ScenePipeline(image_workers=2, queue_depth=1, render_workers=2)
+    runner._executor = ThreadPoolExecutor(max_workers=2)
+    return runner
+
+def jobs(tmp_path, prompts):
+    return [
+        SceneJob(index=i, prompt=prompt, image_path=str(tmp_path / f"image_{i}.png"), video_path=str(tmp_path / f"scene_{i}.mp4"), duration=0.05 * (len(prompts) - i))
+        for i, prompt in enumerate(prompts)
+    ]
+
+def test_results_keep_scene_order_and_a_failed_image_gives_none(monkeypatch, tmp_path):
+    runner = pipeline(monkeypatch)
+    scenes = jobs(tmp_path, ["dawn", "broken", "noon", "dusk"])
+    report = {}
+
+    results = asyncio.run(runner.run(scenes, report=report))
+
+    assert results == [scenes[0].video_path, None, scenes[2].video_path, scenes[3].video_path]
+    assert [open(path).read() for path in results if path] == ["dawn", "noon", "dusk"]
+    assert report["scenes"] == 4 and report["queue_peak"] <= 1
+    assert report["stages"]["image"]["items"] == 4 and report["stages"]["image"]["failures"] == 1
+    assert report["stages"]["render"]["items"] == 3 and report["stages"]["render"]["failures"] == 0
+
+def test_existing_scene_videos_are_reused_and_the_report_lands_on_the_span(monkeypatch, tmp_path):
+    runner = pipeline(monkeypatch)
+    scenes = jobs(tmp_path, ["dawn", "noon"])
+    with open(scenes[0].video_path, "w") as f:
+        f.write("cached")
+
+    async def main():
+        with tracer.start_trace("scene-pipeline-report") as span:
+            return await runner.run(scenes), span
+
+    results, span = asyncio.run(main())
+
+    assert results == [scenes[0].video_path, scenes[1].video_path]
+    assert open(scenes[0].video_path).read() == "cached"
+    assert span.attributes["render_utilization"] > 0
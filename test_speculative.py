@@ -0,0 +1,38 @@
+import asyncio
+from benchmarks.stub_providers import StubConfig, canned_analysis, canned_draft
+from models import ScriptAnalysis, ContentDraft, TrendData
+from tools import scraper as scraper_module
+from tools.content_gen import generator
+from tools.speculative import SpeculativeWorker, topic_key
+from tools.video_gen import video_generator
+
+def test_scraped_trend_hashtags_become_candidates(monkeypatch):
+    async def scrape(keywords, max_count=5):
+        return [TrendData(video_id="1", description="x", hashtags=["#Aurorahunting", "viral"], author="a", url="https://example.com")]
+
+    monkeypatch.setattr(scraper_module.scraper, "scrape_trends", scrape)
+    asyncio.run(scraper_module.fetch_trends("aurora hunting"))
+
+    topics = {c["topic"]: c["source"] for c in SpeculativeWorker().candidates()}
+    assert topics.get("aurorahunting") == "trend_tag"
+
+def test_speculation_makes_a_draft_a_real_run_can_take(monkeypatch):
+    config = StubConfig()
+    images = []
+    monkeypatch.setattr(generator, "script_mode", "two_call")
+    monkeypatch.setattr(generator, "analyze_trend", lambda topic, usage, **kw: ScriptAnalysis(**canned_analysis()))
+    monkeypatch.setattr(generator, "generate_content", lambda topic, analysis, usage, **kw: ContentDraft(**canned_draft(config)))
+    monkeypatch.setattr(video_generator, "generate_base_image", lambda prompt, path, post_id=None, scene_index=None: images.append((post_id, scene_index)))
+    worker = SpeculativeWorker()
+    worker.max_images = 2
+    worker.daily_budget = 100.0
+    candidate = dict(topic="Deep Sea Vents", source="recent_post", topic_key=topic_key("Deep Sea Vents"), tone=worker.tone, duration=worker.duration, platform=worker.platform)
+
+    assert asyncio.run(worker._speculate(candidate, "speculative:deep sea vents")) is True
+
+    # Images are requested under the speculation's own post id, so reuse is capped and recorded
+    assert images == [("speculative:deep sea vents", 0), ("speculative:deep sea vents", 1)]
+    taken = worker.take("  deep sea VENTS ", worker.tone, worker.duration, worker.platform, post_id="99")
+    assert taken is not None and taken[1].title == "Benchmark Mission"
+    # A draft is handed out once
+    assert worker.take("deep sea vents", worker.tone, worker.duration, worker.platform, post_id="100") is None
@@ -0,0 +1,63 @@
+import sys
+import types
+import asyncio
+from benchmarks.stub_providers import synthetic_wav
+from tools.audio_gen import AudioGenerator
+from tools.scene_planner import measure_voiceover, words_path
+
+WORDS = [("Hello", 0.0, 0.4), ("there", 0.5, 0.9), ("world.", 1.0, 1.6)]
+
+class FakeCommunicate:
+    """Stands in for edge_tts.Communicate: one audio chunk plus word boundaries in 100 ns ticks."""
+    def __init__(self, text, voice, boundary=None):
+        self.text = text
+
+    async def stream(self):
+        yield {"type": "audio", "data": synthetic_wav(2.0)}
+        for text, start, end in WORDS:
+            yield {"type": "WordBoundary", "text": text, "offset": int(start * 1e7), "duration": int((end - start) * 1e7)}
+
+def test_edge_word_timings_follow_the_hedged_audio(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "edge_tts", types.SimpleNamespace(Communicate=FakeCommunicate))
+    monkeypatch.delenv("ELEVENLABS_API_KEY", raising=False)
+    generator = AudioGenerator(output_dir=str(tmp_path))
+    generator.api_key = None
+
+    path = asyncio.run(generator.generate_speech_async("Hello there world.", "voice_test.mp3"))
+
+    assert path == str(tmp_path / "voice_test.mp3")
+    measured = measure_voiceover(path)
+    assert measured["source"] == "word_boundaries"
+    assert [w["text"] for w in measured["words"]] == ["Hello", "there", "world."]
+    assert abs(measured["words"][-1]["end"] - 1.6) < 1e-6
+    # Nothing is left behind under the provider's part name
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["voice_test.mp3", "voice_test.mp3.words.json"]
+
+def test_stale_word_timings_are_dropped_when_another_provider_wins(tmp_path, monkeypatch):
+    monkeypatch.delenv("ELEVENLABS_API_KEY", raising=False)
+    generator = AudioGenerator(output_dir=str(tmp_path))
+    generator.api_key = None
+    output = tmp_path / "voice_test.mp3"
+    with open(words_path(str(output)), "w") as f:
+        f.write('[{"text": "old", "start": 0, "end": 1}]')
+
+    async def speak_without_words(text, path):
+        with open(path, "wb") as f:
+            f.write(synthetic_wav(1.0))
+        return path
+
+    generator._speak_edge = speak_without_words
+    asyncio.run(generator.generate_speech_async("Hello", "voice_test.mp3"))
+
+    assert measure_voiceover(str(output))["words"] is None
+
+def test_edge_fallback_is_stored_under_its_own_name(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "edge_tts", types.SimpleNamespace(Communicate=FakeCommunicate))
+    monkeypatch.delenv("ELEVENLABS_API_KEY", raising=False)
+    generator = AudioGenerator(output_dir=str(tmp_path))
+    generator.api_key = None
+
+    path = asyncio.run(generator.generate_speech_async("Hello there world.", "voice_full.mp3", fallbacks={"edge": "voice_edge.mp3"}))
+
+    assert path == str(tmp_path / "voice_edge.mp3")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["voice_edge.mp3", "voice_edge.mp3.words.json"]
@@ -0,0 +1,173 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import threading
+from typing import Dict, Optional
+from tools.deadline import STAGES, stage_seconds
+from tools.metrics import metrics
+
+class AdmissionController:
+    """
+    Admission control for workflow runs. At most WORKFLOW_CONCURRENCY runs
+    execute at once; the rest wait in admission order. Every admitted run
+    carries its expected remaining work (per-node p50s, minus time already
+    spent in the current node), and a new request is refused with a
+    Retry-After once that backlog would pass ADMISSION_MAX_BACKLOG_SECONDS.
+    ETAs come from replaying the backlog onto the concurrency slots, so a
+    queued run's estimate includes the runs ahead of it.
+    """
+    def __init__(self):
+        self.concurrency = max(1, int(os.environ.get("WORKFLOW_CONCURRENCY", "4")))
+        self.max_backlog = float(os.environ.get("ADMISSION_MAX_BACKLOG_SECONDS", "1800"))
+        self._lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # post id -> {"admitted", "started", "stage", "stage_started", "predicted"}, in admission order
+        self._jobs: Dict[str, Dict] = {}
+        self.stats = {"admitted": 0, "rejected": 0, "finished": 0, "eta_abs_error_total": 0.0}
+
+    @staticmethod
+    def workflow_seconds() -> float:
+        return sum(stage_seconds(stage) for stage in STAGES)
+
+    def _remaining(self, job: Dict, now: float) -> float:
+        if job["stage"] is None:
+            return self.workflow_seconds()
+        index = STAGES.index(job["stage"])
+        current = max(stage_seconds(job["stage"]) - (now - job["stage_started"]), 0.0)
+        return current + sum(stage_seconds(stage) for stage in STAGES[index + 1:])
+
+    def _schedule(self, now: float) -> Dict[str, float]:
+        """Seconds from now until each job finishes, running jobs first, then queued ones in order."""
+        slots = [0.0] * self.concurrency
+        finish = {}
+        running = [(pid, job) for pid, job in self._jobs.items() if job["started"] is not None]
+        queued = [(pid, job) for pid, job in self._jobs.items() if job["started"] is None]
+        for pid, job in running + queued:
+            start = heapq.heappop(slots)
+            finish[pid] = start + self._remaining(job, now)
+            heapq.heappush(slots, finish[pid])
+        return finish
+
+    def backlog_seconds(self) -> float:
+        now = time.time()
+        with self._lock:
+            return sum(self._remaining(job, now) for job in self._jobs.values())
+
+    def retry_after(self) -> Optional[int]:
+        """
+        None if a new run fits the backlog budget, else the seconds after
+        which enough of the backlog should have drained for it to fit.
+        """
+        backlog = self.backlog_seconds()
+        cost = self.workflow_seconds()
+        with self._lock:
+            idle = not self._jobs
+        if idle or backlog + cost <= self.max_backlog:
+            return None
+        with self._lock:
+            self.stats["rejected"] += 1
+        metrics.admission_decisions.inc(decision="rejected")
+        return max(1, math.ceil((backlog + cost - self.max_backlog) / self.concurrency))
+
+    def admit(self, post_id: str) -> Dict:
+        """Queues the post's run; returns its initial ETA."""
+        now = time.time()
+        with self._lock:
+            self._jobs[str(post_id)] = {"admitted": now, "started": None, "stage": None, "stage_started": None, "predicted": None}
+            self.stats["admitted"] += 1
+        metrics.admission_decisions.inc(decision="admitted")
+        eta = self.eta(post_id)
+        with self._lock:
+            if str(post_id) in self._jobs:
+                self._jobs[str(post_id)]["predicted"] = eta["eta_at"]
+        return eta
+
+    def queued(self, post_id: str) -> bool:
+        """True if the run has to wait for a free slot."""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["started"] is not None)
+            return str(post_id) in self._jobs and running >= self.concurrency
+
+    async def start(self, post_id: str):
+        """Waits, in admission order, for one of the concurrency slots; finish() gives it back."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        post_id = str(post_id)
+        with self._lock:
+            if post_id not in self._jobs:
+                self._jobs[post_id] = {"admitted": time.time(), "started": None, "stage": None, "stage_started": None, "predicted": None}
+        await self._semaphore.acquire()
+        with self._lock:
+            self._jobs[post_id]["started"] = time.time()
+
+    def enter_stage(self, post_id: Optional[str], stage: str):
+        """Called as a node starts, so the run's remaining work shrinks as it progresses."""
+        if post_id is None or stage not in STAGES:
+            return
+        with self._lock:
+            job = self._jobs.get(str(post_id))
+            if job:
+                job["stage"], job["stage_started"] = stage, time.time()
+
+    def finish(self, post_id: str, completed: bool = False):
+        """
+        Forgets the run (queued or not) and frees its slot if it had one.
+        Completed runs are scored against their admission-time ETA.
+        """
+        with self._lock:
+            job = self._jobs.pop(str(post_id), None)
+            if not job or job["started"] is None:
+                return
+            if completed and job["predicted"]:
+                self.stats["finished"] += 1
+                self.stats["eta_abs_error_total"] += abs(time.time() - job["predicted"])
+        self._semaphore.release()
+
+    def etas(self) -> Dict[str, Dict]:
+        now = time.time()
+        with self._lock:
+            finish = self._schedule(now)
+            order = [pid for pid, job in self._jobs.items() if job["started"] is None]
+        return {
+            pid: {
+                "eta_seconds": round(seconds, 1),
+                "eta_at": now + seconds,
+                "queue_position": order.index(pid) + 1 if pid in order else 0,
+            }
+            for pid, seconds in finish.items()
+        }
+
+    def idle(self) -> bool:
+        """True when no run is queued or executing."""
+        with self._lock:
+            return not self._jobs
+
+    def active(self, post_id: str) -> bool:
+        """True while the post's run is queued or executing."""
+        with self._lock:
+            return str(post_id) in self._jobs
+
+    def eta(self, post_id: str) -> Optional[Dict]:
+        return self.etas().get(str(post_id))
+
+    def snapshot(self) -> Dict:
+        etas = self.etas()
+        with self._lock:
+            stats = dict(self.stats)
+            running = sum(1 for job in self._jobs.values() if job["started"] is not None)
+        error_total = stats.pop("eta_abs_error_total")
+        stats.update({
+            "concurrency": self.concurrency,
+            "running": running,
+            "queued": len(etas) - running,
+            "backlog_seconds": round(self.backlog_seconds(), 1),
+            "max_backlog_seconds": self.max_backlog,
+            "workflow_seconds": round(self.workflow_seconds(), 1),
+            "eta_mean_abs_error_seconds": round(error_total / stats["finished"], 1) if stats["finished"] else None,
+            "jobs": etas,
+        })
+        return stats
+
+admission = AdmissionController()
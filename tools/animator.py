@@ -1,8 +1,74 @@
 import os
-from moviepy import ImageClip, AudioFileClip, VideoFileClip, ColorClip, CompositeVideoClip, concatenate_videoclips
-import moviepy.video.fx as vfx
-import moviepy.audio.fx as afx
-from typing import List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
+from tools.metrics import metrics
+from tools.memory import PeakMemorySampler
+from tools.tracing import tracer
+from tools.render_scheduler import render_scheduler
+from tools.cancellation import writing
+from tools.artifacts import temp_path
+
+# Overlap between consecutive scenes; the scene planner sizes clips around it
+CROSSFADE_SECONDS = 0.5
+
+def _close_all(clips):
+    for clip in clips:
+        if clip is None:
+            continue
+        try:
+            clip.close()
+        except Exception as e:
+            print(f"Warning: failed to close clip ({e})")
+
+class SceneWindow:
+    """
+    Frame source for streaming assembly. Scene i occupies
+    [start_i, start_i + duration_i) where each scene starts `fade` seconds
+    before the previous one ends (the later scene is drawn on top, as with
+    compose + negative padding) and the timeline loops. Only the scene on top
+    is drawn, so a single decoder is open at a time: it is opened when the
+    playhead enters a scene and closed as soon as it leaves.
+    """
+    def __init__(self, scenes: List[Tuple[str, float, tuple]], size: Tuple[int, int], fade: float = CROSSFADE_SECONDS):
+        self.paths = [path for path, _, _ in scenes]
+        self.durations = [duration for _, duration, _ in scenes]
+        self.size = size
+        self.starts = []
+        position = 0.0
+        for duration in self.durations:
+            self.starts.append(position)
+            position += duration - fade
+        self.total = self.starts[-1] + self.durations[-1]
+        self._open: Dict[int, object] = {}
+        self.peak_open = 0
+        self.opens = 0
+
+    def _clip(self, index: int):
+        from moviepy import VideoFileClip
+        if index in self._open:
+            return self._open[index]
+        # Scenes the playhead has left are done (until the next loop)
+        for stale in list(self._open):
+            self._open.pop(stale).close()
+        clip = VideoFileClip(self.paths[index], audio=False, target_resolution=self.size)
+        self._open[index] = clip
+        self.opens += 1
+        self.peak_open = max(self.peak_open, len(self._open))
+        return clip
+
+    def frame(self, t: float):
+        local_t = t % self.total
+        index = 0
+        for i, start in enumerate(self.starts):
+            if start <= local_t:
+                index = i
+        clip = self._clip(index)
+        offset = min(local_t - self.starts[index], max(0.0, clip.duration - 1.0 / 24))
+        return clip.get_frame(offset)
+
+    def close(self):
+        _close_all(self._open.values())
+        self._open.clear()
 
 class CharacterAnimator:
     def __init__(self, output_dir: str = None):
@@ -11,19 +77,146 @@ class CharacterAnimator:
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def assemble_multi_scene_video(self, video_paths: List[str], voice_path: str, output_filename: str, music_path: Optional[str] = None) -> Optional[str]:
+    def assemble_multi_scene_video(self, video_paths: List[str], voice_path: str, output_filename: str, music_path: Optional[str] = None, preset: str = "medium", report: Optional[Dict] = None) -> Optional[str]:
         """
         Concatenates multiple cinematic clips with smooth crossfades and adds dual-track audio.
         Uses a robust padding/fading approach to eliminate black frames.
+
+        ASSEMBLY_MODE=streaming (default) decodes scenes through a sliding window
+        so memory stays flat regardless of scene count; ASSEMBLY_MODE=compose is
+        the original all-clips-open moviepy composite. Peak memory is reported
+        for every job: process-wide, plus the job's own ffmpeg processes.
+        `preset` is the x264 preset (a faster one when a deadline is close).
+        Assemblies run concurrently on one animator, so the job's report
+        (mode, alignment, threads, memory) goes into the caller's `report`
+        dict rather than onto the instance.
+        """
+        mode = os.environ.get("ASSEMBLY_MODE", "streaming")
+        report = {} if report is None else report
+        print(f"--- Assembling Multi-Scene Cinematic Video ({mode}): {output_filename} ---")
+        output_path = os.path.join(self.output_dir, output_filename)
+        with PeakMemorySampler(paths=list(video_paths) + [voice_path, music_path, temp_path(output_path)]) as memory:
+            if mode == "compose":
+                result = self._assemble_compose(video_paths, voice_path, output_path, music_path, preset, report)
+            else:
+                result = self._assemble_streaming(video_paths, voice_path, output_path, music_path, preset, report)
+        report.update(memory.report())
+        report.update({"mode": mode, "scenes": len(video_paths), "output": output_filename})
+        metrics.render_peak_memory.observe(memory.peak_bytes, step="assemble")
+        span = tracer.current_span()
+        if span:
+            span.set_attribute("peak_rss_mb", report["peak_mb"])
+            span.set_attribute("peak_job_ffmpeg_mb", report["peak_job_ffmpeg_mb"])
+            span.set_attribute("assembly_mode", mode)
+        print(f"--- Assembly memory: process peak {report['peak_mb']} MB (start {report['start_mb']} MB), job ffmpeg peak {report['peak_job_ffmpeg_mb']} MB, {mode} ---")
+        return result
+
+    def _report_alignment(self, timeline: float, voice: float, report: Dict):
+        """
+        Scenes planned against the measured voiceover line up exactly; anything
+        else is looped (repeated frames) or trimmed (rendered frames thrown away).
+        """
+        gap = voice - timeline
+        report["looped_seconds"] = round(max(gap, 0.0), 3)
+        report["trimmed_seconds"] = round(max(-gap, 0.0), 3)
+        span = tracer.current_span()
+        if span:
+            span.set_attribute("looped_seconds", report["looped_seconds"])
+            span.set_attribute("trimmed_seconds", report["trimmed_seconds"])
+        if abs(gap) > 1.0 / 24:
+            print(f"--- Scene timeline {timeline:.2f}s vs voiceover {voice:.2f}s: {'looping' if gap > 0 else 'trimming'} {abs(gap):.2f}s ---")
+
+    def _write(self, final_clip, output_path: str, preset: str, report: Dict):
+        # The deliverable encode outranks scene renders for encoder threads.
+        # moviepy muxes audio from a temp file in the working directory.
+        # The video is encoded to a temp path and moved in whole: an unchanged
+        # manifest reuses whatever sits at output_path.
+        partial = temp_path(output_path)
+        temp_audio = os.path.splitext(os.path.basename(partial))[0] + "TEMP_MPY_wvf_snd.mp4"
+        with render_scheduler.slot("final", progress=1.0, label=os.path.basename(output_path)) as threads, writing(partial, temp_audio):
+            report["threads"] = threads
+            started = time.perf_counter()
+            final_clip.write_videofile(
+                partial,
+                fps=24,
+                codec="libx264",
+                audio_codec="aac",
+                preset=preset,
+                threads=threads,
+                ffmpeg_params=["-pix_fmt", "yuv420p", "-movflags", "+faststart"]
+            )
+            elapsed = time.perf_counter() - started
+        os.replace(partial, output_path)
+        metrics.observe_stage("render.assemble", elapsed)
+        metrics.observe_render("assemble", final_clip.duration * 24, elapsed)
+
+    def _assemble_streaming(self, video_paths: List[str], voice_path: str, output_path: str, music_path: Optional[str], preset: str, report: Dict) -> Optional[str]:
         """
+        Same timeline as the compose path (clips overlap by the fade padding, the
+        later clip on top, looped to the voiceover), but frames are pulled from
+        a SceneWindow that keeps one decoder alive at a time and lets ffmpeg do
+        the resize.
+        """
+        from moviepy import AudioFileClip, VideoClip
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+        opened = []
+        window = None
+        final_clip = None
         try:
-            print(f"--- Assembling Multi-Scene Cinematic Video (with Fades): {output_filename} ---")
+            scenes = []
+            for path in video_paths:
+                if not os.path.exists(path):
+                    continue
+                info = ffmpeg_parse_infos(path)
+                if info.get("duration"):
+                    scenes.append((path, info["duration"], info["video_size"]))
+            if not scenes:
+                print("No valid video clips found for assembly.")
+                return None
+
             voice_audio = AudioFileClip(voice_path)
+            opened.append(voice_audio)
+
+            # Standardize height to 1080 (even dimensions for H.264)
+            w, h = scenes[0][2]
+            if h != 1080:
+                w, h = round(w * 1080 / h), 1080
+            size = (w - w % 2, h - h % 2)
+
+            window = SceneWindow(scenes, size)
+            self._report_alignment(window.total, voice_audio.duration, report)
+            video = VideoClip(frame_function=window.frame, duration=voice_audio.duration).with_fps(24)
+            final_audio = self.mix_background_music(voice_audio, music_path, voice_audio.duration, opened=opened)
+            final_clip = video.with_audio(final_audio)
+
+            self._write(final_clip, output_path, preset, report)
+            print(f"--- Streaming assembly: {len(scenes)} scenes, at most {window.peak_open} decoder(s) open, {window.opens} opens ---")
+            return output_path
+        except Exception as e:
+            print(f"Multi-Scene Assembly Error: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+        finally:
+            if window is not None:
+                window.close()
+            _close_all([final_clip] + opened)
+
+    def _assemble_compose(self, video_paths: List[str], voice_path: str, output_path: str, music_path: Optional[str], preset: str, report: Dict) -> Optional[str]:
+        from moviepy import AudioFileClip, VideoFileClip, concatenate_videoclips
+        import moviepy.video.fx as vfx
+        opened = []
+        final_clip = None
+        try:
+            voice_audio = AudioFileClip(voice_path)
+            opened.append(voice_audio)
             
             raw_clips = []
             for path in video_paths:
                 if os.path.exists(path):
                     clip = VideoFileClip(path)
+                    opened.append(clip)
                     # Standardize height and ensure 24fps for stability
                     if clip.h != 1080:
                         clip = clip.resized(height=1080)
@@ -35,7 +228,7 @@ class CharacterAnimator:
                 return None
             
             # Implementation of smooth crossfades
-            fade_duration = 0.5
+            fade_duration = CROSSFADE_SECONDS
 
             final_video = concatenate_videoclips(
                 raw_clips,
@@ -43,6 +236,8 @@ class CharacterAnimator:
                 padding=-fade_duration
             )
 
+            self._report_alignment(final_video.duration, voice_audio.duration, report)
+
             # Match video length to voice length
             if final_video.duration < voice_audio.duration:
                 # Calculate necessary loops
@@ -53,29 +248,7 @@ class CharacterAnimator:
             final_video = final_video.with_duration(voice_audio.duration)
             
             # Handle background music
-            final_audio = voice_audio
-            if music_path and os.path.exists(music_path):
-                try:
-                    print(f"Layering background music: {music_path}")
-                    bg_music = AudioFileClip(music_path)
-                    
-                    if bg_music.duration > 0:
-                        # Loop music to match video
-                        if bg_music.duration < final_video.duration:
-                            from moviepy.audio.fx import audio_loop
-                            bg_music = audio_loop(bg_music, duration=final_video.duration)
-                        
-                        # Trim and lower volume
-                        bg_music = bg_music.with_duration(final_video.duration).fx(afx.MultiplyVolume, 0.15)
-                        
-                        # Mix voice and bg music
-                        from moviepy.audio.AudioClip import CompositeAudioClip
-                        final_audio = CompositeAudioClip([voice_audio, bg_music])
-                    else:
-                        print("Background music has 0 duration, skipping.")
-                except Exception as e:
-                    print(f"Warning: Could not layer background music ({e}). Falling back to voice only.")
-                    final_audio = voice_audio
+            final_audio = self.mix_background_music(voice_audio, music_path, final_video.duration, opened=opened)
 
             # Final assembly
             final_clip = final_video.with_audio(final_audio)
@@ -84,29 +257,49 @@ class CharacterAnimator:
             w, h = final_clip.size
             final_clip = final_clip.resized((w - w % 2, h - h % 2))
 
-            output_path = os.path.join(self.output_dir, output_filename)
-
-            final_clip.write_videofile(
-                output_path,
-                fps=24,
-                codec="libx264",
-                audio_codec="aac",
-                preset="medium",
-                threads=4,
-                ffmpeg_params=["-pix_fmt", "yuv420p", "-movflags", "+faststart"]
-            )
-
-            # Close clips to free resources
-            voice_audio.close()
-            for c in raw_clips: c.close()
-            final_clip.close()
-            
+            self._write(final_clip, output_path, preset, report)
             return output_path
         except Exception as e:
             print(f"Multi-Scene Assembly Error: {e}")
             import traceback
             traceback.print_exc()
             return None
+        finally:
+            # Close clips to free resources (and their ffmpeg readers) on every path
+            _close_all([final_clip] + opened)
+
+    def mix_background_music(self, voice_audio, music_path: Optional[str], duration: float, opened: Optional[list] = None):
+        """
+        Layers looped, ducked background music under the voiceover.
+        Returns the voice track unchanged if there is no usable music.
+        The music reader is appended to `opened` so the caller can close it.
+        """
+        from moviepy import AudioFileClip
+        import moviepy.audio.fx as afx
+        if not music_path or not os.path.exists(music_path):
+            return voice_audio
+        try:
+            print(f"Layering background music: {music_path}")
+            bg_music = AudioFileClip(music_path)
+            if opened is not None:
+                opened.append(bg_music)
+            if bg_music.duration <= 0:
+                print("Background music has 0 duration, skipping.")
+                return voice_audio
+
+            # Loop music to match video
+            if bg_music.duration < duration:
+                bg_music = bg_music.with_effects([afx.AudioLoop(duration=duration)])
+
+            # Trim and lower volume
+            bg_music = bg_music.with_duration(duration).with_effects([afx.MultiplyVolume(0.15)])
+
+            # Mix voice and bg music
+            from moviepy.audio.AudioClip import CompositeAudioClip
+            return CompositeAudioClip([voice_audio, bg_music])
+        except Exception as e:
+            print(f"Warning: Could not layer background music ({e}). Falling back to voice only.")
+            return voice_audio
 
     def create_cinematic_video(self, video_path: str, audio_path: str, output_filename: str) -> Optional[str]:
         # ... (existing method kept for single-scene fallback compatibility if needed)
@@ -114,13 +307,19 @@ class CharacterAnimator:
         Creates a cinematic video by combining an AI-generated clip with audio.
         Loops the video to match audio duration.
         """
+        from moviepy import AudioFileClip, VideoFileClip, ColorClip
+        import moviepy.video.fx as vfx
+        opened = []
+        final_clip = None
         try:
             print(f"--- Assembling Cinematic Video: {output_filename} ---")
             audio = AudioFileClip(audio_path)
+            opened.append(audio)
             
             if video_path and os.path.exists(video_path):
                 print(f"Using generated cinematic video: {video_path}")
                 base_video = VideoFileClip(video_path)
+                opened.append(base_video)
                 
                 # Loop the video to match audio duration
                 num_loops = int(audio.duration / base_video.duration) + 1
@@ -140,19 +339,26 @@ class CharacterAnimator:
             output_path = os.path.join(self.output_dir, output_filename)
             
             # Fast settings, forcing browser-safe pixel format
-            final_clip.write_videofile(
-                output_path, 
-                fps=24, # Professional cinematic fps
-                codec="libx264", 
-                audio_codec="aac",
-                preset="medium", # Better quality than ultrafast
-                threads=4,
-                ffmpeg_params=["-pix_fmt", "yuv420p", "-movflags", "+faststart"]
-            )
+            with render_scheduler.slot("final", progress=1.0, label=output_filename) as threads:
+                started = time.perf_counter()
+                final_clip.write_videofile(
+                    output_path, 
+                    fps=24, # Professional cinematic fps
+                    codec="libx264", 
+                    audio_codec="aac",
+                    preset="medium", # Better quality than ultrafast
+                    threads=threads,
+                    ffmpeg_params=["-pix_fmt", "yuv420p", "-movflags", "+faststart"]
+                )
+                elapsed = time.perf_counter() - started
+            metrics.observe_stage("render.single", elapsed)
+            metrics.observe_render("single", final_clip.duration * 24, elapsed)
             
             return output_path
         except Exception as e:
             print(f"Animation Error: {e}")
             return None
+        finally:
+            _close_all([final_clip] + opened)
 
 animator = CharacterAnimator()
@@ -0,0 +1,91 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional
+
+# Bump when generate_video's motion model changes so old scene renders are not reused
+MOTION_VERSION = 1
+
+def content_hash(*parts) -> str:
+    """Short, stable hash of JSON-serialisable inputs."""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def temp_path(path: str) -> str:
+    """
+    Where a content-keyed file is written before os.replace() moves it into
+    place, so an interrupted write never sits under the key as a cache hit.
+    The extension stays last: ffmpeg and PIL pick the format from it.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp{ext}"
+
+def is_temp_path(path: str) -> bool:
+    """True for a temp_path() file, or the audio temp moviepy muxes from next to one."""
+    name = os.path.basename(path)
+    return ".tmp." in name or name.endswith(".tmpTEMP_MPY_wvf_snd.mp4")
+
+class ArtifactStore:
+    """
+    Names every intermediate media file after a hash of the inputs that
+    produce it, so an unchanged scene, voiceover or music bed is found on disk
+    and reused across reruns (and across posts), and editing one scene only
+    invalidates that scene. A per-post manifest ties the keys together; its
+    hash decides whether the final assembly has to run again.
+    """
+    def __init__(self, asset_dir: str = None):
+        self.asset_dir = asset_dir or os.environ.get("ARTIFACT_DIR", "frontend/assets")
+
+    def _path(self, prefix: str, key: str, ext: str) -> str:
+        return os.path.join(self.asset_dir, f"{prefix}_{key}.{ext}")
+
+    def scene(self, index: int, prompt: str, style: str, duration: float, aspect_ratio: str, preset: str = "medium") -> Dict:
+        # The image only depends on what is drawn; motion is seeded from the same
+        # inputs so a re-render of an unchanged scene is frame-identical.
+        # Degraded variants (a faster encoder preset, local music, another voice)
+        # get their own keys so they never stand in for the full-quality file.
+        image_key = content_hash("image", prompt, style)
+        seed = int(content_hash("motion", prompt, style), 16) % (2 ** 31)
+        video_parts = ("scene", image_key, round(duration, 4), aspect_ratio, seed, MOTION_VERSION)
+        video_key = content_hash(*video_parts) if preset == "medium" else content_hash(*video_parts, preset)
+        return {
+            "index": index,
+            "prompt": prompt,
+            "style": style,
+            "duration": round(duration, 4),
+            "aspect_ratio": aspect_ratio,
+            "seed": seed,
+            "preset": preset,
+            "image_key": image_key,
+            "video_key": video_key,
+            "image_path": self._path("scene", image_key, "png"),
+            "video_path": self._path("scene_raw", video_key, "mp4"),
+        }
+
+    def voice(self, text: str, variant: str = "") -> Dict:
+        key = content_hash("voice", text, variant) if variant else content_hash("voice", text)
+        return {"key": key, "filename": f"voice_{key}.mp3"}
+
+    def music(self, mood: str, duration: int, variant: str = "") -> Dict:
+        key = content_hash("music", mood, duration, variant) if variant else content_hash("music", mood, duration)
+        return {"key": key, "path": self._path("music", key, "mp3")}
+
+    def manifest(self, post_id: str, voice_path: str, scenes: List[Dict], music: Dict, settings: Optional[Dict] = None) -> Dict:
+        """Everything the final video is built from; `hash` changes iff any input does."""
+        settings = settings or {}
+        return {
+            "post_id": str(post_id),
+            "voice_path": voice_path,
+            "scenes": scenes,
+            "music": music,
+            "settings": settings,
+            "hash": content_hash(voice_path, [s["video_key"] for s in scenes], music["key"], settings),
+        }
+
+    def diff(self, previous: Optional[Dict], current: Dict) -> Dict:
+        """Which scene indices changed since the previous manifest."""
+        old = {s["index"]: s["video_key"] for s in (previous or {}).get("scenes", [])}
+        changed = [s["index"] for s in current["scenes"] if old.get(s["index"]) != s["video_key"]]
+        return {"changed_scenes": changed, "unchanged": previous is not None and previous.get("hash") == current["hash"]}
+
+artifact_store = ArtifactStore()
@@ -1,9 +1,11 @@
 import os
 import asyncio
-import edge_tts
-from typing import Optional
-from openai import OpenAI
+import threading
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from tools.rate_limiter import rate_limiter
+from tools.hedging import hedger, provider_timeout
+from tools.scene_planner import save_words
 import re
 
 def clean_narration_text(text: str) -> str:
@@ -31,74 +33,128 @@ class AudioGenerator:
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
         self.api_key = os.environ.get("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=self.api_key) if self.api_key else None
+        # openai and edge_tts are imported on first use so importing this module stays cheap
+        self.client = None
+        self._ready = False
+        self._init_lock = threading.Lock()
 
-    async def generate_speech_async(self, text: str, filename: str) -> Optional[str]:
+    def warm_up(self):
+        """
+        Builds the OpenAI client once.
+        """
+        if self._ready:
+            return
+        with self._init_lock:
+            if not self._ready:
+                if self.api_key:
+                    from openai import OpenAI
+                    self.client = OpenAI(api_key=self.api_key)
+                self._ready = True
+
+    async def generate_speech_async(self, text: str, filename: str, only: Optional[List[str]] = None,
+                                    fallbacks: Optional[Dict[str, str]] = None) -> Optional[str]:
         """
         Converts text to speech using ElevenLabs as primary, 
         OpenAI TTS as secondary, and edge-tts as final fallback.
+        The provider router skips providers whose circuit breaker is open, and a
+        slow primary is hedged with the next provider in the chain.
+        `only` restricts the chain, e.g. ["edge"] when a deadline is close.
+        `fallbacks` maps providers to their own filenames, so a fallback voice
+        is never stored under the full-quality one.
         """
+        self.warm_up()
         output_path = os.path.join(self.output_dir, filename)
         text = clean_narration_text(text)
+        # The hedger moves the winner's word timings (if any) next to output_path
         
-        elevenlabs_key = os.environ.get("ELEVENLABS_API_KEY")
-        
-        # 1. Try ElevenLabs (Premium)
-        if elevenlabs_key:
-            try:
-                print(f"--- Generating Premium Speech (ElevenLabs): {filename} ---")
-                import requests
-                # Default "Adam" voice ID
-                voice_id = "pNInz6obpgDQGcFmaJgB" 
-                url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-                
-                headers = {
-                    "Accept": "audio/mpeg",
-                    "Content-Type": "application/json",
-                    "xi-api-key": elevenlabs_key
-                }
-                
-                data = {
-                    "text": text,
-                    "model_id": "eleven_monolingual_v1",
-                    "voice_settings": {
-                        "stability": 0.5,
-                        "similarity_boost": 0.75
-                    }
-                }
-                
-                response = requests.post(url, json=data, headers=headers)
-                if response.status_code == 200:
-                    with open(output_path, 'wb') as f:
-                        f.write(response.content)
-                    return output_path
-                else:
-                    print(f"ElevenLabs API Error ({response.status_code}): {response.text}")
-            except Exception as e:
-                print(f"ElevenLabs Error, falling back: {e}")
-
-        # 2. Try OpenAI TTS (Standard)
+        providers = {}
+        if os.environ.get("ELEVENLABS_API_KEY"):
+            providers["elevenlabs"] = self._speak_elevenlabs
         if self.api_key and self.client:
-            try:
-                print(f"--- Generating Speech (OpenAI TTS): {filename} ---")
-                response = self.client.audio.speech.create(
-                    model="tts-1",
-                    voice="onyx",
-                    input=text
-                )
-                response.stream_to_file(output_path)
-                return output_path
-            except Exception as e:
-                print(f"OpenAI TTS Error, falling back to Edge TTS: {e}")
+            providers["openai"] = self._speak_openai
+        providers["edge"] = self._speak_edge
+        if only:
+            providers = {name: fn for name, fn in providers.items() if name in only}
+
+        outputs = {provider: os.path.join(self.output_dir, name) for provider, name in (fallbacks or {}).items()}
+        result = await hedger.run_chain("tts", {name: (lambda path, fn=fn: fn(text, path)) for name, fn in providers.items()}, output_path, outputs)
+        if not result:
+            print("Audio Generation Error: all TTS providers failed")
+        return result
 
-        # Fallback to Edge TTS
-        try:
-            print(f"--- Generating Speech (Edge TTS Fallback): {filename} ---")
-            communicate = edge_tts.Communicate(text, "en-US-ChristopherNeural")
-            await communicate.save(output_path)
-            return output_path
-        except Exception as e:
-            print(f"Audio Generation Error: {e}")
+    async def _speak_elevenlabs(self, text: str, output_path: str) -> Optional[str]:
+        """Premium speech via ElevenLabs."""
+        import requests
+        print(f"--- Generating Premium Speech (ElevenLabs): {os.path.basename(output_path)} ---")
+        # Default "Adam" voice ID
+        voice_id = "pNInz6obpgDQGcFmaJgB" 
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        
+        headers = {
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": os.environ.get("ELEVENLABS_API_KEY")
+        }
+        
+        data = {
+            "text": text,
+            "model_id": "eleven_monolingual_v1",
+            "voice_settings": {
+                "stability": 0.5,
+                "similarity_boost": 0.75
+            }
+        }
+        
+        async with rate_limiter.limit_async("elevenlabs_tts"):
+            response = await asyncio.to_thread(requests.post, url, json=data, headers=headers, timeout=provider_timeout("elevenlabs_tts"))
+        if response.status_code != 200:
+            print(f"ElevenLabs API Error ({response.status_code}): {response.text}")
             return None
+        with open(output_path, 'wb') as f:
+            f.write(response.content)
+        return output_path
+
+    async def _speak_openai(self, text: str, output_path: str) -> Optional[str]:
+        """Standard speech via OpenAI tts-1."""
+        print(f"--- Generating Speech (OpenAI TTS): {os.path.basename(output_path)} ---")
+        async with rate_limiter.limit_async("openai_tts"):
+            response = await asyncio.to_thread(
+                self.client.audio.speech.create,
+                model="tts-1",
+                voice="onyx",
+                input=text,
+                timeout=provider_timeout("openai_tts")
+            )
+        # Written after the last await so a cancelled hedge leaves no file behind
+        with open(output_path, 'wb') as f:
+            f.write(response.content)
+        return output_path
+
+    async def _speak_edge(self, text: str, output_path: str) -> Optional[str]:
+        """
+        Free Edge TTS fallback. Also records the word boundaries (seconds) next
+        to the audio so scene cuts can be planned against the narration.
+        """
+        import edge_tts
+        print(f"--- Generating Speech (Edge TTS Fallback): {os.path.basename(output_path)} ---")
+        communicate = edge_tts.Communicate(text, "en-US-ChristopherNeural", boundary="WordBoundary")
+        audio = bytearray()
+        words = []
+
+        async def collect():
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    audio.extend(chunk["data"])
+                elif chunk["type"] == "WordBoundary":
+                    # Offsets and durations are in 100 ns ticks
+                    start = chunk["offset"] / 1e7
+                    words.append({"text": chunk["text"], "start": start, "end": start + chunk["duration"] / 1e7})
+
+        await asyncio.wait_for(collect(), timeout=provider_timeout("edge_tts"))
+        with open(output_path, 'wb') as f:
+            f.write(audio)
+        if words:
+            save_words(output_path, words)
+        return output_path
 
 audio_generator = AudioGenerator()
@@ -0,0 +1,220 @@
+import os
+import csv
+import io
+import uuid
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from database import db
+from tools.admission import admission
+from tools.rate_limiter import rate_limiter
+
+# A post in one of these states is no longer being worked on by its run
+FINISHED_STATUSES = {"READY_FOR_APPROVAL", "PENDING_APPROVAL", "APPROVED", "PUBLISHED", "ERROR", "CANCELLED"}
+EXPORT_FIELDS = ["position", "topic", "tone", "duration", "platform", "visual_style", "music_mood", "post_id", "status", "progress", "title", "video_url", "error"]
+
+def group_key(spec: Dict) -> Optional[str]:
+    """
+    Items that can share cached work: the same pinned style (scene prompts,
+    sanitizer cache) and the same pinned music mood at the same length (one
+    music track). Items without pins share nothing and get no group.
+    """
+    if not spec.get("visual_style") and not spec.get("music_mood"):
+        return None
+    return "|".join([spec.get("visual_style") or "", spec.get("music_mood") or "", str(spec.get("duration") or "")])
+
+class BatchScheduler:
+    """
+    Runs a list of workflow specs (a content calendar) as one batch.
+    Items sharing a group key go back to back: the first one runs alone and
+    fills the caches (music track, sanitized prompts, image reuse index), the
+    rest follow in parallel and hit them. Groups start largest first. How many
+    items run at once is derived from the image provider's rate limit, the
+    scarcest budget a workflow spends, so a batch queues itself instead of
+    piling waiters onto the limiter. Runs go through the normal admission path;
+    a 429 is waited out. The plan and each item's state live in the batches
+    tables, so a restart picks up where the last process stopped (resume()).
+    """
+    def __init__(self):
+        self.concurrency_override = int(os.environ.get("BATCH_CONCURRENCY", "0"))
+        self.images_per_workflow = int(os.environ.get("BATCH_IMAGES_PER_WORKFLOW", "5"))
+        self.poll_seconds = float(os.environ.get("BATCH_POLL_SECONDS", "2"))
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def concurrency(self) -> int:
+        if self.concurrency_override > 0:
+            return self.concurrency_override
+        rpm = rate_limiter.get("openai_images").rpm
+        if not rpm:
+            return admission.concurrency
+        # Images one workflow needs per minute of its run, against the per-minute budget
+        workflow_minutes = admission.workflow_seconds() / 60.0
+        fits = int(rpm * workflow_minutes / max(self.images_per_workflow, 1))
+        return max(1, min(admission.concurrency, fits))
+
+    def plan(self, specs: List[Dict]) -> List[List[Dict]]:
+        """Items grouped for cache reuse, groups largest first, each in submission order."""
+        groups: Dict[str, List[Dict]] = {}
+        singles = []
+        for position, spec in enumerate(specs):
+            item = {"position": position, "spec": spec, "group_key": group_key(spec)}
+            if item["group_key"] is None:
+                singles.append([item])
+            else:
+                groups.setdefault(item["group_key"], []).append(item)
+        ordered = sorted(groups.values(), key=len, reverse=True) + singles
+        run_order = 0
+        for group in ordered:
+            for item in group:
+                item["run_order"] = run_order
+                run_order += 1
+        return ordered
+
+    @staticmethod
+    def regroup(items: List[Dict]) -> List[List[Dict]]:
+        """The groups of a stored batch, rebuilt from its items' run order."""
+        groups: List[List[Dict]] = []
+        for item in sorted(items, key=lambda i: i["run_order"]):
+            if groups and item["group_key"] is not None and groups[-1][0]["group_key"] == item["group_key"]:
+                groups[-1].append(item)
+            else:
+                groups.append([item])
+        return groups
+
+    def start(self, specs: List[Dict], submit: Callable[[Dict], Awaitable[str]]) -> Dict:
+        """
+        Stores the batch and starts running it in the background. `submit`
+        starts one workflow for a spec and returns its post id.
+        """
+        batch_id = uuid.uuid4().hex[:12]
+        groups = self.plan(specs)
+        concurrency = self.concurrency()
+        db.save_batch(batch_id, [item for group in groups for item in group], concurrency)
+        self._tasks[batch_id] = asyncio.create_task(self._run(batch_id, groups, concurrency, submit))
+        print(f"--- Batch {batch_id}: {len(specs)} workflows in {len(groups)} group(s), {concurrency} at a time ---")
+        return {"batch_id": batch_id, "items": len(specs), "groups": len(groups), "concurrency": concurrency}
+
+    def resume(self, submit: Callable[[Dict], Awaitable[str]]) -> List[str]:
+        """
+        Restarts the batches a previous process left RUNNING. Items it never
+        submitted run as planned. A submitted item whose post had not finished
+        died with that process; its post is marked ERROR so submitting the
+        spec again resumes the same post from its checkpoint.
+        """
+        resumed = []
+        for batch_id in db.get_batch_ids("RUNNING"):
+            if batch_id in self._tasks:
+                continue
+            batch = db.get_batch(batch_id)
+            remaining = []
+            for item in batch["items"]:
+                if item["status"] == "SUBMITTED" and item.get("post_status") and item["post_status"] not in FINISHED_STATUSES:
+                    db.update_post_status(item["post_id"], "ERROR")
+                    remaining.append(item)
+                elif item["status"] == "PENDING":
+                    remaining.append(item)
+            groups = self.regroup(remaining)
+            self._tasks[batch_id] = asyncio.create_task(self._run(batch_id, groups, batch["concurrency"], submit))
+            resumed.append(batch_id)
+            print(f"--- Batch {batch_id}: resumed with {len(remaining)} of {len(batch['items'])} workflows left ---")
+        return resumed
+
+    async def _run(self, batch_id: str, groups: List[List[Dict]], concurrency: int, submit):
+        gate = asyncio.Semaphore(concurrency)
+
+        async def run_item(item: Dict):
+            async with gate:
+                try:
+                    post_id = await submit(item["spec"])
+                except Exception as e:
+                    print(f"Batch {batch_id}: item {item['position']} failed to start: {e}")
+                    db.update_batch_item(batch_id, item["position"], "FAILED", error=str(e))
+                    return
+                db.update_batch_item(batch_id, item["position"], "SUBMITTED", post_id=post_id)
+                await self._wait(post_id)
+
+        async def run_group(group: List[Dict]):
+            # The first item warms the caches the rest of its group reads
+            await run_item(group[0])
+            await asyncio.gather(*(run_item(item) for item in group[1:]))
+
+        try:
+            await asyncio.gather(*(run_group(group) for group in groups))
+            db.finish_batch(batch_id, "DONE")
+        except asyncio.CancelledError:
+            db.finish_batch(batch_id, "CANCELLED")
+            raise
+        finally:
+            self._tasks.pop(batch_id, None)
+
+    async def _wait(self, post_id: str):
+        while True:
+            post = db.get_post(post_id)
+            if not post or (post["status"] in FINISHED_STATUSES and not admission.active(post_id)):
+                return
+            await asyncio.sleep(self.poll_seconds)
+
+    async def cancel(self, batch_id: str) -> bool:
+        """
+        Stops submitting the batch's items and marks the ones not yet
+        submitted CANCELLED. False if the batch was no longer running.
+        """
+        task = self._tasks.get(batch_id)
+        if task is not None:
+            task.cancel()
+        return db.cancel_batch(batch_id) or task is not None
+
+    @staticmethod
+    def item_status(item: Dict) -> str:
+        return item["post_status"] if item.get("post_id") and item.get("post_status") else item["status"]
+
+    def progress(self, batch: Dict) -> Dict:
+        """Aggregate progress of a batch from db.get_batch()."""
+        items = batch["items"]
+        counts: Dict[str, int] = {}
+        total_progress = 0
+        for item in items:
+            status = self.item_status(item)
+            counts[status] = counts.get(status, 0) + 1
+            if status in FINISHED_STATUSES:
+                total_progress += 100
+            elif item.get("progress"):
+                total_progress += item["progress"]
+        etas = admission.etas()
+        pending = [etas[str(i["post_id"])]["eta_seconds"] for i in items if i.get("post_id") and str(i["post_id"]) in etas]
+        return {
+            "items": len(items),
+            "finished": sum(1 for i in items if self.item_status(i) in FINISHED_STATUSES or self.item_status(i) in ("FAILED", "DELETED")),
+            "by_status": counts,
+            "progress": round(total_progress / len(items), 1) if items else 100.0,
+            "running_eta_seconds": max(pending) if pending else None,
+        }
+
+    def export_rows(self, batch: Dict) -> List[Dict]:
+        rows = []
+        for item in batch["items"]:
+            spec, draft = item["spec"], item.get("draft") or {}
+            rows.append({
+                "position": item["position"],
+                "topic": spec.get("topic"),
+                "tone": spec.get("tone"),
+                "duration": spec.get("duration"),
+                "platform": spec.get("platform"),
+                "visual_style": spec.get("visual_style"),
+                "music_mood": spec.get("music_mood"),
+                "post_id": item.get("post_id"),
+                "status": self.item_status(item),
+                "progress": item.get("progress"),
+                "title": draft.get("title"),
+                "video_url": item.get("video_url"),
+                "error": item.get("error"),
+            })
+        return rows
+
+    def export_csv(self, batch: Dict) -> str:
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.export_rows(batch))
+        return out.getvalue()
+
+batch_scheduler = BatchScheduler()
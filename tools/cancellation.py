@@ -0,0 +1,193 @@
+import os
+import time
+import signal
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from tools.memory import processes_naming
+from tools.artifacts import is_temp_path
+
+class WorkflowCancelled(BaseException):
+    """
+    Raised at the next cancellation check of a cancelled workflow. Like
+    asyncio.CancelledError it is not an Exception, so the providers'
+    `except Exception` fallbacks do not swallow it or count it as a failure.
+    """
+
+class CancelToken:
+    """
+    Cancellation state of one workflow run. It travels with the run's context
+    (asyncio tasks, to_thread and tracer.bind submissions), and records the
+    temp files the run is writing so a cancel can kill their encoders and
+    delete them. Content-keyed outputs are shared across posts and are only
+    ever moved into place complete, so they are never registered here.
+    """
+    def __init__(self, post_id: str, task: Optional[asyncio.Task] = None):
+        self.post_id = str(post_id)
+        self.task = task
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        # path -> {"active": block still running, "future": worker future that may outlive it}
+        self._writing: Dict[str, Dict] = {}
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str):
+        self.reason = self.reason or reason
+        self._event.set()
+
+    def check(self):
+        if self._event.is_set():
+            raise WorkflowCancelled(self.reason or "cancelled")
+
+    @contextmanager
+    def writing(self, *paths: str, future: Optional[Future] = None):
+        """
+        Marks output files as being written. They are forgotten when the block
+        completes and kept as partial if it raises; a worker `future` keeps
+        them in flight until the worker itself finishes.
+        """
+        with self._lock:
+            for path in paths:
+                self._writing[path] = {"active": True, "future": future}
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                for path in paths:
+                    if path in self._writing:
+                        self._writing[path]["active"] = False
+            raise
+        with self._lock:
+            for path in paths:
+                self._writing.pop(path, None)
+
+    def partial_outputs(self) -> List[str]:
+        """This run's own temp files; anything else registered is left alone."""
+        with self._lock:
+            return [path for path in self._writing if is_temp_path(path)]
+
+    def in_flight(self) -> List[str]:
+        """Partial outputs something is still writing."""
+        with self._lock:
+            return [
+                path for path, entry in self._writing.items()
+                if entry["active"] or (entry["future"] is not None and not entry["future"].done())
+            ]
+
+_current_token: contextvars.ContextVar = contextvars.ContextVar("cancel_token", default=None)
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+def check_cancelled():
+    """Raises WorkflowCancelled if the calling workflow has been cancelled (no-op outside one)."""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+@contextmanager
+def writing(*paths: str, future: Optional[Future] = None):
+    """CancelToken.writing for the calling workflow (no-op outside one)."""
+    token = _current_token.get()
+    if token is None:
+        yield
+        return
+    with token.writing(*paths, future=future):
+        yield
+
+def kill_encoders(paths: List[str]) -> List[int]:
+    """Terminates ffmpeg (or any) descendants of this process whose command line names one of `paths`."""
+    killed = []
+    for pid in processes_naming(paths):
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed.append(pid)
+        except OSError:
+            pass
+    return killed
+
+class CancellationRegistry:
+    """
+    Cancel tokens of the workflows running in this process, by post id.
+    cancel() flags the token (provider calls and graph nodes check it) and
+    cancels the asyncio task, then keeps killing the encoders of the run's
+    in-flight outputs (a render worker may only start ffmpeg after the task is
+    gone) until nothing is writing or CANCEL_TIMEOUT_SECONDS pass, and finally
+    deletes the run's temp files. Shared content-keyed files are never removed.
+    """
+    def __init__(self):
+        self.timeout = float(os.environ.get("CANCEL_TIMEOUT_SECONDS", "15"))
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+
+    def start(self, post_id: str) -> CancelToken:
+        """Registers the current task as the post's run and binds its token to the current context."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        token = CancelToken(post_id, task)
+        with self._lock:
+            self._tokens[str(post_id)] = token
+        _current_token.set(token)
+        return token
+
+    def finish(self, token: CancelToken):
+        with self._lock:
+            if self._tokens.get(token.post_id) is token:
+                del self._tokens[token.post_id]
+
+    def get(self, post_id: str) -> Optional[CancelToken]:
+        with self._lock:
+            return self._tokens.get(str(post_id))
+
+    async def cancel(self, post_id: str, reason: str = "cancelled", extra_paths: List[str] = ()) -> Dict:
+        """
+        Stops the post's run, if any, and removes its partial outputs (plus
+        `extra_paths`). Returns what was done; `stopped` is False if the run
+        did not finish within the timeout.
+        """
+        token = self.get(post_id)
+        report = {"post_id": str(post_id), "running": token is not None, "stopped": True, "killed_processes": 0, "removed": []}
+        paths = list(extra_paths)
+        if token is not None:
+            token.cancel(reason)
+            task = token.task
+            if task is asyncio.current_task():
+                task = None
+            if task is not None:
+                task.cancel()
+            deadline = time.monotonic() + self.timeout
+            while True:
+                writing_now = token.in_flight()
+                report["killed_processes"] += len(kill_encoders(writing_now))
+                if not writing_now and (task is None or task.done()):
+                    break
+                if time.monotonic() > deadline:
+                    report["stopped"] = False
+                    break
+                await asyncio.sleep(0.1)
+            paths.extend(token.partial_outputs())
+            print(f"--- Cancelled workflow {post_id} ({reason}): stopped={report['stopped']}, killed {report['killed_processes']} encoder(s) ---")
+        for path in dict.fromkeys(paths):
+            try:
+                if path and os.path.exists(path):
+                    os.remove(path)
+                    report["removed"].append(path)
+            except OSError as e:
+                print(f"Could not remove {path}: {e}")
+        return report
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            tokens = list(self._tokens.values())
+        return [{"post_id": t.post_id, "cancelled": t.cancelled, "writing": t.partial_outputs()} for t in tokens]
+
+cancellation = CancellationRegistry()
@@ -0,0 +1,164 @@
+import time
+import sqlite3
+from typing import Any, Dict, Iterator, Optional, Sequence
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple, WRITES_IDX_MAP, get_checkpoint_id, get_checkpoint_metadata
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from database import db
+
+# Pydantic models carried in AgentState, registered so checkpoints load them without warnings
+STATE_TYPES = [("models", name) for name in ("TrendData", "ScriptAnalysis", "Scene", "ContentDraft")]
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver on the app's SQLite database, one thread per
+    post id. Every node boundary is persisted (state plus the pending writes
+    of finished tasks), so a failed workflow resumes at the node that failed
+    with the exact AgentState it had, instead of being rebuilt from the posts row.
+    Connections are opened per call like the rest of the Database layer.
+    """
+    def __init__(self, db_path: str = None):
+        super().__init__(serde=JsonPlusSerializer(allowed_msgpack_modules=STATE_TYPES))
+        # Tables are created by Database.init_db alongside the rest of the schema
+        self.db_path = db_path or db.db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    @staticmethod
+    def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> Dict:
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _tuple(self, conn: sqlite3.Connection, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, _, c_type, c_blob, m_type, m_blob = row
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT task_id, channel, value_type, value FROM workflow_checkpoint_writes '
+            'WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx',
+            (thread_id, checkpoint_ns, checkpoint_id)
+        )
+        writes = [(task_id, channel, self.serde.loads_typed((v_type, value))) for task_id, channel, v_type, value in cursor.fetchall()]
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((c_type, c_blob)),
+            metadata=self.serde.loads_typed((m_type, m_blob)),
+            parent_config=self._config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=writes,
+        )
+
+    def get_tuple(self, config: Dict) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            if checkpoint_id:
+                cursor.execute('SELECT * FROM workflow_checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?',
+                               (thread_id, checkpoint_ns, checkpoint_id))
+            else:
+                # Checkpoint ids are time-ordered, so the largest is the latest
+                cursor.execute('SELECT * FROM workflow_checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1',
+                               (thread_id, checkpoint_ns))
+            row = cursor.fetchone()
+            return self._tuple(conn, row) if row else None
+        finally:
+            conn.close()
+
+    def list(self, config: Optional[Dict], *, filter: Optional[Dict[str, Any]] = None, before: Optional[Dict] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query, params = 'SELECT * FROM workflow_checkpoints WHERE 1 = 1', []
+        if config:
+            query += ' AND thread_id = ?'
+            params.append(str(config["configurable"]["thread_id"]))
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += ' AND checkpoint_ns = ?'
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query += ' AND checkpoint_id = ?'
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query += ' AND checkpoint_id < ?'
+            params.append(get_checkpoint_id(before))
+        query += ' ORDER BY checkpoint_id DESC'
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            found = 0
+            for row in rows:
+                item = self._tuple(conn, row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                yield item
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+        finally:
+            conn.close()
+
+    def put(self, config: Dict, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> Dict:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c_type, c_blob = self.serde.dumps_typed(checkpoint)
+        m_type, m_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO workflow_checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 time.time(), c_type, c_blob, m_type, m_blob)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: Dict, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        replace, keep = [], []
+        for idx, (channel, value) in enumerate(writes):
+            v_type, v_blob = self.serde.dumps_typed(value)
+            row = (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, v_type, v_blob, task_path)
+            # Special channels (errors, interrupts) are overwritten; regular writes are first-wins
+            (replace if channel in WRITES_IDX_MAP else keep).append(row)
+        conn = self._connect()
+        try:
+            conn.executemany('INSERT OR REPLACE INTO workflow_checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', replace)
+            conn.executemany('INSERT OR IGNORE INTO workflow_checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', keep)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete_thread(self, thread_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM workflow_checkpoints WHERE thread_id = ?', (str(thread_id),))
+            conn.execute('DELETE FROM workflow_checkpoint_writes WHERE thread_id = ?', (str(thread_id),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # The graph runs async; SQLite calls are short enough to make inline
+    async def aget_tuple(self, config: Dict) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[Dict], *, filter: Optional[Dict[str, Any]] = None, before: Optional[Dict] = None, limit: Optional[int] = None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: Dict, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> Dict:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: Dict, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+def workflow_config(post_id) -> Dict:
+    """Graph config for a post: its checkpoints live on thread `post_id`."""
+    return {"configurable": {"thread_id": str(post_id)}}
+
+checkpointer = SQLiteCheckpointer()
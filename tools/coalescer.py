@@ -0,0 +1,114 @@
+import os
+import time
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+from tools.metrics import metrics
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different workflow request."""
+
+class WorkflowCoalescer:
+    """
+    Single-flight for /api/run-workflow. Requests with the same topic (case
+    and whitespace insensitive), tone, duration, platform, captions setting,
+    style pins, profiling flag and deadline share one run: while it is in flight, an identical request
+    attaches to it and gets its post id instead of starting a second pipeline.
+    A client idempotency key additionally pins its post id for
+    IDEMPOTENCY_WINDOW_SECONDS, so a retry after the run ended still does not
+    start a new one. Work saved is the leader's wall time per attached request.
+    """
+    def __init__(self):
+        self.enabled = os.environ.get("COALESCE_WORKFLOWS", "1") == "1"
+        self.window = float(os.environ.get("IDEMPOTENCY_WINDOW_SECONDS", "600"))
+        self._lock = threading.Lock()
+        # fingerprint -> {"post_id", "started", "attached"}
+        self._in_flight: Dict[str, Dict] = {}
+        # idempotency key -> {"post_id", "fingerprint", "expires"}
+        self._keys: Dict[str, Dict] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "idempotent_replays": 0, "workflows_saved": 0, "seconds_saved": 0.0}
+
+    @staticmethod
+    def fingerprint(request) -> str:
+        fields = {
+            "topic": " ".join((request.topic or "").lower().split()),
+            "tone": request.tone,
+            "duration": request.duration,
+            "platform": request.platform,
+            "use_captions": request.use_captions,
+            "visual_style": request.visual_style,
+            "music_mood": request.music_mood,
+            # A profiled run records a profile, and a deadline can degrade the output
+            "profile": bool(request.profile),
+            "deadline_seconds": request.deadline_seconds,
+        }
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _expire(self):
+        now = time.time()
+        for key in [k for k, v in self._keys.items() if v["expires"] < now]:
+            del self._keys[key]
+
+    def attach(self, request, idempotency_key: Optional[str] = None) -> Optional[str]:
+        """
+        Post id of an existing run this request should share, or None if it
+        has to start its own. Raises IdempotencyConflict for a key that was
+        used with a different request.
+        """
+        fp = self.fingerprint(request)
+        with self._lock:
+            self._expire()
+            if idempotency_key and idempotency_key in self._keys:
+                entry = self._keys[idempotency_key]
+                if entry["fingerprint"] != fp:
+                    raise IdempotencyConflict(f"Idempotency key {idempotency_key!r} was used for a different request")
+                self.stats["idempotent_replays"] += 1
+                metrics.coalesced_requests.inc(kind="idempotent")
+                return entry["post_id"]
+            if not self.enabled or fp not in self._in_flight:
+                return None
+            run = self._in_flight[fp]
+            run["attached"] += 1
+            self.stats["coalesced"] += 1
+            if idempotency_key:
+                self._keys[idempotency_key] = {"post_id": run["post_id"], "fingerprint": fp, "expires": time.time() + self.window}
+        metrics.coalesced_requests.inc(kind="in_flight")
+        print(f"--- Coalesced identical workflow request onto post {run['post_id']} ---")
+        return run["post_id"]
+
+    def lead(self, request, post_id: str, idempotency_key: Optional[str] = None) -> str:
+        """Registers a starting run; returns the token to pass to finish()."""
+        fp = self.fingerprint(request)
+        with self._lock:
+            self.stats["leaders"] += 1
+            if self.enabled:
+                self._in_flight[fp] = {"post_id": str(post_id), "started": time.perf_counter(), "attached": 0}
+            if idempotency_key:
+                self._keys[idempotency_key] = {"post_id": str(post_id), "fingerprint": fp, "expires": time.time() + self.window}
+        return fp
+
+    def finish(self, fp: str, post_id: str):
+        """Ends the run's coalescing window and credits the work its followers did not redo."""
+        with self._lock:
+            run = self._in_flight.get(fp)
+            if not run or run["post_id"] != str(post_id):
+                return
+            del self._in_flight[fp]
+            if run["attached"]:
+                self.stats["workflows_saved"] += run["attached"]
+                self.stats["seconds_saved"] += run["attached"] * (time.perf_counter() - run["started"])
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            self._expire()
+            stats = dict(self.stats, seconds_saved=round(self.stats["seconds_saved"], 1))
+            stats.update({
+                "enabled": self.enabled,
+                "idempotency_window_seconds": self.window,
+                "in_flight": [{"post_id": r["post_id"], "attached": r["attached"]} for r in self._in_flight.values()],
+                "idempotency_keys": len(self._keys),
+            })
+        return stats
+
+coalescer = WorkflowCoalescer()
@@ -1,9 +1,14 @@
 import os
 import json
 import re
-from openai import OpenAI
+import threading
+from typing import Callable, Dict, Optional, Tuple
 from models import TrendData, ScriptAnalysis, ContentDraft
 from dotenv import load_dotenv
+from tools.rate_limiter import rate_limiter, estimate_tokens
+from tools.hedging import provider_timeout
+from tools.metrics import metrics
+from tools.json_stream import DraftStreamParser
 
 load_dotenv()
 
@@ -11,7 +16,28 @@ class ContentGenerator:
     def __init__(self):
         self.openai_key = os.environ.get("OPENAI_API_KEY")
         self.gemini_key = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
-        
+        # Clients are built on first use so importing this module stays cheap
+        self._ready = False
+        self._init_lock = threading.Lock()
+        # "two_call" (analysis, then draft) or "fused" (both in one request)
+        self.script_mode = os.environ.get("SCRIPT_MODE", "two_call")
+        # Stream the draft and hand finished scenes downstream while the model is still writing
+        self.stream_drafts = os.environ.get("SCRIPT_STREAMING", "0") == "1"
+        self.stats: Dict[str, Dict] = {}
+        self._stats_lock = threading.Lock()
+
+    def warm_up(self):
+        """
+        Builds the Gemini model (or the OpenAI fallback client) once.
+        """
+        if self._ready:
+            return
+        with self._init_lock:
+            if not self._ready:
+                self._init_client()
+                self._ready = True
+
+    def _init_client(self):
         if self.gemini_key:
             try:
                 import google.generativeai as genai
@@ -30,12 +56,121 @@ class ContentGenerator:
             self.client = OpenAI(api_key=self.openai_key)
             self.model_name = "gpt-4o-mini"
 
-    def analyze_trend(self, trend, **kwargs) -> ScriptAnalysis:
+    def _generate_json(self, prompt: str, usage: Optional[Dict] = None) -> dict:
+        """
+        Runs a JSON-producing prompt on Gemini or OpenAI, queued behind the
+        shared per-provider rate limits. Token usage reported by the provider
+        (or a ~4 chars/token estimate) is added to `usage` when given.
+        """
+        self.warm_up()
+        tokens = estimate_tokens(prompt)
+        if self.use_gemini:
+            with rate_limiter.limit("gemini", tokens=tokens):
+                response = self.model.generate_content(prompt, request_options={"timeout": provider_timeout("gemini")})
+            text = response.text
+            reported = getattr(response, "usage_metadata", None)
+            prompt_tokens = getattr(reported, "prompt_token_count", None)
+            completion_tokens = getattr(reported, "candidates_token_count", None)
+            match = re.search(r'\{.*\}', text, re.DOTALL)
+            data = json.loads(match.group()) if match else {}
+        else:
+            with rate_limiter.limit("openai_chat", tokens=tokens):
+                response = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={"type": "json_object"},
+                    timeout=provider_timeout("openai_chat")
+                )
+            text = response.choices[0].message.content
+            reported = getattr(response, "usage", None)
+            prompt_tokens = getattr(reported, "prompt_tokens", None)
+            completion_tokens = getattr(reported, "completion_tokens", None)
+            data = json.loads(text)
+        self._add_usage(usage, prompt, text, prompt_tokens, completion_tokens)
+        return data
+
+    @staticmethod
+    def _add_usage(usage: Optional[Dict], prompt: str, text: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        if usage is None:
+            return
+        usage["calls"] = usage.get("calls", 0) + 1
+        usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (prompt_tokens or len(prompt) // 4)
+        usage["completion_tokens"] = usage.get("completion_tokens", 0) + (completion_tokens or len(text or "") // 4)
+
+    def _stream_json(self, prompt: str, parser: DraftStreamParser, on_item: Callable, usage: Optional[Dict] = None) -> dict:
+        """
+        Streaming variant of _generate_json: chunks are fed to `parser` as they
+        arrive and every array item it completes is passed to `on_item`. The
+        rate-limit slot is held until the stream ends.
+        """
+        self.warm_up()
+        tokens = estimate_tokens(prompt)
+        prompt_tokens = completion_tokens = None
+        if self.use_gemini:
+            with rate_limiter.limit("gemini", tokens=tokens):
+                response = self.model.generate_content(prompt, stream=True, request_options={"timeout": provider_timeout("gemini")})
+                for chunk in response:
+                    for item in parser.feed(chunk.text or ""):
+                        on_item(item)
+                    reported = getattr(chunk, "usage_metadata", None)
+                    prompt_tokens = getattr(reported, "prompt_token_count", None) or prompt_tokens
+                    completion_tokens = getattr(reported, "candidates_token_count", None) or completion_tokens
+        else:
+            with rate_limiter.limit("openai_chat", tokens=tokens):
+                stream = self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={"type": "json_object"},
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=provider_timeout("openai_chat")
+                )
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        for item in parser.feed(chunk.choices[0].delta.content):
+                            on_item(item)
+                    reported = getattr(chunk, "usage", None)
+                    if reported:
+                        prompt_tokens, completion_tokens = reported.prompt_tokens, reported.completion_tokens
+        self._add_usage(usage, prompt, "".join(parser.text), prompt_tokens, completion_tokens)
+        return parser.result()
+
+    def record_script_run(self, mode: str, seconds: float, usage: Dict):
+        """
+        Accumulates latency and token cost of one scripting phase (analysis +
+        draft) per mode, so fused and two-call runs can be compared.
+        """
+        metrics.observe_stage(f"script.{mode}", seconds)
+        metrics.llm_tokens.inc(usage.get("prompt_tokens", 0), mode=mode, direction="prompt")
+        metrics.llm_tokens.inc(usage.get("completion_tokens", 0), mode=mode, direction="completion")
+        with self._stats_lock:
+            entry = self.stats.setdefault(mode, {"runs": 0, "llm_calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+            entry["runs"] += 1
+            entry["llm_calls"] += usage.get("calls", 0)
+            entry["seconds"] += seconds
+            entry["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            entry["completion_tokens"] += usage.get("completion_tokens", 0)
+
+    def script_stats(self) -> Dict:
+        """Per-mode averages of the scripting phase."""
+        with self._stats_lock:
+            return {
+                mode: {
+                    "runs": s["runs"],
+                    "llm_calls_per_run": round(s["llm_calls"] / s["runs"], 2),
+                    "avg_seconds": round(s["seconds"] / s["runs"], 3),
+                    "avg_prompt_tokens": round(s["prompt_tokens"] / s["runs"], 1),
+                    "avg_completion_tokens": round(s["completion_tokens"] / s["runs"], 1),
+                }
+                for mode, s in self.stats.items() if s["runs"]
+            }
+
+    def _analysis_prompt(self, trend, **kwargs) -> str:
         desc = trend.description if hasattr(trend, 'description') else trend
         transcript = trend.transcript if hasattr(trend, 'transcript') else "N/A"
         hashtags = trend.hashtags if hasattr(trend, 'hashtags') else "N/A"
         
-        prompt = f"""
+        return f"""
         Act as a VIRAL SOCIAL MEDIA STRATEGIST.
         Analyze this topic for a cinematic video mission:
         Description: {desc}
@@ -48,19 +183,12 @@ class ContentGenerator:
         Output valid JSON only with these keys:
         hook_technique, hook_variations (list of 3), emotional_trigger, structural_pattern, target_audience_insight, virality_score (1-10).
         """
+
+    def analyze_trend(self, trend, usage: Optional[Dict] = None, **kwargs) -> ScriptAnalysis:
+        prompt = self._analysis_prompt(trend, **kwargs)
         
         try:
-            if self.use_gemini:
-                response = self.model.generate_content(prompt)
-                match = re.search(r'\{.*\}', response.text, re.DOTALL)
-                data = json.loads(match.group()) if match else {}
-            else:
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    response_format={"type": "json_object"}
-                )
-                data = json.loads(response.choices[0].message.content)
+            data = self._generate_json(prompt, usage)
             
             return ScriptAnalysis(**data)
         except Exception as e:
@@ -74,8 +202,117 @@ class ContentGenerator:
                 virality_score=5
             )
 
-    def generate_content(self, trend: TrendData, analysis: ScriptAnalysis, **kwargs) -> ContentDraft:
+    def generate_strategy_and_draft(self, trend, usage: Optional[Dict] = None, **kwargs) -> Tuple[ScriptAnalysis, ContentDraft]:
+        """
+        Fused scripting: one structured-output request returns both the
+        strategic analysis and the draft. Raises ValueError if the response
+        does not validate, so the caller can fall back to the two-call path.
+        """
         prompt = f"""
+        Act as a VIRAL SOCIAL MEDIA STRATEGIST and an expert Cinematic Creative Director.
+        Trend Context: {trend.description if hasattr(trend, 'description') else trend}
+
+        PARAMETERS:
+        Tone: {kwargs.get('tone', 'Professional')}
+        Duration: {kwargs.get('duration', 60)}s
+        Platform: {kwargs.get('platform', 'TikTok')}
+
+        TASKS:
+        1. Analyze the topic: hook technique, 3 hook variations, emotional trigger,
+           structural pattern, target audience insight, virality score (1-10).
+        2. Using that hook technique and emotional trigger, write a high-end cinematic
+           voiceover script ({kwargs.get('duration', 60)}s length).
+        3. Plan scenes with detailed Character Actions and Camera Movements.
+        4. Define a consistent 'visual_style_description'.
+
+        Output VALID JSON matching this schema:
+        {{
+            "analysis": {{
+                "hook_technique": "string",
+                "hook_variations": ["string", "string", "string"],
+                "emotional_trigger": "string",
+                "structural_pattern": "string",
+                "target_audience_insight": "string",
+                "virality_score": int
+            }},
+            "draft": {{
+                "title": "string",
+                "script": "string",
+                "hook_selected": "string",
+                "emotional_payoff": "string",
+                "caption": "string",
+                "visual_style_description": "string",
+                "visual_prompt": "string",
+                "music_mood_prompt": "string",
+                "visual_scenes": [
+                    {{ "prompt": "string", "duration": float, "aspect_ratio": "string" }}
+                ]
+            }}
+        }}
+        """
+        data = self._generate_json(prompt, usage)
+        try:
+            analysis = ScriptAnalysis(**data["analysis"])
+            draft = self._draft_from_data(data["draft"])
+        except Exception as e:
+            raise ValueError(f"fused response failed validation: {e}")
+        if not draft.script or not draft.visual_scenes:
+            raise ValueError("fused response has no script or scenes")
+        return analysis, draft
+
+    def _draft_from_data(self, data: dict) -> ContentDraft:
+        from models import Scene
+        scenes = [Scene(**s) for s in data.get('visual_scenes', [])]
+        
+        return ContentDraft(
+            title=data.get('title', 'Untitled'),
+            hook_selected=data.get('hook_selected', ''),
+            emotional_payoff=data.get('emotional_payoff', ''),
+            script=data.get('script', ''),
+            caption=data.get('caption', ''),
+            visual_prompt=data.get('visual_prompt', ''),
+            music_mood_prompt=data.get('music_mood_prompt', 'Ambient, cinematic background music'),
+            visual_style_description=data.get('visual_style_description', 'High-end cinema'),
+            visual_scenes=scenes
+        )
+
+    def generate_content_stream(self, trend: TrendData, analysis: ScriptAnalysis, on_scene: Callable, usage: Optional[Dict] = None, **kwargs) -> ContentDraft:
+        """
+        Streams the draft and calls on_scene(index, scene, fields) for every
+        `visual_scenes` entry as soon as it is complete and valid; `fields`
+        holds the top-level strings seen so far (visual_style_description is
+        requested before the scenes). The final ContentDraft is validated from
+        the full response; a failed stream falls back to generate_content.
+        """
+        from models import Scene
+        parser = DraftStreamParser("visual_scenes")
+        prompt = self._draft_prompt(trend, analysis, **kwargs) + """
+        Write the keys in exactly the order shown above.
+        """
+
+        emitted = 0
+
+        def emit(item: dict):
+            nonlocal emitted
+            index, emitted = emitted, emitted + 1
+            try:
+                scene = Scene(**item)
+            except Exception as e:
+                print(f"Streamed scene {index + 1} did not validate, waiting for the full draft: {e}")
+                return
+            on_scene(index, scene, dict(parser.fields))
+
+        try:
+            draft = self._draft_from_data(self._stream_json(prompt, parser, emit, usage))
+            if not draft.visual_scenes:
+                raise ValueError("streamed draft has no scenes")
+            return draft
+        except Exception as e:
+            print(f"Streamed draft failed ({e}), retrying without streaming")
+            return self.generate_content(trend, analysis, usage, **kwargs)
+
+    def _draft_prompt(self, trend, analysis: ScriptAnalysis, **kwargs) -> str:
+        return f"""
         Act as a expert Cinematic Creative Director (Gemini).
         Trend Context: {trend.description if hasattr(trend, 'description') else trend}
         Strategic Analysis: {analysis.hook_technique}, {analysis.emotional_trigger}
@@ -105,34 +342,13 @@ class ContentGenerator:
             ]
         }}
         """
+
+    def generate_content(self, trend: TrendData, analysis: ScriptAnalysis, usage: Optional[Dict] = None, **kwargs) -> ContentDraft:
+        prompt = self._draft_prompt(trend, analysis, **kwargs)
         
         try:
-            if self.use_gemini:
-                response = self.model.generate_content(prompt)
-                match = re.search(r'\{.*\}', response.text, re.DOTALL)
-                data = json.loads(match.group()) if match else {}
-            else:
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    response_format={"type": "json_object"}
-                )
-                data = json.loads(response.choices[0].message.content)
-            
-            from models import Scene
-            scenes = [Scene(**s) for s in data.get('visual_scenes', [])]
-            
-            return ContentDraft(
-                title=data.get('title', 'Untitled'),
-                hook_selected=data.get('hook_selected', ''),
-                emotional_payoff=data.get('emotional_payoff', ''),
-                script=data.get('script', ''),
-                caption=data.get('caption', ''),
-                visual_prompt=data.get('visual_prompt', ''),
-                music_mood_prompt=data.get('music_mood_prompt', 'Ambient, cinematic background music'),
-                visual_style_description=data.get('visual_style_description', 'High-end cinema'),
-                visual_scenes=scenes
-            )
+            data = self._generate_json(prompt, usage)
+            return self._draft_from_data(data)
         except Exception as e:
             print(f"Error generating content: {e}")
             return ContentDraft(
@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+from tools.latency import stage_latency
+from tools.metrics import metrics
+
+# Graph order, and what a node takes when there is no latency history yet
+STAGES = ("strategist", "creator", "voice", "animation")
+DEFAULT_STAGE_SECONDS = {"strategist": 8.0, "creator": 12.0, "voice": 8.0, "animation": 90.0}
+
+# Cheaper paths per node, in the order they are given up. Tier 1 applies once
+# the expected remaining work no longer fits the time left; tier 2 once it
+# overshoots by DEADLINE_SEVERE_PRESSURE.
+DEGRADATIONS = {
+    "voice": {1: ["edge_tts"]},
+    "animation": {1: ["local_music", "fast_preset"], 2: ["skip_sanitization", "fewer_scenes"]},
+}
+FAST_PRESET = "veryfast"
+
+def stage_seconds(stage: str) -> float:
+    """Typical wall time of one node: its rolling p50, else the default."""
+    p50 = stage_latency.percentile(f"node.{stage}", 50)
+    return p50 if p50 is not None else DEFAULT_STAGE_SECONDS[stage]
+
+class DeadlinePlanner:
+    """
+    Per-workflow deadlines. A deadline is a plain dict carried in AgentState
+    (so it survives checkpoints): {"at": epoch seconds, "budget": seconds}.
+    Before its expensive work each node asks plan() which degradations to
+    apply, based on the time left and the expected duration of the nodes
+    still to run (rolling p50 per node, else defaults). Finished runs are
+    counted as met/missed for hit-rate reporting.
+    """
+    def __init__(self):
+        self.default_budget = float(os.environ.get("WORKFLOW_DEADLINE_SECONDS", "0"))
+        self.safety = float(os.environ.get("DEADLINE_SAFETY", "1.2"))
+        self.severe = float(os.environ.get("DEADLINE_SEVERE_PRESSURE", "1.5"))
+        self.min_scenes = int(os.environ.get("DEADLINE_MIN_SCENES", "2"))
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "met": 0, "missed": 0, "degraded_runs": 0, "degradations": {}}
+
+    def new(self, budget_seconds: Optional[float] = None) -> Optional[Dict]:
+        budget = budget_seconds if budget_seconds is not None else self.default_budget
+        if not budget or budget <= 0:
+            return None
+        return {"at": time.time() + budget, "budget": float(budget)}
+
+    @staticmethod
+    def remaining(deadline: Optional[Dict]) -> Optional[float]:
+        return deadline["at"] - time.time() if deadline else None
+
+    def expected(self, stage: str) -> float:
+        """Expected seconds for `stage` and every node after it."""
+        return sum(stage_seconds(name) for name in STAGES[STAGES.index(stage):]) * self.safety
+
+    def pressure(self, deadline: Optional[Dict], stage: str) -> float:
+        """Expected remaining work over time left (> 1 means the deadline will be missed)."""
+        remaining = self.remaining(deadline)
+        if remaining is None:
+            return 0.0
+        if remaining <= 0:
+            return float("inf")
+        return self.expected(stage) / remaining
+
+    def plan(self, deadline: Optional[Dict], stage: str) -> List[str]:
+        pressure = self.pressure(deadline, stage)
+        tiers = DEGRADATIONS.get(stage, {})
+        applied = []
+        if pressure > 1.0:
+            applied += tiers.get(1, [])
+        if pressure > self.severe:
+            applied += tiers.get(2, [])
+        if applied:
+            print(f"--- Deadline: {self.remaining(deadline):.0f}s left for ~{self.expected(stage):.0f}s of work at {stage}, degrading: {', '.join(applied)} ---")
+        return applied
+
+    def scene_cap(self, deadline: Optional[Dict], count: int) -> int:
+        """Scenes that fit the time left, given the expected cost of the animation node."""
+        remaining = max(self.remaining(deadline) or 0.0, 0.0)
+        fits = int(count * remaining / self.expected("animation"))
+        return max(min(self.min_scenes, count), min(count, fits))
+
+    def finish(self, deadline: Optional[Dict], degradations: List[str]):
+        """Counts a finished run against its deadline (no-op without one)."""
+        if not deadline:
+            return
+        met = time.time() <= deadline["at"]
+        with self._lock:
+            self.stats["runs"] += 1
+            self.stats["met" if met else "missed"] += 1
+            if degradations:
+                self.stats["degraded_runs"] += 1
+            for name in degradations:
+                self.stats["degradations"][name] = self.stats["degradations"].get(name, 0) + 1
+        metrics.deadline_runs.inc(outcome="met" if met else "missed", degraded="yes" if degradations else "no")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats, degradations=dict(self.stats["degradations"]))
+        stats["hit_rate"] = round(stats["met"] / stats["runs"], 3) if stats["runs"] else None
+        stats.update({
+            "default_budget_seconds": self.default_budget,
+            "safety": self.safety,
+            "severe_pressure": self.severe,
+            "expected_seconds": {stage: round(self.expected(stage), 1) for stage in STAGES},
+        })
+        return stats
+
+deadline_planner = DeadlinePlanner()
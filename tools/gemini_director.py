@@ -1,56 +1,176 @@
+import os
 import json
 import re
+import threading
+from collections import OrderedDict
 from typing import Optional, List, Dict
 from dotenv import load_dotenv
+from tools.rate_limiter import rate_limiter, estimate_tokens
+from tools.hedging import provider_timeout
+from tools.metrics import metrics
 
 load_dotenv()
 
+SANITIZE_INSTRUCTION = """
+        You are a Cinematic Prompt Engineer specializing in photorealistic image generation.
+        Your goal is to rewrite the input prompt to be 'DALL-E 3 Safe' while maintaining its emotional power.
+        - Replace graphic violence with 'heroic struggle' or 'intense drama'.
+        - Replace gore with 'dramatic lighting' or 'intense atmosphere'.
+        - Ensure the prompt is descriptive (camera angles, lighting, textures).
+        """
+
+def styled_prompt(prompt: str, style: str) -> str:
+    """The image prompt for a scene: its own prompt plus the draft's shared visual style."""
+    return f"{prompt} | STYLE: {style}"
+
 class GeminiDirector:
     def __init__(self):
-        import os
         self.api_key = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
-        if self.api_key:
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-2.0-flash')
-            except Exception as e:
-                print(f"FAILED to initialize GeminiDirector: {e}")
-                self.model = None
-        else:
-            self.model = None
+        # The model is configured on first use so importing this module stays cheap
+        self.model = None
+        self._ready = False
+        self._init_lock = threading.Lock()
+        # Rewritten prompts by original prompt (LRU), shared by batch and single calls
+        self._sanitized: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_size = int(os.environ.get("SANITIZE_CACHE_SIZE", "1024"))
+        if not self.api_key:
             print("WARNING: Gemini API Key not found. GeminiDirector features will be limited.")
 
+    def warm_up(self):
+        """
+        Configures google.generativeai and builds the model once.
+        """
+        if self._ready:
+            return
+        with self._init_lock:
+            if self._ready:
+                return
+            if self.api_key:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self.model = genai.GenerativeModel('gemini-2.0-flash')
+                except Exception as e:
+                    print(f"FAILED to initialize GeminiDirector: {e}")
+                    self.model = None
+            self._ready = True
+
+    def _cached(self, prompt: str) -> Optional[str]:
+        with self._cache_lock:
+            clean = self._sanitized.get(prompt)
+            if clean is not None:
+                self._sanitized.move_to_end(prompt)
+        return clean
+
+    def _remember(self, prompt: str, clean: str):
+        with self._cache_lock:
+            self._sanitized[prompt] = clean
+            self._sanitized.move_to_end(prompt)
+            while len(self._sanitized) > self.cache_size:
+                self._sanitized.popitem(last=False)
+
     def sanitize_visual_prompt(self, prompt: str) -> str:
         """
         Uses Gemini to rewrite a visual prompt to be cinematic, descriptive, 
         and compliant with safety filters (e.g., DALL-E 3).
+        Prompts already rewritten (singly or by sanitize_scene_prompts) come from the cache.
         """
+        cached = self._cached(prompt)
+        metrics.cache_lookup("sanitize", hit=cached is not None)
+        if cached is not None:
+            return cached
+        self.warm_up()
         if not self.model:
             return prompt
 
-        system_instruction = """
-        You are a Cinematic Prompt Engineer specializing in photorealistic image generation.
-        Your goal is to rewrite the input prompt to be 'DALL-E 3 Safe' while maintaining its emotional power.
-        - Replace graphic violence with 'heroic struggle' or 'intense drama'.
-        - Replace gore with 'dramatic lighting' or 'intense atmosphere'.
-        - Ensure the prompt is descriptive (camera angles, lighting, textures).
-        - Output ONLY the rewritten prompt text.
+        system_instruction = SANITIZE_INSTRUCTION + """- Output ONLY the rewritten prompt text.
         """
 
         try:
-            response = self.model.generate_content([
-                {"role": "user", "parts": [f"{system_instruction}\n\nOriginal Prompt: {prompt}"]}
-            ])
-            return response.text.strip()
+            with rate_limiter.limit("gemini", tokens=estimate_tokens(prompt, completion_allowance=300)):
+                response = self.model.generate_content([
+                    {"role": "user", "parts": [f"{system_instruction}\n\nOriginal Prompt: {prompt}"]}
+                ], request_options={"timeout": provider_timeout("gemini")})
+            clean = response.text.strip()
+            if clean:
+                self._remember(prompt, clean)
+                return clean
+            return prompt
         except Exception as e:
             print(f"Gemini Sanitization Error: {e}")
             return prompt
 
+    def sanitize_scene_prompts(self, prompts: List[str], style: str) -> Dict[int, str]:
+        """
+        Rewrites all of a draft's scene prompts and its shared visual style in
+        one structured Gemini request instead of one round trip per scene.
+        Returns {scene index: sanitized styled_prompt(...)} and caches each
+        entry under the unsanitized styled prompt, so generate_base_image finds
+        it. Scenes already cached are not sent; scenes missing from (or empty
+        in) the batch response fall back to single sanitize_visual_prompt calls.
+        """
+        result, todo = {}, {}
+        for index, prompt in enumerate(prompts):
+            cached = self._cached(styled_prompt(prompt, style))
+            if cached is not None:
+                result[index] = cached
+            else:
+                todo[index] = prompt
+        if not todo:
+            return result
+        self.warm_up()
+        if not self.model:
+            result.update({i: styled_prompt(p, style) for i, p in todo.items()})
+            return result
+
+        batch = {
+            "visual_style": style,
+            "scenes": [{"index": i, "prompt": p} for i, p in todo.items()],
+        }
+        request = SANITIZE_INSTRUCTION + f"""- Apply these rules to the shared visual style and to every scene prompt below.
+        - Keep each scene's index.
+        - Output valid JSON only: {{"visual_style": "...", "scenes": [{{"index": 0, "prompt": "..."}}]}}
+
+        Scene Batch: {json.dumps(batch)}
+        """
+        rewritten = {}
+        clean_style = style
+        try:
+            with rate_limiter.limit("gemini", tokens=estimate_tokens(request, completion_allowance=300 * (len(todo) + 1))):
+                response = self.model.generate_content(request, request_options={"timeout": provider_timeout("gemini")})
+            match = re.search(r'\{.*\}', response.text, re.DOTALL)
+            data = json.loads(match.group()) if match else {}
+            if isinstance(data.get("visual_style"), str) and data["visual_style"].strip():
+                clean_style = data["visual_style"].strip()
+            for item in data.get("scenes") or []:
+                if not isinstance(item, dict) or not isinstance(item.get("prompt"), str):
+                    continue
+                try:
+                    index = int(item.get("index"))
+                except (TypeError, ValueError):
+                    continue
+                if index in todo and item["prompt"].strip():
+                    rewritten[index] = item["prompt"].strip()
+        except Exception as e:
+            print(f"Gemini Batch Sanitization Error: {e}")
+
+        for index, prompt in todo.items():
+            original = styled_prompt(prompt, style)
+            if index in rewritten:
+                result[index] = styled_prompt(rewritten[index], clean_style)
+                self._remember(original, result[index])
+            else:
+                result[index] = self.sanitize_visual_prompt(original)
+        if len(rewritten) < len(todo):
+            print(f"--- Batch sanitization: {len(rewritten)}/{len(todo)} scenes rewritten, {len(todo) - len(rewritten)} via single calls ---")
+        return result
+
     def analyze_social_context(self, context: str) -> Dict:
         """
         High-level strategic analysis of a trend or topic.
         """
+        self.warm_up()
         if not self.model:
             return {}
 
@@ -68,7 +188,8 @@ class GeminiDirector:
         """
 
         try:
-            response = self.model.generate_content(prompt)
+            with rate_limiter.limit("gemini", tokens=estimate_tokens(prompt)):
+                response = self.model.generate_content(prompt, request_options={"timeout": provider_timeout("gemini")})
             # Find JSON in response
             match = re.search(r'\{.*\}', response.text, re.DOTALL)
             if match:
@@ -0,0 +1,244 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional
+from tools.provider_router import provider_router
+from tools.rate_limiter import CallTimer, call_timer
+from tools.metrics import metrics
+from tools.tracing import tracer
+from tools.scene_planner import words_path
+
+# Explicit per-call deadlines in seconds. Override with PROVIDER_TIMEOUT_<NAME>.
+DEFAULT_TIMEOUTS = {
+    "elevenlabs_tts": 60.0,
+    "openai_tts": 60.0,
+    "edge_tts": 60.0,
+    "openai_images": 90.0,
+    "image_download": 30.0,
+    "gemini": 60.0,
+    "openai_chat": 90.0,
+    "elevenlabs_sound": 90.0,
+}
+
+def provider_timeout(provider: str) -> float:
+    value = os.environ.get(f"PROVIDER_TIMEOUT_{provider.upper()}")
+    return float(value) if value else DEFAULT_TIMEOUTS.get(provider, 60.0)
+
+def _part_path(output_path: str, provider: str) -> str:
+    # Keep the extension last: PIL picks the image format from it.
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.{provider}{ext}"
+
+def _discard(path: str):
+    # A TTS part may have left its word timings next to it
+    for name in (path, words_path(path)):
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+
+class Hedger:
+    """
+    Hedged fallback chains. The primary provider starts alone; if it has not
+    answered within its p95 latency (from the provider router's rolling window)
+    the next provider is fired in parallel. The hedge clock only runs while the
+    primary's request is actually out: time queued for a limiter slot or a
+    hedge thread does not count. The first good result wins and the rest are
+    cancelled. Each attempt writes to its own part file so a late
+    loser can never clobber the winner's output.
+    """
+    def __init__(self):
+        self.enabled = os.environ.get("HEDGE_ENABLED", "1") != "0"
+        self.percentile = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+        self.multiplier = float(os.environ.get("HEDGE_MULTIPLIER", "1.0"))
+        self.min_delay = float(os.environ.get("HEDGE_MIN_DELAY", "2"))
+        self.max_delay = float(os.environ.get("HEDGE_MAX_DELAY", "30"))
+        self.default_delay = float(os.environ.get("HEDGE_DEFAULT_DELAY", "15"))
+        self._executor = ThreadPoolExecutor(max_workers=int(os.environ.get("HEDGE_THREADS", "8")), thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedges_fired": 0, "hedges_won": 0, "failures": 0}
+
+    def hedge_delay(self, chain: str, provider: str) -> Optional[float]:
+        """Seconds to wait on `provider` before firing the next one (None = never hedge)."""
+        if not self.enabled:
+            return None
+        observed = provider_router.latency_percentile(chain, provider, self.percentile)
+        if observed is None:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, observed * self.multiplier))
+
+    def _remaining(self, chain: str, provider: str, timer: CallTimer, queue) -> Optional[float]:
+        """Seconds until `provider` should be hedged (<= 0: now), or None if it never is."""
+        delay = self.hedge_delay(chain, provider) if queue else None
+        if delay is None:
+            return None
+        return delay - timer.active_seconds()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _finish(self, chain: str, started: float, order, winner, hedged) -> Optional[str]:
+        metrics.observe_stage(f"provider.{chain}", time.monotonic() - started)
+        self._count("calls")
+        if winner is None:
+            self._count("failures")
+            return None
+        provider, part, output_path = winner
+        if provider in hedged:
+            self._count("hedges_won")
+            print(f"--- Hedge: {chain}.{provider} beat {order[0]} ---")
+        if not os.path.exists(part):
+            return None
+        os.replace(part, output_path)
+        # Word timings travel with the audio; a stale set from an earlier take must not survive
+        if os.path.exists(words_path(part)):
+            os.replace(words_path(part), words_path(output_path))
+        elif os.path.exists(words_path(output_path)):
+            os.remove(words_path(output_path))
+        return output_path
+
+    async def run_chain(self, chain: str, providers: Dict[str, Callable], output_path: str,
+                        outputs: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Async chain. Each provider is `async fn(path) -> Optional[str]` and
+        must only write `path` after its last await so cancellation is clean.
+        `outputs` gives providers whose result must not land on output_path
+        (e.g. a lower-quality fallback) a path of their own.
+        """
+        with tracer.span(f"chain.{chain}") as span:
+            result = await self._run_chain(chain, providers, output_path, outputs or {})
+            if span:
+                span.set_attribute("ok", bool(result))
+            return result
+
+    async def _run_chain(self, chain: str, providers: Dict[str, Callable], output_path: str, outputs: Dict[str, str]) -> Optional[str]:
+        order = provider_router.order(chain, list(providers))
+        queue = list(order)
+        pending = {}
+        hedged = set()
+        winner = None
+        started = time.monotonic()
+        timers: Dict[str, CallTimer] = {}
+
+        async def attempt(provider: str, part: str):
+            with call_timer(timers[provider]):
+                return await provider_router.run_async(chain, provider, providers[provider], part)
+
+        def launch() -> str:
+            provider = queue.pop(0)
+            part = _part_path(outputs.get(provider, output_path), provider)
+            timers[provider] = CallTimer()
+            pending[asyncio.create_task(attempt(provider, part))] = (provider, part)
+            return provider
+
+        try:
+            current = launch() if queue else None
+            while pending and winner is None:
+                remaining = self._remaining(chain, current, timers[current], queue)
+                if remaining is not None and remaining <= 0:
+                    print(f"--- Hedge: {chain}.{current} slower than {self.hedge_delay(chain, current):.1f}s, firing {queue[0]} in parallel ---")
+                    self._count("hedges_fired")
+                    current = launch()
+                    hedged.add(current)
+                    continue
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider, part = pending.pop(task)
+                    if task.result() and winner is None:
+                        winner = (provider, part, outputs.get(provider, output_path))
+                    else:
+                        _discard(part)
+                if winner is None and not pending and queue:
+                    current = launch()
+        finally:
+            for task, (provider, part) in pending.items():
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                for provider, part in pending.values():
+                    _discard(part)
+        return self._finish(chain, started, order, winner, hedged)
+
+    def run_chain_sync(self, chain: str, providers: Dict[str, Callable], output_path: str,
+                       outputs: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Blocking chain for sync providers (`fn(path) -> Optional[str]`). Threads
+        cannot be interrupted, so a cancelled loser finishes against its own
+        deadline and throws its output away. `outputs` as in run_chain().
+        """
+        with tracer.span(f"chain.{chain}") as span:
+            result = self._run_chain_sync(chain, providers, output_path, outputs or {})
+            if span:
+                span.set_attribute("ok", bool(result))
+            return result
+
+    def _run_chain_sync(self, chain: str, providers: Dict[str, Callable], output_path: str, outputs: Dict[str, str]) -> Optional[str]:
+        order = provider_router.order(chain, list(providers))
+        queue = list(order)
+        pending = {}
+        hedged = set()
+        winner = None
+        cancelled = threading.Event()
+        started = time.monotonic()
+        timers: Dict[str, CallTimer] = {}
+
+        def attempt(provider: str, part: str) -> Optional[str]:
+            # The timer starts here, once a hedge thread has picked the attempt up
+            with call_timer(timers[provider]):
+                result = provider_router.run(chain, provider, providers[provider], part)
+            if cancelled.is_set():
+                _discard(part)
+                return None
+            return result
+
+        def launch() -> str:
+            provider = queue.pop(0)
+            part = _part_path(outputs.get(provider, output_path), provider)
+            timers[provider] = CallTimer()
+            pending[self._executor.submit(tracer.bind(attempt), provider, part)] = (provider, part)
+            return provider
+
+        try:
+            current = launch() if queue else None
+            while pending and winner is None:
+                remaining = self._remaining(chain, current, timers[current], queue)
+                if remaining is not None and remaining <= 0:
+                    print(f"--- Hedge: {chain}.{current} slower than {self.hedge_delay(chain, current):.1f}s, firing {queue[0]} in parallel ---")
+                    self._count("hedges_fired")
+                    current = launch()
+                    hedged.add(current)
+                    continue
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    provider, part = pending.pop(future)
+                    if future.result() and winner is None:
+                        winner = (provider, part, outputs.get(provider, output_path))
+                    else:
+                        _discard(part)
+                if winner is None and not pending and queue:
+                    current = launch()
+        finally:
+            if pending:
+                cancelled.set()
+                for future, (provider, part) in pending.items():
+                    future.cancel()
+                    if future.done():
+                        _discard(part)
+        return self._finish(chain, started, order, winner, hedged)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "multiplier": self.multiplier,
+            "min_delay": self.min_delay,
+            "max_delay": self.max_delay,
+        })
+        return stats
+
+hedger = Hedger()
@@ -0,0 +1,144 @@
+import os
+import re
+import math
+import shutil
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+from database import db
+from tools.metrics import metrics
+from tools.artifacts import temp_path
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "with", "by", "from",
+    "into", "over", "under", "is", "are", "its", "it", "as", "style", "shot", "scene", "image",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased content words plus adjacent-word bigrams (so word order counts a little)."""
+    words = [w for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(w) > 2 and w not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+class ImageReuseIndex:
+    """
+    Local similarity index over the sanitized prompts of every generated scene
+    image, so a new scene whose prompt is close enough to an earlier one (from
+    another post) copies that image instead of paying for a fresh DALL-E call.
+    Similarity is TF-IDF cosine over prompt words and bigrams; it needs no
+    model or network, and the corpus stays small (one row per image).
+    Reuse is capped per post and never picks an image the post already shows,
+    so videos do not repeat themselves; each reuse is recorded per scene.
+    The copy lands under the scene's content key, so a later post with the
+    same scene gets it as a cache hit; adopt() records that hit as a reuse
+    of the consuming post too, so it is listed and counted against its cap.
+    """
+    def __init__(self):
+        self.enabled = os.environ.get("IMAGE_REUSE", "1") == "1"
+        self.threshold = float(os.environ.get("IMAGE_REUSE_THRESHOLD", "0.8"))
+        self.max_per_post = int(os.environ.get("IMAGE_REUSE_MAX_PER_POST", "2"))
+        self._entries: Optional[List[Dict]] = None
+        self._doc_freq: Counter = Counter()
+        self._lock = threading.Lock()
+        self._reuse_lock = threading.Lock()
+
+    def _load(self):
+        # Called with the lock held; the table is read once per process
+        if self._entries is not None:
+            return
+        self._entries = []
+        for row in db.get_index_images():
+            self._insert(row["image_path"], row["prompt"], row["post_id"])
+
+    def _insert(self, image_path: str, prompt: str, post_id):
+        terms = Counter(tokenize(prompt))
+        for entry in [e for e in self._entries if e["image_path"] == image_path]:
+            self._doc_freq.subtract(entry["terms"].keys())
+            self._entries.remove(entry)
+        self._entries.append({"image_path": image_path, "prompt": prompt, "post_id": post_id, "terms": terms})
+        self._doc_freq.update(terms.keys())
+
+    def _vector(self, terms: Counter) -> Dict[str, float]:
+        total = len(self._entries) + 1
+        vector = {t: count * (math.log(total / (1 + self._doc_freq.get(t, 0))) + 1) for t, count in terms.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {t: v / norm for t, v in vector.items()}
+
+    def similar(self, prompt: str, exclude_post=None, exclude_paths=()) -> Optional[Dict]:
+        """Best indexed image for the prompt as {"image_path", "prompt", "similarity"}, or None."""
+        with self._lock:
+            self._load()
+            query = self._vector(Counter(tokenize(prompt)))
+            best = None
+            for entry in self._entries:
+                if exclude_post is not None and entry["post_id"] == str(exclude_post):
+                    continue
+                if entry["image_path"] in exclude_paths or not os.path.exists(entry["image_path"]):
+                    continue
+                vector = self._vector(entry["terms"])
+                score = sum(weight * vector.get(t, 0.0) for t, weight in query.items())
+                if best is None or score > best["similarity"]:
+                    best = {"image_path": entry["image_path"], "prompt": entry["prompt"], "similarity": round(score, 4)}
+            return best
+
+    def add(self, prompt: str, image_path: str, post_id=None):
+        """Indexes a freshly generated image under its sanitized prompt."""
+        try:
+            db.add_index_image(image_path, prompt, post_id)
+            with self._lock:
+                self._load()
+                self._insert(image_path, prompt, str(post_id) if post_id is not None else None)
+        except Exception as e:
+            print(f"Image index update failed: {e}")
+
+    def reuse(self, prompt: str, output_path: str, post_id, scene_index: Optional[int] = None) -> Optional[Dict]:
+        """
+        Copies the closest earlier image to `output_path` if it passes the
+        threshold and the post has reuse budget left; returns the match or None.
+        """
+        if not self.enabled or post_id is None or self.max_per_post <= 0:
+            return None
+        try:
+            # One decision at a time so concurrent scenes of a post cannot overrun its budget
+            with self._reuse_lock:
+                used = db.get_image_reuse(post_id)
+                match = None
+                if len(used) < self.max_per_post:
+                    match = self.similar(prompt, exclude_post=post_id, exclude_paths={u["source_path"] for u in used})
+                hit = bool(match) and match["similarity"] >= self.threshold
+                metrics.cache_lookup("image_reuse", hit=hit)
+                if not hit:
+                    return None
+                shutil.copyfile(match["image_path"], temp_path(output_path))
+                os.replace(temp_path(output_path), output_path)
+                db.save_image_reuse(post_id, scene_index, output_path, match["image_path"], match["similarity"], prompt, match["prompt"])
+            print(f"--- Reusing scene image {os.path.basename(match['image_path'])} (similarity {match['similarity']:.2f}) ---")
+            return match
+        except Exception as e:
+            print(f"Image reuse lookup failed: {e}")
+            return None
+
+    def adopt(self, image_path: str, post_id, scene_index: Optional[int] = None) -> bool:
+        """
+        Called when a post finds its scene image already on disk. If that file
+        is a copy another post reused (and has not been regenerated since),
+        the reuse is recorded for this post as well. Returns True if recorded.
+        """
+        if post_id is None:
+            return False
+        try:
+            origin = db.find_image_reuse(image_path)
+            if not origin or origin["post_id"] == str(post_id):
+                return False
+            if not os.path.exists(image_path) or os.path.getmtime(image_path) > origin["created_at"]:
+                return False
+            with self._reuse_lock:
+                if any(u["image_path"] == image_path for u in db.get_image_reuse(post_id)):
+                    return False
+                db.save_image_reuse(post_id, scene_index, image_path, origin["source_path"], origin["similarity"], origin["prompt"], origin["source_prompt"])
+            print(f"--- Scene image {os.path.basename(image_path)} is a reused image (from {os.path.basename(origin['source_path'])}) ---")
+            return True
+        except Exception as e:
+            print(f"Image reuse adoption failed: {e}")
+            return False
+
+image_index = ImageReuseIndex()
@@ -0,0 +1,110 @@
+import json
+from typing import Dict, List, Optional
+
+class DraftStreamParser:
+    """
+    Incremental scanner for a streamed draft JSON object. Text is fed in
+    arbitrary chunks (code fences and chatter around the object are skipped);
+    each element of the top-level `array_key` array is returned by `feed` as
+    soon as its closing brace arrives, and top-level string fields are
+    available in `fields` once complete. Only string/escape/nesting state is
+    tracked, so the cost is linear in the response length.
+    """
+    def __init__(self, array_key: str = "visual_scenes"):
+        self.array_key = array_key
+        self.fields: Dict[str, str] = {}
+        self.items: List[Dict] = []
+        self.text = []
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._in_array = False
+        self._item_start: Optional[int] = None
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consumes a chunk and returns the array items it completed."""
+        completed = []
+        self.text.append(chunk)
+        start = len(self._buffer)
+        self._buffer += chunk
+        buffer = self._buffer
+        for i in range(start, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._string_done(buffer[self._string_start:i + 1])
+                continue
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and self._depth == 1:
+                self._pending_key = self._last_string
+                self._last_string = None
+            elif ch == "," and self._depth == 1:
+                self._pending_key = None
+            elif ch in "{[":
+                if self._depth == 1 and ch == "[" and self._pending_key == self.array_key:
+                    self._in_array = True
+                elif self._depth == 2 and ch == "{" and self._in_array:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and ch == "}" and self._item_start is not None:
+                    item = self._load(buffer[self._item_start:i + 1])
+                    self._item_start = None
+                    if item is not None:
+                        self.items.append(item)
+                        completed.append(item)
+                elif self._depth == 1 and ch == "]" and self._in_array:
+                    self._in_array = False
+                elif self._depth == 0:
+                    self._started = False
+        # Keep only what an unfinished item still needs
+        keep_from = self._item_start if self._item_start is not None else (self._string_start if self._in_string else len(buffer))
+        self._buffer = buffer[keep_from:]
+        if self._item_start is not None:
+            self._item_start = 0
+        if self._in_string:
+            self._string_start -= keep_from
+        return completed
+
+    def _string_done(self, raw: str):
+        value = self._load(raw)
+        if self._depth == 1 and self._pending_key is not None and isinstance(value, str):
+            # A string value at the top level completes a field
+            self.fields[self._pending_key] = value
+            self._pending_key = None
+        else:
+            self._last_string = value
+
+    @staticmethod
+    def _load(raw: str):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def result(self) -> dict:
+        """The complete object, parsed from the full text (raises ValueError if invalid)."""
+        text = "".join(self.text)
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise ValueError("no JSON object in streamed response")
+        return json.loads(text[start:end + 1])
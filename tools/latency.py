@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+from typing import Optional, Dict
+
+class LatencyWindow:
+    """
+    Rolling window of recent durations (seconds) with percentile lookups.
+    """
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile, q in [0, 100]. None when the window is empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(0, min(len(samples) - 1, int(round(q / 100.0 * len(samples))) - 1))
+        return samples[rank]
+
+    def summary(self) -> Dict:
+        def _r(value):
+            return round(value, 3) if value is not None else None
+        return {
+            "samples": len(self),
+            "p50": _r(self.percentile(50)),
+            "p95": _r(self.percentile(95)),
+            "p99": _r(self.percentile(99)),
+        }
+
+class StageLatencyTracker:
+    """
+    Named rolling windows (graph nodes, provider chains) for tail-latency reporting.
+    """
+    def __init__(self, size: int = 500):
+        self.size = size
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            if stage not in self._windows:
+                self._windows[stage] = LatencyWindow(size=self.size)
+            window = self._windows[stage]
+        window.add(seconds)
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        with self._lock:
+            window = self._windows.get(stage)
+        return window.percentile(q) if window else None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            windows = dict(self._windows)
+        return {stage: window.summary() for stage, window in sorted(windows.items())}
+
+stage_latency = StageLatencyTracker()
@@ -0,0 +1,120 @@
+import os
+import sys
+import threading
+import resource
+from typing import Dict, List
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_bytes(pid: int) -> int:
+    """Resident set size of one process from /proc (0 if unavailable)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def descendants(pid: int) -> List[int]:
+    """All live descendants of `pid` (render workers, ffmpeg readers and writers)."""
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, frontier = [], [pid]
+    while frontier:
+        kids = children.get(frontier.pop(), [])
+        found.extend(kids)
+        frontier.extend(kids)
+    return found
+
+def command_line(pid: int) -> List[str]:
+    """argv of a process from /proc (empty if unavailable)."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return [arg for arg in f.read().decode("utf-8", "replace").split("\0") if arg]
+    except OSError:
+        return []
+
+def processes_naming(paths: List[str], pid: int = None) -> List[int]:
+    """Descendants of `pid` (default: this process) whose command line names one of `paths`, e.g. a job's ffmpeg readers and writer."""
+    names = {os.path.basename(p) for p in paths if p}
+    if not names:
+        return []
+    return [child for child in descendants(pid or os.getpid()) if any(os.path.basename(arg) in names for arg in command_line(child))]
+
+def process_tree_rss(pid: int = None) -> int:
+    pid = pid or os.getpid()
+    return rss_bytes(pid) + sum(rss_bytes(child) for child in descendants(pid))
+
+class PeakMemorySampler:
+    """
+    Context manager that samples RSS of this process and its descendants in a
+    background thread and keeps the high-water marks. Those are process-wide:
+    concurrent jobs share this process and its children. Given the job's
+    file `paths`, it also tracks the peak of the job's own ffmpeg processes
+    (those naming one of the files). Where /proc is missing it falls back to
+    ru_maxrss (process lifetime peak, not per block).
+    """
+    def __init__(self, interval: float = 0.1, paths: List[str] = None):
+        self.interval = interval
+        self.paths = [p for p in (paths or []) if p]
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self.peak_self_bytes = 0
+        self.peak_job_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._proc = os.path.isdir("/proc")
+
+    def _sample(self):
+        own = rss_bytes(os.getpid())
+        total = own + sum(rss_bytes(child) for child in descendants(os.getpid()))
+        self.peak_self_bytes = max(self.peak_self_bytes, own)
+        self.peak_bytes = max(self.peak_bytes, total)
+        if self.paths:
+            job = sum(rss_bytes(child) for child in processes_naming(self.paths))
+            self.peak_job_bytes = max(self.peak_job_bytes, job)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        if self._proc:
+            self.start_bytes = process_tree_rss()
+            self._sample()
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self._proc:
+            self._sample()
+        else:
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            scale = 1 if sys.platform == "darwin" else 1024
+            self.peak_self_bytes = self.peak_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        return False
+
+    def report(self) -> Dict:
+        report = {
+            "scope": "process_tree",
+            "start_mb": round(self.start_bytes / 1048576, 1),
+            "peak_mb": round(self.peak_bytes / 1048576, 1),
+            "peak_self_mb": round(self.peak_self_bytes / 1048576, 1),
+        }
+        if self.paths:
+            report["peak_job_ffmpeg_mb"] = round(self.peak_job_bytes / 1048576, 1)
+        return report
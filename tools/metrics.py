@@ -0,0 +1,228 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from tools.latency import stage_latency
+
+# Prometheus text exposition (format 0.0.4) without pulling in prometheus_client.
+# Every update is a dict lookup plus a lock, so instrumentation stays cheap on hot paths.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FPS_BUCKETS = (1, 2.5, 5, 10, 24, 48, 96, 192, 384)
+MEMORY_BUCKETS = tuple(mb * 1048576 for mb in (64, 128, 256, 512, 768, 1024, 1536, 2048, 4096, 8192))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self._callbacks: List[Callable[[], Dict[Tuple, float]]] = []
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], Dict[Tuple, float]]):
+        """Registers a callback evaluated at scrape time, returning {label values: value}."""
+        self._callbacks.append(callback)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        for callback in self._callbacks:
+            try:
+                values.update(callback())
+            except Exception as e:
+                print(f"Metrics callback error ({self.name}): {e}")
+        lines = self.header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = self.header()
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Process-wide metric registry rendered at GET /metrics.
+    """
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self.stage_duration = self.histogram("asm_stage_duration_seconds", "Wall time per graph node, pipeline stage and render step.", ("stage",))
+        self.provider_duration = self.histogram("asm_provider_request_duration_seconds", "Provider call latency.", ("chain", "provider"))
+        self.provider_requests = self.counter("asm_provider_requests_total", "Provider calls by outcome.", ("chain", "provider", "outcome"))
+        self.provider_errors = self.counter("asm_provider_errors_total", "Failed provider calls.", ("chain", "provider"))
+        self.db_duration = self.histogram("asm_db_query_duration_seconds", "Database method latency.", ("method",), buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+        self.rate_limit_wait = self.histogram("asm_rate_limit_wait_seconds", "Time spent queued behind provider rate limits.", ("provider",))
+        self.queue_depth = self.gauge("asm_queue_depth", "Items waiting in internal queues.", ("queue",))
+        self.cache_requests = self.counter("asm_cache_requests_total", "Cache and artifact reuse lookups.", ("cache", "result"))
+        self.cache_hit_ratio = self.gauge("asm_cache_hit_ratio", "Hit ratio per cache since process start.", ("cache",))
+        self.render_fps = self.histogram("asm_render_frames_per_second", "Encoded frames per wall-clock second.", ("step",), buckets=FPS_BUCKETS)
+        self.render_peak_memory = self.histogram("asm_render_peak_memory_bytes", "Process-wide peak RSS (this process and all its children) during a render job; concurrent jobs share it.", ("step",), buckets=MEMORY_BUCKETS)
+        self.llm_tokens = self.counter("asm_llm_tokens_total", "LLM tokens spent on scripting, by mode (fused / two_call).", ("mode", "direction"))
+        self.render_frames = self.counter("asm_render_frames_total", "Frames encoded.", ("step",))
+        self.render_slots = self.gauge("asm_render_slots", "Encoder thread slots of the render scheduler (total, in_use, queued jobs).", ("state",))
+        self.render_slot_wait = self.histogram("asm_render_slot_wait_seconds", "Time render jobs spent queued for encoder threads.", ("kind",))
+        self.deadline_runs = self.counter("asm_deadline_runs_total", "Workflows with a deadline, by outcome and whether they were degraded.", ("outcome", "degraded"))
+        self.coalesced_requests = self.counter("asm_coalesced_requests_total", "Workflow requests served by an existing run (in_flight) or idempotency key (idempotent).", ("kind",))
+        self.admission_decisions = self.counter("asm_admission_decisions_total", "Workflow requests admitted or rejected (429) by admission control.", ("decision",))
+        self.speculative_runs = self.counter("asm_speculative_runs_total", "Idle-time speculative pre-generations, by outcome (ready, preempted, failed).", ("outcome",))
+        self.workflows_in_flight = self.gauge("asm_workflows_in_flight", "Workflows currently running.")
+        self.cache_hit_ratio.set_function(self._cache_ratios)
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def _cache_ratios(self) -> Dict[Tuple, float]:
+        totals: Dict[str, List[float]] = {}
+        for (cache, result), value in self.cache_requests.samples().items():
+            hits_total = totals.setdefault(cache, [0.0, 0.0])
+            hits_total[1] += value
+            if result == "hit":
+                hits_total[0] += value
+        return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+    # --- Convenience recorders ---
+
+    def observe_stage(self, stage: str, seconds: float):
+        self.stage_duration.observe(seconds, stage=stage)
+        stage_latency.record(stage, seconds)
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def observe_provider(self, chain: str, provider: str, seconds: float, ok: bool):
+        self.provider_duration.observe(seconds, chain=chain, provider=provider)
+        self.provider_requests.inc(chain=chain, provider=provider, outcome="success" if ok else "error")
+        if not ok:
+            self.provider_errors.inc(chain=chain, provider=provider)
+
+    def cache_lookup(self, cache: str, hit: bool):
+        self.cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+    def observe_render(self, step: str, frames: float, seconds: float):
+        self.render_frames.inc(frames, step=step)
+        if seconds > 0:
+            self.render_fps.observe(frames / seconds, step=step)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
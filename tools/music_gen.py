@@ -3,6 +3,10 @@ import time
 import requests
 from typing import Optional
 from dotenv import load_dotenv
+from tools.rate_limiter import rate_limiter
+from tools.provider_router import provider_router
+from tools.hedging import provider_timeout
+from tools.artifacts import temp_path
 
 load_dotenv()
 
@@ -13,58 +17,77 @@ class MusicGenerator:
         if not os.path.exists(self.local_music_dir):
             os.makedirs(self.local_music_dir, exist_ok=True)
 
-    def generate_background_music(self, prompt: str, output_path: str, duration: int = 60) -> Optional[str]:
+    def generate_background_music(self, prompt: str, output_path: str, duration: int = 60, local_only: bool = False,
+                                  local_path: Optional[str] = None) -> Optional[str]:
         """
         Generates a background music track using ElevenLabs Sound Effects/Music.
         If API fails or credits are exhausted, falls back to a local royalty-free library.
+        The provider router skips ElevenLabs outright while its breaker is open.
+        local_only goes straight to the library (deadline degradation).
+        A library track is written to local_path (default output_path), so a
+        fallback never takes the generated track's place; the result is the
+        path actually written.
         """
-        if not self.api_key:
+        providers = {}
+        if local_only:
+            print("Deadline is close: using local music library.")
+        elif self.api_key:
+            providers["elevenlabs"] = lambda: self._generate_elevenlabs(prompt, output_path, duration)
+        else:
             print("ELEVENLABS_API_KEY for Music Generation not found. Using local fallback.")
-            return self.get_local_music_fallback(output_path)
+        providers["local"] = lambda: self.get_local_music_fallback(local_path or output_path)
 
-        try:
-            print(f"--- Generating Background Music (ElevenLabs): {prompt} ({duration}s) ---")
-            
-            # Note: ElevenLabs has a Sound Effects API that can generate music-like clips. 
-            # For specific "Music API", we use the sound-generation endpoint with a high duration if supported, 
-            # or the dedicated music model if available.
-            url = "https://api.elevenlabs.io/v1/sound-generation"
-            
-            headers = {
-                "xi-api-key": self.api_key,
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "text": f"Background music: {prompt}",
-                "duration_seconds": min(duration, 22), # Sound effects API max is usually lower, but let's try
-                "prompt_influence": 0.3
-            }
-            
-            response = requests.post(url, json=data, headers=headers)
+        for provider in provider_router.order("music", list(providers)):
+            result = provider_router.run("music", provider, providers[provider])
+            if result:
+                return result
+        return None
 
-            # Fallback to local music if credits are low or API fails
-            if response.status_code != 200:
-                print(f"ELEVENLABS_MUSIC_ISSUE ({response.status_code}): Using fallback from local library.")
-                return self.get_local_music_fallback(output_path)
+    def _generate_elevenlabs(self, prompt: str, output_path: str, duration: int) -> Optional[str]:
+        print(f"--- Generating Background Music (ElevenLabs): {prompt} ({duration}s) ---")
+        
+        # Note: ElevenLabs has a Sound Effects API that can generate music-like clips. 
+        # For specific "Music API", we use the sound-generation endpoint with a high duration if supported, 
+        # or the dedicated music model if available.
+        url = "https://api.elevenlabs.io/v1/sound-generation"
+        
+        headers = {
+            "xi-api-key": self.api_key,
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "text": f"Background music: {prompt}",
+            "duration_seconds": min(duration, 22), # Sound effects API max is usually lower, but let's try
+            "prompt_influence": 0.3
+        }
+        
+        with rate_limiter.limit("elevenlabs_sound"):
+            response = requests.post(url, json=data, headers=headers, timeout=provider_timeout("elevenlabs_sound"))
 
-            with open(output_path, "wb") as f:
-                f.write(response.content)
-            
-            print(f"Background music saved to {output_path}")
-            return output_path
+        # Credits low or API failure: the router falls through to the local library
+        if response.status_code != 200:
+            print(f"ELEVENLABS_MUSIC_ISSUE ({response.status_code}): Using fallback from local library.")
+            return None
 
-        except Exception as e:
-            print(f"Music Generation Exception: {e}. Falling back to local.")
-            return self.get_local_music_fallback(output_path)
+        # Content-keyed path: only a complete track may appear under it
+        with open(temp_path(output_path), "wb") as f:
+            f.write(response.content)
+        os.replace(temp_path(output_path), output_path)
+        
+        print(f"Background music saved to {output_path}")
+        return output_path
 
     def get_local_music_fallback(self, output_path: str) -> Optional[str]:
         """
         Picks a random track from the local 'YouTube Audio style' library.
+        A track already picked for this path is kept.
         """
         import shutil
         import random
         
+        if os.path.exists(output_path):
+            return output_path
         if not os.path.exists(self.local_music_dir):
             return None
             
@@ -77,7 +100,8 @@ class MusicGenerator:
         source_path = os.path.join(self.local_music_dir, selected_track)
         
         print(f"--- Practical Fallback: Using {selected_track} from local library ---")
-        shutil.copy(source_path, output_path)
+        shutil.copy(source_path, temp_path(output_path))
+        os.replace(temp_path(output_path), output_path)
         return output_path
 
 music_generator = MusicGenerator()
@@ -0,0 +1,238 @@
+import os
+import sys
+import time
+import random
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar("asm_profile", default=None)
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+class StackSampler:
+    """
+    Wall-clock stack sampler. A daemon thread snapshots every other thread's
+    Python stack at a fixed interval and counts them in collapsed form
+    ("thread;outer;...;inner"), the input format of flamegraph.pl/speedscope.
+    """
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+def profile_call(fn: Callable, *args, interval: float = 0.01, **kwargs) -> Dict:
+    """
+    Runs `fn` under the stack sampler and tracemalloc inside the current
+    process. Used by scene render workers, whose results travel back to the
+    parent's session over the process pool.
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    sampler = StackSampler(interval)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        stacks = sampler.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+    return {
+        "result": result,
+        "stacks": dict(stacks),
+        "peak_bytes": max(0, peak - base),
+        "seconds": time.perf_counter() - started,
+        "pid": os.getpid(),
+    }
+
+class ProfileSession:
+    """Samples, per-stage memory and worker reports collected for one workflow run."""
+    def __init__(self, post_id: str, interval: float, top_allocations: int):
+        self.post_id = str(post_id)
+        self.interval = interval
+        self.top_allocations = top_allocations
+        self.sampler = StackSampler(interval)
+        self.stages: List[Dict] = []
+        self.worker_stacks: Counter = Counter()
+        self.open_stages: List[List[int]] = []
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def fold_peak(self):
+        _, peak = tracemalloc.get_traced_memory()
+        for mark in self.open_stages:
+            mark[0] = max(mark[0], peak)
+
+    def add_stage(self, entry: Dict):
+        with self._lock:
+            self.stages.append(entry)
+
+    def merge_worker(self, stage: str, report: Dict):
+        """Folds a worker process's profile into this session under its own root frame."""
+        prefix = f"worker-{report.get('pid', '?')}"
+        with self._lock:
+            for stack, count in report.get("stacks", {}).items():
+                self.worker_stacks[f"{prefix};{stack}"] += count
+            self.stages.append({
+                "stage": stage,
+                "seconds": round(report.get("seconds", 0.0), 3),
+                "peak_bytes": report.get("peak_bytes", 0),
+                "process": prefix,
+            })
+
+    def collapsed(self) -> str:
+        with self._lock:
+            stacks = self.sampler.stacks + self.worker_stacks
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(stacks.items())) + "\n"
+
+class Profiler:
+    """
+    On-demand workflow profiling. A run is profiled when the request asks for it
+    or with probability PROFILE_SAMPLE_RATE. Profiled runs get a stack sampler over
+    the whole process plus tracemalloc peaks per stage; render workers profile
+    themselves and ship their samples back. Results are stored with the post.
+
+    Samples cover every thread in the process, so concurrent workflows show up
+    in each other's flamegraphs; stage memory peaks are process-wide for the
+    same reason.
+    """
+    def __init__(self):
+        self.sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+        self.interval = float(os.environ.get("PROFILE_INTERVAL_MS", "10")) / 1000.0
+        self.top_allocations = int(os.environ.get("PROFILE_TOP_ALLOCATIONS", "10"))
+        self._tracemalloc_users = 0
+        self._lock = threading.Lock()
+
+    def should_profile(self, requested: bool = False) -> bool:
+        return bool(requested) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def active(self) -> bool:
+        return _current_session.get() is not None
+
+    def _start_tracemalloc(self):
+        with self._lock:
+            if self._tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._tracemalloc_users += 1
+
+    def _stop_tracemalloc(self):
+        with self._lock:
+            self._tracemalloc_users -= 1
+            if self._tracemalloc_users == 0 and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    @contextmanager
+    def session(self, post_id: str, enabled: bool = True):
+        """Profiles everything inside the block and saves it with the post."""
+        if not enabled:
+            yield None
+            return
+        session = ProfileSession(post_id, self.interval, self.top_allocations)
+        self._start_tracemalloc()
+        token = _current_session.set(session)
+        session.sampler.start()
+        started = time.perf_counter()
+        print(f"--- Profiler: recording workflow {post_id} ---")
+        try:
+            yield session
+        finally:
+            session.sampler.stop()
+            _current_session.reset(token)
+            self._stop_tracemalloc()
+            self._persist(session, time.perf_counter() - started)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Records the tracemalloc peak and top new allocations for one stage."""
+        session = _current_session.get()
+        if session is None or not tracemalloc.is_tracing():
+            yield
+            return
+        # Nested stages share one tracemalloc peak; fold it into the open
+        # stages before resetting so the outer stage keeps its high-water mark.
+        session.fold_peak()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        mark = [base]
+        session.open_stages.append(mark)
+        before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            session.fold_peak()
+            session.open_stages.remove(mark)
+            current, _ = tracemalloc.get_traced_memory()
+            peak = mark[0]
+            after = tracemalloc.take_snapshot()
+            top = [
+                {"location": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in after.compare_to(before, "lineno")[:session.top_allocations]
+            ]
+            session.add_stage({
+                "stage": name,
+                "seconds": round(time.perf_counter() - started, 3),
+                "peak_bytes": max(0, peak - base),
+                "retained_bytes": current - base,
+                "process": "main",
+                "top_allocations": top,
+            })
+
+    def merge_worker(self, stage: str, report: Dict):
+        session = _current_session.get()
+        if session is not None:
+            session.merge_worker(stage, report)
+
+    def _persist(self, session: ProfileSession, seconds: float):
+        from database import db
+        try:
+            db.save_profile(session.post_id, {
+                "created_at": session.started_at,
+                "duration": round(seconds, 3),
+                "interval": session.interval,
+                "samples": session.sampler.samples,
+                "stages": session.stages,
+                "collapsed": session.collapsed(),
+            })
+            print(f"--- Profiler: saved profile for {session.post_id} ({session.sampler.samples} samples) ---")
+        except Exception as e:
+            print(f"Profile Persist Error (post {session.post_id}): {e}")
+
+profiler = Profiler()
@@ -0,0 +1,248 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from tools.latency import LatencyWindow
+from tools.metrics import metrics
+from tools.tracing import tracer
+from tools.cancellation import WorkflowCancelled
+from tools.rate_limiter import call_timer
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+class CircuitBreaker:
+    """
+    Opens after N consecutive failures, lets a single probe through once the
+    cooldown has passed (half-open) and closes again on the first success.
+    """
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def available(self) -> bool:
+        """Non-claiming check used when ordering a chain."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return not self.probe_in_flight
+
+    def allow(self) -> bool:
+        """Claims the right to call; in half-open state only one probe gets through."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+class ProviderHealth:
+    """Rolling latency, error rate and breaker for one provider in one chain."""
+    def __init__(self, window: int, failure_threshold: int, cooldown: float):
+        self.latency = LatencyWindow(size=window)
+        self.outcomes = deque(maxlen=window)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+class ProviderRouter:
+    """
+    Orders fallback chains (e.g. TTS: elevenlabs -> openai -> edge) by live
+    provider health. Providers with an open breaker are skipped outright;
+    slow or error-prone ones are demoted behind healthy ones while keeping the
+    configured quality preference within each tier.
+    """
+    def __init__(self):
+        self.window = int(os.environ.get("ROUTER_WINDOW", "50"))
+        self.failure_threshold = int(os.environ.get("ROUTER_BREAKER_FAILURES", "3"))
+        self.cooldown = float(os.environ.get("ROUTER_BREAKER_COOLDOWN", "60"))
+        self.max_error_rate = float(os.environ.get("ROUTER_MAX_ERROR_RATE", "0.5"))
+        self.slow_seconds = float(os.environ.get("ROUTER_SLOW_SECONDS", "60"))
+        self.min_samples = 5
+        self._health: Dict[str, ProviderHealth] = {}
+        self._chains: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, chain: str, provider: str) -> ProviderHealth:
+        key = f"{chain}.{provider}"
+        if key not in self._health:
+            self._health[key] = ProviderHealth(self.window, self.failure_threshold, self.cooldown)
+        return self._health[key]
+
+    def _tier(self, health: ProviderHealth) -> int:
+        if len(health.outcomes) < self.min_samples:
+            return 0
+        p95 = health.latency.percentile(95)
+        if health.error_rate >= self.max_error_rate or (p95 is not None and p95 > self.slow_seconds):
+            return 1
+        return 0
+
+    def latency_percentile(self, chain: str, provider: str, q: float) -> Optional[float]:
+        """Successful-call latency percentile, or None until enough samples exist."""
+        with self._lock:
+            health = self._get(chain, provider)
+        if len(health.latency) < self.min_samples:
+            return None
+        return health.latency.percentile(q)
+
+    def order(self, chain: str, providers: List[str]) -> List[str]:
+        """
+        Returns the providers worth trying, best first. If every breaker is open
+        the last provider in the chain is still returned as a last resort.
+        """
+        with self._lock:
+            self._chains[chain] = list(providers)
+            candidates = []
+            for rank, provider in enumerate(providers):
+                health = self._get(chain, provider)
+                if not health.breaker.available():
+                    print(f"--- Provider Router: skipping {chain}.{provider} (breaker {health.breaker.state}) ---")
+                    continue
+                candidates.append((self._tier(health), rank, provider))
+        if not candidates and providers:
+            return [providers[-1]]
+        return [provider for _, _, provider in sorted(candidates)]
+
+    def record(self, chain: str, provider: str, seconds: float, ok: bool):
+        metrics.observe_provider(chain, provider, seconds, ok)
+        with self._lock:
+            health = self._get(chain, provider)
+            health.outcomes.append(1 if ok else 0)
+            if ok:
+                health.latency.add(seconds)
+                health.breaker.record_success()
+            else:
+                was_open = health.breaker.state == OPEN
+                health.breaker.record_failure()
+                if health.breaker.state == OPEN and not was_open:
+                    print(f"--- Provider Router: breaker OPEN for {chain}.{provider} ({health.breaker.consecutive_failures} failures) ---")
+
+    def release_probe(self, chain: str, provider: str):
+        """Frees a half-open probe slot whose call was cancelled."""
+        with self._lock:
+            health = self._get(chain, provider)
+            if health.breaker.state == HALF_OPEN:
+                health.breaker.probe_in_flight = False
+
+    def _last_resort(self, chain: str, provider: str) -> bool:
+        """True if order() would hand out `provider` as the chain's last resort (call under the lock)."""
+        providers = self._chains.get(chain)
+        return bool(providers) and provider == providers[-1] and not any(
+            self._get(chain, p).breaker.available() for p in providers
+        )
+
+    def _claim(self, chain: str, provider: str) -> bool:
+        """
+        Claims a call through the provider's breaker. The last resort of a
+        chain whose breakers are all open is called anyway: a chain never
+        fails without a single attempt.
+        """
+        with self._lock:
+            breaker = self._get(chain, provider).breaker
+            allowed = breaker.allow()
+            last_resort = not allowed and self._last_resort(chain, provider)
+            state = breaker.state
+        if last_resort:
+            print(f"--- Provider Router: every {chain} breaker is open, calling {provider} as the last resort ---")
+            return True
+        if not allowed:
+            reason = "breaker OPEN" if state == OPEN else "probe already in flight"
+            print(f"--- Provider Router: {chain}.{provider} {reason}, skipping ---")
+        return allowed
+
+    def run(self, chain: str, provider: str, fn: Callable, *args, **kwargs):
+        """Runs a sync provider call; a falsy result or an exception counts as a failure."""
+        if not self._claim(chain, provider):
+            return None
+        with tracer.span(f"provider.{chain}.{provider}") as span, call_timer() as timer:
+            try:
+                result = fn(*args, **kwargs)
+            except WorkflowCancelled:
+                # Not the provider's fault: no failure is recorded
+                self.release_probe(chain, provider)
+                raise
+            except Exception as e:
+                print(f"Provider {chain}.{provider} raised: {e}")
+                result = None
+            # Time queued for a limiter slot is not the provider's latency
+            self.record(chain, provider, timer.active_seconds(), ok=bool(result))
+            if span:
+                span.set_attribute("ok", bool(result))
+        return result
+
+    async def run_async(self, chain: str, provider: str, fn: Callable, *args, **kwargs):
+        """Async counterpart of run()."""
+        if not self._claim(chain, provider):
+            return None
+        with tracer.span(f"provider.{chain}.{provider}") as span, call_timer() as timer:
+            try:
+                result = await fn(*args, **kwargs)
+            except (asyncio.CancelledError, WorkflowCancelled):
+                self.release_probe(chain, provider)
+                raise
+            except Exception as e:
+                print(f"Provider {chain}.{provider} raised: {e}")
+                result = None
+            # Time queued for a limiter slot is not the provider's latency
+            self.record(chain, provider, timer.active_seconds(), ok=bool(result))
+            if span:
+                span.set_attribute("ok", bool(result))
+        return result
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            chains = {name: list(providers) for name, providers in self._chains.items()}
+        result = {}
+        for chain, providers in chains.items():
+            entries = {}
+            with self._lock:
+                for provider in providers:
+                    health = self._get(chain, provider)
+                    entries[provider] = {
+                        "breaker": health.breaker.state,
+                        "available": health.breaker.available(),
+                        "consecutive_failures": health.breaker.consecutive_failures,
+                        "error_rate": round(health.error_rate, 3),
+                        "calls": len(health.outcomes),
+                        "latency": health.latency.summary(),
+                        "tier": self._tier(health),
+                    }
+            effective = [
+                p for p in sorted(providers, key=lambda p: (entries[p]["tier"], providers.index(p)))
+                if entries[p]["available"]
+            ]
+            result[chain] = {
+                "configured_order": providers,
+                "effective_order": effective,
+                "providers": entries,
+            }
+        return result
+
+provider_router = ProviderRouter()
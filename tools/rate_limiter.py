@@ -0,0 +1,338 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Optional
+from tools.metrics import metrics
+from tools.cancellation import WorkflowCancelled, check_cancelled, current_token
+
+# Conservative defaults per provider (0 = unlimited). Override with
+# RATE_LIMIT_<PROVIDER>="rpm:5,tpm:0,concurrency:2", e.g. RATE_LIMIT_OPENAI_IMAGES.
+DEFAULT_BUDGETS = {
+    "openai_images": {"rpm": 5, "tpm": 0, "concurrency": 2},
+    "openai_tts": {"rpm": 50, "tpm": 0, "concurrency": 4},
+    "openai_chat": {"rpm": 500, "tpm": 200000, "concurrency": 8},
+    "gemini": {"rpm": 15, "tpm": 1000000, "concurrency": 4},
+    "elevenlabs_tts": {"rpm": 0, "tpm": 0, "concurrency": 2},
+    "elevenlabs_sound": {"rpm": 0, "tpm": 0, "concurrency": 2},
+}
+
+# How often a sync waiter of a cancellable workflow looks at its cancel token
+CANCEL_POLL_SECONDS = 0.25
+
+def estimate_tokens(text: str, completion_allowance: int = 1500) -> int:
+    """
+    Rough token estimate (~4 chars per token) used to charge the TPM bucket
+    before a chat/LLM call is made.
+    """
+    return len(text or "") // 4 + completion_allowance
+
+class CallTimer:
+    """
+    Clock for one provider attempt that leaves out the time spent queued for
+    a limiter slot. The provider router records latency (and so breaker and
+    tiering decisions) from it, and the hedger only counts time the request
+    has actually been out. It starts when the attempt starts running, not
+    when it was queued on a thread pool.
+    """
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.waited = 0.0
+        self._waiting_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+
+    def queued(self):
+        with self._lock:
+            self._waiting_since = time.monotonic()
+
+    def granted(self):
+        with self._lock:
+            if self._waiting_since is not None:
+                self.waited += time.monotonic() - self._waiting_since
+                self._waiting_since = None
+
+    def active_seconds(self) -> float:
+        """Seconds since start, minus limiter waits (including one in progress)."""
+        now = time.monotonic()
+        with self._lock:
+            if self.started is None:
+                return 0.0
+            waiting = now - self._waiting_since if self._waiting_since is not None else 0.0
+            return max(0.0, now - self.started - self.waited - waiting)
+
+_call_timer: contextvars.ContextVar = contextvars.ContextVar("provider_call_timer", default=None)
+
+@contextmanager
+def call_timer(timer: Optional[CallTimer] = None):
+    """
+    Makes `timer` (or the one already set by the caller, or a new one) the
+    clock the limiters report into for the enclosed provider call.
+    """
+    timer = timer or _call_timer.get() or CallTimer()
+    token = _call_timer.set(timer)
+    timer.start()
+    try:
+        yield timer
+    finally:
+        _call_timer.reset(token)
+
+class ProviderLimiter:
+    """
+    Token-bucket limiter for one provider: requests per minute, tokens per
+    minute and a concurrency cap. Waiters are served strictly in arrival order;
+    sync callers wait on a condition, async ones on an event of their own loop.
+    """
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, concurrency: int = 0):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self._cond = threading.Condition()
+        self._request_bucket = float(rpm)
+        self._token_bucket = float(tpm)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._waiting = deque()
+        self._async_waiters = []
+        self._next_ticket = 0
+        # Wait-time stats
+        self.calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rpm:
+            self._request_bucket = min(float(self.rpm), self._request_bucket + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._token_bucket = min(float(self.tpm), self._token_bucket + elapsed * self.tpm / 60.0)
+
+    def _try_take(self, tokens: int) -> Optional[float]:
+        """
+        Takes capacity if available and returns 0. Otherwise returns the
+        seconds until the buckets refill, or None if blocked on concurrency.
+        """
+        self._refill()
+        if self.concurrency and self._in_flight >= self.concurrency:
+            return None
+        delay = 0.0
+        if self.rpm and self._request_bucket < 1:
+            delay = max(delay, (1 - self._request_bucket) * 60.0 / self.rpm)
+        if self.tpm and self._token_bucket < tokens:
+            delay = max(delay, (tokens - self._token_bucket) * 60.0 / self.tpm)
+        if delay > 0:
+            return delay
+        if self.rpm:
+            self._request_bucket -= 1
+        if self.tpm:
+            self._token_bucket -= tokens
+        self._in_flight += 1
+        return 0.0
+
+    def _notify(self):
+        """Wakes every waiter, sync and async; called with the condition held."""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed; its waiter is gone with it
+                pass
+
+    def _ticket(self) -> int:
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._waiting.append(ticket)
+        return ticket
+
+    def _granted(self, started: float) -> float:
+        waited = time.monotonic() - started
+        with self._cond:
+            self.calls += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        metrics.rate_limit_wait.observe(waited, provider=self.name)
+        if waited > 1.0:
+            print(f"--- Rate Limiter: {self.name} call queued for {waited:.1f}s ---")
+        return waited
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        Blocks until this caller's turn and budget come up. Returns the wait in
+        seconds. A caller whose workflow is cancelled while it waits leaves the
+        queue with WorkflowCancelled, without taking anything.
+        """
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        started = time.monotonic()
+        cancel = current_token()
+        poll = CANCEL_POLL_SECONDS if cancel is not None else None
+        with self._cond:
+            ticket = self._ticket()
+            try:
+                while True:
+                    if cancel is not None:
+                        cancel.check()
+                    if self._waiting[0] == ticket:
+                        delay = self._try_take(tokens)
+                        if delay == 0:
+                            break
+                        self._cond.wait(timeout=min(delay, poll) if poll else delay)
+                    else:
+                        self._cond.wait(timeout=poll)
+            finally:
+                self._waiting.remove(ticket)
+                self._notify()
+        return self._granted(started)
+
+    async def acquire_async(self, tokens: int = 1) -> float:
+        """
+        acquire() for the event loop: the waiter parks on an asyncio event
+        (or sleeps until the buckets refill) instead of holding a thread, and
+        one cancelled while queued leaves without taking anything.
+        """
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        started = time.monotonic()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            ticket = self._ticket()
+            self._async_waiters.append(waiter)
+        try:
+            while True:
+                delay = None
+                with self._cond:
+                    if self._waiting[0] == ticket:
+                        delay = self._try_take(tokens)
+                        if delay == 0:
+                            break
+                    waiter[1].clear()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._async_waiters.remove(waiter)
+                self._waiting.remove(ticket)
+                self._notify()
+        return self._granted(started)
+
+    def release(self):
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._notify()
+
+    def refund(self, tokens: int = 1):
+        """Releases a grant that was never used and gives its budget back."""
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        with self._cond:
+            if self.rpm:
+                self._request_bucket = min(float(self.rpm), self._request_bucket + 1)
+            if self.tpm:
+                self._token_bucket = min(float(self.tpm), self._token_bucket + tokens)
+        self.release()
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            self._refill()
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiting),
+                "calls": self.calls,
+                "wait_seconds_total": round(self.total_wait, 3),
+                "wait_seconds_max": round(self.max_wait, 3),
+                "wait_seconds_avg": round(self.total_wait / self.calls, 3) if self.calls else 0.0,
+            }
+
+class RateLimitRegistry:
+    """
+    Process-wide registry of provider limiters, shared by every workflow in flight.
+    """
+    def __init__(self):
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _budget(self, provider: str) -> Dict:
+        budget = dict(DEFAULT_BUDGETS.get(provider, {"rpm": 0, "tpm": 0, "concurrency": 0}))
+        override = os.environ.get(f"RATE_LIMIT_{provider.upper()}")
+        if override:
+            for part in override.split(","):
+                key, _, value = part.partition(":")
+                if key.strip() in budget and value.strip().isdigit():
+                    budget[key.strip()] = int(value)
+        return budget
+
+    def get(self, provider: str) -> ProviderLimiter:
+        with self._lock:
+            if provider not in self._limiters:
+                self._limiters[provider] = ProviderLimiter(provider, **self._budget(provider))
+            return self._limiters[provider]
+
+    @contextmanager
+    def limit(self, provider: str, tokens: int = 1):
+        """Blocking slot for sync provider calls. A cancelled workflow gets no slot."""
+        check_cancelled()
+        limiter = self.get(provider)
+        timer = _call_timer.get()
+        if timer:
+            timer.queued()
+        try:
+            limiter.acquire(tokens)
+        finally:
+            if timer:
+                timer.granted()
+        try:
+            check_cancelled()
+        except WorkflowCancelled:
+            # Cancelled as the grant came in: the call is never made
+            limiter.refund(tokens)
+            raise
+        try:
+            yield limiter
+        finally:
+            limiter.release()
+
+    @asynccontextmanager
+    async def limit_async(self, provider: str, tokens: int = 1):
+        """Async slot; waiting happens on the event loop without tying up a thread."""
+        check_cancelled()
+        limiter = self.get(provider)
+        timer = _call_timer.get()
+        if timer:
+            timer.queued()
+        try:
+            await limiter.acquire_async(tokens)
+        finally:
+            if timer:
+                timer.granted()
+        try:
+            yield limiter
+        finally:
+            limiter.release()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        for provider in DEFAULT_BUDGETS:
+            self.get(provider)
+        with self._lock:
+            providers = list(self._limiters.items())
+        return {name: limiter.snapshot() for name, limiter in providers}
+
+rate_limiter = RateLimitRegistry()
+metrics.queue_depth.set_function(
+    lambda: {(f"rate_limit.{name}",): stats["queued"] for name, stats in rate_limiter.snapshot().items()}
+)
@@ -0,0 +1,193 @@
+import os
+import time
+import heapq
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List
+from tools.metrics import metrics
+
+# Lower runs first: the last encode of a workflow (its deliverable) beats
+# intermediate scene renders.
+PRIORITIES = {"final": 0, "scene": 1}
+
+class RenderScheduler:
+    """
+    Process-wide budget of encoder threads ("slots", one per core by default)
+    shared by every render in flight: scene encodes on the worker processes,
+    final assembly and single-clip renders. A job asks for up to
+    RENDER_THREADS_PER_JOB slots and is granted what is free (at least one),
+    so ffmpeg's `threads=` never adds up to more than the machine has. When
+    nothing is free the job queues; waiters are served by priority class, then
+    by how close their workflow is to done, then in arrival order. Sync
+    callers wait on a condition, async ones on an event of their own loop, so
+    queued renders never hold executor threads.
+    """
+    def __init__(self, total_slots: int = None, threads_per_job: int = None):
+        self.total_slots = total_slots or int(os.environ.get("RENDER_CPU_SLOTS", "0")) or (os.cpu_count() or 2)
+        self.threads_per_job = min(threads_per_job or int(os.environ.get("RENDER_THREADS_PER_JOB", "4")), self.total_slots)
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiting: List[tuple] = []
+        self._async_waiters: List[tuple] = []
+        self._seq = 0
+        self._running: Dict[int, Dict] = {}
+        # Utilization: slot-seconds handed out since the scheduler started
+        self._started = time.monotonic()
+        self._last_change = self._started
+        self._busy_slot_seconds = 0.0
+        self.jobs: Dict[str, Dict] = {}
+
+    def _account(self):
+        now = time.monotonic()
+        self._busy_slot_seconds += self._in_use * (now - self._last_change)
+        self._last_change = now
+
+    def _notify(self):
+        """Wakes every waiter, sync and async; called with the condition held."""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop already closed; its waiter is gone with it
+                pass
+
+    def _enqueue(self, kind: str, progress: float) -> tuple:
+        self._seq += 1
+        entry = (PRIORITIES.get(kind, 1), -progress, self._seq)
+        heapq.heappush(self._waiting, entry)
+        return entry
+
+    def _dequeue(self, entry: tuple):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        # The next waiter may fit in what is left, or be first in line now
+        self._notify()
+
+    def _ready(self, entry: tuple) -> bool:
+        return self._waiting[0] == entry and self._in_use < self.total_slots
+
+    def _grant(self, entry: tuple, kind: str, label: str, wanted: int, started: float) -> Dict:
+        """Hands out threads to the first waiter; called with the condition held."""
+        granted = min(wanted, self.total_slots - self._in_use)
+        self._account()
+        self._in_use += granted
+        waited = time.monotonic() - started
+        grant = {"id": entry[2], "kind": kind, "label": label, "threads": granted, "waited": waited, "started": time.monotonic()}
+        self._running[entry[2]] = grant
+        stats = self.jobs.setdefault(kind, {"jobs": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "threads_total": 0})
+        stats["jobs"] += 1
+        stats["wait_seconds_total"] += waited
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+        stats["threads_total"] += granted
+        return grant
+
+    def _granted(self, grant: Dict):
+        metrics.render_slot_wait.observe(grant["waited"], kind=grant["kind"])
+        if grant["waited"] > 1.0:
+            print(f"--- Render Scheduler: {grant['kind']} job {grant['label']} queued for {grant['waited']:.1f}s, got {grant['threads']} thread(s) ---")
+
+    def acquire(self, kind: str = "scene", progress: float = 0.0, label: str = "", threads: int = None) -> Dict:
+        """
+        Blocks until the job may start and returns its grant
+        ({"id", "threads", "waited", ...}); pass it back to release().
+        """
+        wanted = max(1, min(threads or self.threads_per_job, self.total_slots))
+        started = time.monotonic()
+        with self._cond:
+            entry = self._enqueue(kind, progress)
+            try:
+                while not self._ready(entry):
+                    self._cond.wait()
+                grant = self._grant(entry, kind, label, wanted, started)
+            finally:
+                self._dequeue(entry)
+        self._granted(grant)
+        return grant
+
+    async def acquire_async(self, kind: str = "scene", progress: float = 0.0, label: str = "", threads: int = None) -> Dict:
+        """
+        acquire() for the event loop. The waiter parks on an asyncio event
+        instead of a thread; if it is cancelled while queued it simply leaves
+        the queue and is never granted anything.
+        """
+        wanted = max(1, min(threads or self.threads_per_job, self.total_slots))
+        started = time.monotonic()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            entry = self._enqueue(kind, progress)
+            self._async_waiters.append(waiter)
+        try:
+            while True:
+                with self._cond:
+                    if self._ready(entry):
+                        grant = self._grant(entry, kind, label, wanted, started)
+                        break
+                    waiter[1].clear()
+                await waiter[1].wait()
+        finally:
+            with self._cond:
+                self._async_waiters.remove(waiter)
+                self._dequeue(entry)
+        self._granted(grant)
+        return grant
+
+    def release(self, grant: Dict):
+        with self._cond:
+            if self._running.pop(grant["id"], None) is None:
+                return
+            self._account()
+            self._in_use -= grant["threads"]
+            self._notify()
+
+    @contextmanager
+    def slot(self, kind: str = "scene", progress: float = 0.0, label: str = "", threads: int = None):
+        """Blocking grant for sync renders; yields the thread count to encode with."""
+        grant = self.acquire(kind, progress, label, threads)
+        try:
+            yield grant["threads"]
+        finally:
+            self.release(grant)
+
+    @asynccontextmanager
+    async def slot_async(self, kind: str = "scene", progress: float = 0.0, label: str = "", threads: int = None):
+        """Async grant; waiting happens on the event loop without tying up a thread."""
+        grant = await self.acquire_async(kind, progress, label, threads)
+        try:
+            yield grant["threads"]
+        finally:
+            self.release(grant)
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            self._account()
+            wall = self._last_change - self._started
+            now = time.monotonic()
+            return {
+                "total_slots": self.total_slots,
+                "threads_per_job": self.threads_per_job,
+                "in_use": self._in_use,
+                "queued": len(self._waiting),
+                "utilization": round(self._busy_slot_seconds / (wall * self.total_slots), 3) if wall > 0 else 0.0,
+                "running": [
+                    {"kind": g["kind"], "label": g["label"], "threads": g["threads"], "seconds": round(now - g["started"], 3)}
+                    for g in self._running.values()
+                ],
+                "by_kind": {
+                    kind: {
+                        "jobs": s["jobs"],
+                        "avg_threads": round(s["threads_total"] / s["jobs"], 2),
+                        "wait_seconds_avg": round(s["wait_seconds_total"] / s["jobs"], 3),
+                        "wait_seconds_max": round(s["wait_seconds_max"], 3),
+                    }
+                    for kind, s in self.jobs.items()
+                },
+            }
+
+def _slot_gauge() -> Dict[tuple, float]:
+    stats = render_scheduler.snapshot()
+    return {("total",): stats["total_slots"], ("in_use",): stats["in_use"], ("queued",): stats["queued"]}
+
+render_scheduler = RenderScheduler()
+metrics.render_slots.set_function(_slot_gauge)
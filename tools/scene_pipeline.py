@@ -0,0 +1,273 @@
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Dict
+from tools.metrics import metrics
+from tools.tracing import tracer
+from tools.profiler import profiler
+from tools.render_scheduler import render_scheduler
+from tools.cancellation import writing
+from tools.artifacts import temp_path
+
+def _render_scene(image_path: str, output_path: str, duration: float, aspect_ratio: str, seed: Optional[int] = None, profile: bool = False, threads: int = 1, preset: str = "medium"):
+    """
+    Worker-process entry point for the Ken Burns encode of a single scene.
+    Imported lazily so the parent process does not pay for it twice.
+    `threads` is the encoder thread grant the parent's render scheduler made.
+    With profile=True the encode runs under the stack sampler and tracemalloc
+    and a report dict (with the path under "result") is returned instead.
+    """
+    from tools.video_gen import video_generator
+    if profile:
+        from tools.profiler import profile_call
+        return profile_call(video_generator.generate_video, image_path, output_path, duration=duration, aspect_ratio=aspect_ratio, seed=seed, threads=threads, preset=preset)
+    return video_generator.generate_video(image_path, output_path, duration=duration, aspect_ratio=aspect_ratio, seed=seed, threads=threads, preset=preset)
+
+class SceneJob:
+    """
+    A single scene to push through the image -> motion pipeline. Paths are
+    content-keyed (see tools/artifacts.py) and only ever appear complete (they
+    are written to a temp path and moved in), so an existing file is a valid cache hit.
+    """
+    def __init__(self, index: int, prompt: str, image_path: str, video_path: str, duration: float = 5.0, aspect_ratio: str = "9:16", seed: Optional[int] = None, post_id: Optional[str] = None,
+                 preset: str = "medium", sanitize: bool = True):
+        self.index = index
+        self.prompt = prompt
+        self.image_path = image_path
+        self.video_path = video_path
+        self.duration = duration
+        self.aspect_ratio = aspect_ratio
+        self.seed = seed
+        self.post_id = post_id
+        self.preset = preset
+        self.sanitize = sanitize
+
+class StageStats:
+    """Busy-time accounting for one pipeline stage."""
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.failures = 0
+        self.busy = 0.0
+
+    def record(self, seconds: float, ok: bool = True):
+        self.items += 1
+        self.busy += seconds
+        if not ok:
+            self.failures += 1
+
+    def report(self, wall: float) -> Dict:
+        capacity = wall * self.workers
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "failures": self.failures,
+            "busy_seconds": round(self.busy, 3),
+            "utilization": round(self.busy / capacity, 3) if capacity > 0 else 0.0,
+        }
+
+class ScenePipeline:
+    """
+    Producer/consumer scene renderer.
+    Image generation (network bound) runs ahead on threads and feeds a bounded
+    asyncio queue; motion rendering (CPU bound) consumes it on worker processes,
+    each encode holding encoder threads granted by the global render scheduler.
+    """
+    def __init__(self, image_workers: int = None, queue_depth: int = None, render_workers: int = None):
+        self.image_workers = image_workers or int(os.environ.get("SCENE_IMAGE_WORKERS", "2"))
+        self.queue_depth = queue_depth or int(os.environ.get("SCENE_QUEUE_DEPTH", "2"))
+        self.render_workers = render_workers or int(os.environ.get("SCENE_RENDER_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+        self._executor = None
+        self._prefetch_pool = None
+        self._prefetching: Dict[str, Future] = {}
+        self._prefetch_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn keeps the workers clean of the server's threads and event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.render_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def prefetch_image(self, prompt: str, image_path: str, post_id: Optional[str] = None, scene_index: Optional[int] = None) -> bool:
+        """
+        Starts a scene's base image before its job exists, e.g. while the
+        draft is still streaming. Image paths are content-keyed, so run()
+        simply awaits the in-flight request (or finds the file) for the same path.
+        Safe to call from any thread; returns False if nothing was started.
+        """
+        if os.path.exists(image_path):
+            return False
+        with self._prefetch_lock:
+            if image_path in self._prefetching:
+                return False
+            if self._prefetch_pool is None:
+                self._prefetch_pool = ThreadPoolExecutor(max_workers=self.image_workers, thread_name_prefix="image-prefetch")
+            future = self._prefetch_pool.submit(tracer.bind(self._prefetch), prompt, image_path, post_id, scene_index)
+            self._prefetching[image_path] = future
+        future.add_done_callback(lambda _: self._forget_prefetch(image_path))
+        return True
+
+    def _prefetch(self, prompt: str, image_path: str, post_id: Optional[str], scene_index: Optional[int]) -> Optional[str]:
+        from tools.video_gen import video_generator
+        print(f"--- Prefetching Scene Image: {os.path.basename(image_path)} ---")
+        t0 = time.perf_counter()
+        with tracer.span("scene.image_prefetch", path=os.path.basename(image_path)):
+            path = video_generator.generate_base_image(prompt, image_path, post_id, scene_index)
+        metrics.observe_stage("pipeline.image", time.perf_counter() - t0)
+        return path
+
+    def needs_image(self, job: SceneJob) -> bool:
+        """True if run() would have to request this job's base image."""
+        with self._prefetch_lock:
+            prefetching = job.image_path in self._prefetching
+        return not (prefetching or os.path.exists(job.video_path) or os.path.exists(job.image_path))
+
+    def _forget_prefetch(self, image_path: str):
+        with self._prefetch_lock:
+            self._prefetching.pop(image_path, None)
+
+    async def run(self, jobs: List[SceneJob], report: Optional[Dict] = None) -> List[Optional[str]]:
+        """
+        Renders all jobs and returns the scene video paths in scene order
+        (None for scenes that failed). Workflows share the pipeline, so the
+        run's utilization report goes into the caller's `report` dict (and
+        onto the current span) rather than onto the instance.
+        """
+        from tools.video_gen import video_generator
+        from tools.image_index import image_index
+
+        results: List[Optional[str]] = [None] * len(jobs)
+        pending = asyncio.Queue()
+        ready = asyncio.Queue(maxsize=self.queue_depth)
+        image_stage = StageStats("image", self.image_workers)
+        render_stage = StageStats("render", self.render_workers)
+        queue_peak = 0
+        render_idle = 0.0
+
+        for job in jobs:
+            # Resumption logic for scene video
+            metrics.cache_lookup("scene_video", hit=os.path.exists(job.video_path))
+            if os.path.exists(job.video_path):
+                print(f"Using existing scene video: {job.video_path}")
+                image_index.adopt(job.image_path, job.post_id, job.index)
+                results[job.index] = job.video_path
+            else:
+                pending.put_nowait(job)
+        rendered = len(jobs) - pending.qsize()
+
+        profile = profiler.active()
+        started = time.perf_counter()
+
+        async def produce():
+            nonlocal queue_peak
+            while True:
+                try:
+                    job = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                with self._prefetch_lock:
+                    prefetch = self._prefetching.get(job.image_path)
+                # Same prompt and style as an earlier render (or a prefetch): only the motion is redone
+                metrics.cache_lookup("scene_image", hit=bool(prefetch) or os.path.exists(job.image_path))
+                image_path = None
+                if prefetch:
+                    print(f"Waiting for prefetched scene image: {job.image_path}")
+                    try:
+                        image_path = await asyncio.wrap_future(prefetch)
+                    except Exception as e:
+                        print(f"Prefetched image failed (scene {job.index+1}): {e}")
+                elif os.path.exists(job.image_path):
+                    print(f"Using existing scene image: {job.image_path}")
+                    image_index.adopt(job.image_path, job.post_id, job.index)
+                    image_path = job.image_path
+                if not image_path:
+                    print(f"--- Generating Scene Image {job.index+1}/{len(jobs)} ---")
+                    t0 = time.perf_counter()
+                    with tracer.span("scene.image", scene=job.index):
+                        image_path = await asyncio.to_thread(video_generator.generate_base_image, job.prompt, job.image_path, job.post_id, job.index, job.sanitize)
+                    elapsed = time.perf_counter() - t0
+                    image_stage.record(elapsed, ok=bool(image_path))
+                    metrics.observe_stage("pipeline.image", elapsed)
+                if image_path:
+                    await ready.put(job)
+                    metrics.queue_depth.inc(queue="scene_images")
+                    queue_peak = max(queue_peak, ready.qsize())
+
+        async def consume():
+            nonlocal render_idle, rendered
+            while True:
+                t_wait = time.perf_counter()
+                job = await ready.get()
+                render_idle += time.perf_counter() - t_wait
+                if job is None:
+                    return
+                metrics.queue_depth.dec(queue="scene_images")
+                print(f"--- Rendering Scene {job.index+1}/{len(jobs)} ---")
+                t0 = time.perf_counter()
+                try:
+                    # Workflows closer to done get encoder threads first
+                    # A cancelled workflow kills this encode and deletes the partial file
+                    async with render_scheduler.slot_async("scene", progress=rendered / len(jobs), label=f"scene {job.index+1}") as threads:
+                        worker = self._get_executor().submit(
+                            _render_scene, job.image_path, job.video_path, job.duration, job.aspect_ratio, job.seed, profile, threads, job.preset
+                        )
+                        with writing(temp_path(job.video_path), future=worker), tracer.span("scene.render", scene=job.index, duration=job.duration, threads=threads):
+                            path = await asyncio.wrap_future(worker)
+                    if profile and isinstance(path, dict):
+                        profiler.merge_worker("render.scene", path)
+                        path = path.get("result")
+                except Exception as e:
+                    print(f"Scene Render Worker Error (scene {job.index+1}): {e}")
+                    path = None
+                elapsed = time.perf_counter() - t0
+                render_stage.record(elapsed, ok=bool(path))
+                metrics.observe_stage("render.scene", elapsed)
+                if path:
+                    metrics.observe_render("scene", job.duration * 24, elapsed)
+                results[job.index] = path
+                rendered += 1
+
+        consumers = [asyncio.create_task(consume()) for _ in range(self.render_workers)]
+        try:
+            await asyncio.gather(*[produce() for _ in range(self.image_workers)])
+            for _ in consumers:
+                await ready.put(None)
+            await asyncio.gather(*consumers)
+        finally:
+            for task in consumers:
+                task.cancel()
+
+        wall = time.perf_counter() - started
+        report = {} if report is None else report
+        report.update({
+            "scenes": len(jobs),
+            "wall_seconds": round(wall, 3),
+            "queue_depth": self.queue_depth,
+            "queue_peak": queue_peak,
+            "render_idle_seconds": round(render_idle, 3),
+            "stages": {
+                "image": image_stage.report(wall),
+                "render": render_stage.report(wall),
+            },
+        })
+        span = tracer.current_span()
+        if span:
+            span.set_attribute("image_utilization", report["stages"]["image"]["utilization"])
+            span.set_attribute("render_utilization", report["stages"]["render"]["utilization"])
+            span.set_attribute("render_idle_seconds", report["render_idle_seconds"])
+        print(
+            f"--- Scene Pipeline: {len(jobs)} scenes in {wall:.1f}s | "
+            f"image util {report['stages']['image']['utilization']:.0%} "
+            f"({self.image_workers} workers) | render util {report['stages']['render']['utilization']:.0%} "
+            f"({self.render_workers} workers) | queue peak {queue_peak}/{self.queue_depth} ---"
+        )
+        return results
+
+scene_pipeline = ScenePipeline()
@@ -0,0 +1,87 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+FPS = 24
+SENTENCE_END = (".", "!", "?", "…")
+
+def words_path(voice_path: str) -> str:
+    """Sidecar file holding the TTS word timings for a voiceover."""
+    return voice_path + ".words.json"
+
+def save_words(voice_path: str, words: List[Dict]):
+    with open(words_path(voice_path), "w") as f:
+        json.dump(words, f)
+
+def measure_voiceover(voice_path: str) -> Optional[Dict]:
+    """
+    Returns {"duration", "words", "source"} for a voiceover file. Duration is
+    probed from the container; words come from the provider's word boundaries
+    (Edge TTS) when a sidecar was written, else None.
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    try:
+        duration = ffmpeg_parse_infos(voice_path).get("duration") or 0.0
+    except Exception as e:
+        print(f"Voiceover probe failed for {voice_path}: {e}")
+        return None
+    words = None
+    try:
+        with open(words_path(voice_path)) as f:
+            words = json.load(f) or None
+    except (OSError, ValueError):
+        pass
+    if words and not duration:
+        duration = words[-1]["end"]
+    if not duration:
+        return None
+    return {"duration": duration, "words": words, "source": "word_boundaries" if words else "probe"}
+
+def _snap_to_frame(t: float) -> float:
+    return round(t * FPS) / FPS
+
+def _word_gaps(words: List[Dict]) -> List[Dict]:
+    """Candidate cut points between words; sentence ends are preferred."""
+    gaps = []
+    for prev, nxt in zip(words, words[1:]):
+        gaps.append({
+            "t": (prev["end"] + nxt["start"]) / 2,
+            "sentence": prev["text"].rstrip("\"')»”").endswith(SENTENCE_END),
+        })
+    return gaps
+
+def plan_scene_durations(weights: List[float], total: float, words: Optional[List[Dict]] = None,
+                         fade: float = 0.5, min_scene: float = 1.0, snap_window: float = 1.5) -> List[float]:
+    """
+    Splits a narration of `total` seconds into clip durations for the scenes.
+
+    The LLM's suggested durations are only used as relative weights. Cut
+    points (where the next scene takes over) are placed proportionally, moved
+    to the nearest sentence end (else word gap) within `snap_window` when word
+    timings are known, and quantised to whole frames. Every clip except the
+    last also covers the `fade` overlap assembly puts under the next one, so
+    the assembled timeline ends exactly when the voice does. Scenes that
+    cannot get `min_scene` seconds are dropped from the end, so the result
+    may be shorter than `weights`.
+    """
+    count = max(1, min(len(weights), int(total // min_scene)))
+    weights = [max(w or 0.0, 0.1) for w in weights[:count]]
+    scale = total / sum(weights)
+
+    gaps = _word_gaps(words) if words else []
+    cuts = []
+    position = 0.0
+    for i, weight in enumerate(weights[:-1]):
+        position += weight * scale
+        target = position
+        lower = (cuts[-1] if cuts else 0.0) + min_scene
+        upper = total - min_scene * (count - 1 - i)
+        nearby = [g for g in gaps if abs(g["t"] - target) <= snap_window and lower <= g["t"] <= upper]
+        sentences = [g for g in nearby if g["sentence"]]
+        if sentences or nearby:
+            target = min(sentences or nearby, key=lambda g: abs(g["t"] - position))["t"]
+        cuts.append(_snap_to_frame(min(max(target, lower), upper)))
+
+    bounds = [0.0] + cuts + [total]
+    durations = [bounds[i + 1] - bounds[i] for i in range(count)]
+    return [round(d + fade, 4) for d in durations[:-1]] + [round(durations[-1], 4)]
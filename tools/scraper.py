@@ -1,11 +1,9 @@
 import asyncio
+import importlib.util
 from typing import List
 from models import TrendData
-try:
-    from playwright.async_api import async_playwright
-    HAS_PLAYWRIGHT = True
-except ImportError:
-    HAS_PLAYWRIGHT = False
+# Only probe for playwright here; it is imported when a scrape actually runs
+HAS_PLAYWRIGHT = importlib.util.find_spec("playwright") is not None
 import random
 
 class PlaywrightScraper:
@@ -38,6 +36,7 @@ class PlaywrightScraper:
             ))
             return trends
 
+        from playwright.async_api import async_playwright
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=self.headless)
             context = await browser.new_context(
@@ -186,4 +185,8 @@ async def fetch_trends(topic: str) -> List[TrendData]:
     Native async wrapper for the discovery engine.
     """
     print(f"--- Fetching Trends Async: {topic} ---")
-    return await scraper.scrape_trends(topic.split(" "))
+    trends = await scraper.scrape_trends(topic.split(" "))
+    # Trending hashtags are candidate topics for idle-time pre-generation
+    from database import db
+    db.record_trend_tags([tag for trend in trends for tag in trend.hashtags])
+    return trends
@@ -0,0 +1,201 @@
+import os
+import time
+import asyncio
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from database import db
+from models import ScriptAnalysis, ContentDraft
+from tools.admission import admission
+from tools.cancellation import cancellation, WorkflowCancelled
+from tools.metrics import metrics
+
+def topic_key(topic: str) -> str:
+    return " ".join((topic or "").lower().split())
+
+class SpeculativeWorker:
+    """
+    Idle-time pre-generation. When no workflow has been queued or running for
+    SPECULATIVE_IDLE_SECONDS, it picks a likely topic (recent post topics,
+    then hashtags recorded by trend scrapes, see GET /api/trends) and computes its analysis, draft and
+    scene images with the default request settings. The images land under
+    their content keys and the draft in speculative_drafts, so a later real
+    run for the topic skips scripting and image generation and only renders.
+
+    Real work always wins: the moment a workflow is admitted, the running
+    speculation is cancelled (provider calls refuse to start, its task is
+    stopped). Spend is estimated from LLM tokens and images requested, and
+    nothing starts once today's spend would pass SPECULATIVE_DAILY_BUDGET_USD.
+    """
+    def __init__(self):
+        self.enabled = os.environ.get("SPECULATIVE_PREGEN", "0") == "1"
+        self.daily_budget = float(os.environ.get("SPECULATIVE_DAILY_BUDGET_USD", "1.0"))
+        self.image_cost = float(os.environ.get("SPECULATIVE_IMAGE_COST_USD", "0.04"))
+        self.token_cost = float(os.environ.get("SPECULATIVE_COST_PER_1K_TOKENS", "0.005"))
+        self.idle_seconds = float(os.environ.get("SPECULATIVE_IDLE_SECONDS", "30"))
+        self.ttl = float(os.environ.get("SPECULATIVE_TTL_HOURS", "24")) * 3600
+        self.max_images = int(os.environ.get("SPECULATIVE_MAX_IMAGES", "6"))
+        self.max_candidates = int(os.environ.get("SPECULATIVE_CANDIDATES", "10"))
+        # The settings a speculative draft is made for; a real run must match them to use it
+        self.tone = os.environ.get("SPECULATIVE_TONE", "Professional")
+        self.duration = int(os.environ.get("SPECULATIVE_DURATION", "60"))
+        self.platform = os.environ.get("SPECULATIVE_PLATFORM", "TikTok")
+        self.poll_seconds = 0.25
+        self._task: Optional[asyncio.Task] = None
+        self._idle_since = time.monotonic()
+        self._attempted: Dict[str, float] = {}
+        self.current: Optional[Dict] = None
+        self.stats = {"started": 0, "ready": 0, "preempted": 0, "failed": 0, "hits": 0, "misses": 0}
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            print(f"--- Speculative pre-generation on (budget ${self.daily_budget:.2f}/day) ---")
+
+    @staticmethod
+    def _today() -> float:
+        return datetime.combine(date.today(), datetime.min.time()).timestamp()
+
+    def spent_today(self) -> float:
+        return db.get_speculative_summary(self._today())["spent_usd"]
+
+    def estimate(self) -> float:
+        """Rough cost of one speculation: two scripting calls and a full set of images."""
+        return 2 * 3000 / 1000 * self.token_cost + self.max_images * self.image_cost
+
+    def candidates(self) -> List[Dict]:
+        found = [{"topic": row["topic"], "source": "recent_post"} for row in db.get_recent_topics(self.max_candidates)]
+        found += [{"topic": row["tag"], "source": "trend_tag"} for row in db.get_trend_tags(time.time() - self.ttl, self.max_candidates)]
+        return found
+
+    def next_candidate(self) -> Optional[Dict]:
+        now = time.time()
+        since = now - self.ttl
+        for candidate in self.candidates():
+            key = topic_key(candidate["topic"])
+            # Each topic at most once per TTL, used or not
+            if now - self._attempted.get(key, 0) < self.ttl:
+                continue
+            if db.has_speculative_draft(key, self.tone, self.duration, self.platform, since):
+                continue
+            return dict(candidate, topic_key=key, tone=self.tone, duration=self.duration, platform=self.platform)
+        return None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                if not admission.idle():
+                    self._idle_since = time.monotonic()
+                    continue
+                if time.monotonic() - self._idle_since < self.idle_seconds:
+                    continue
+                if self.spent_today() + self.estimate() > self.daily_budget:
+                    continue
+                candidate = self.next_candidate()
+                if candidate is None:
+                    continue
+                self._attempted[candidate["topic_key"]] = time.time()
+                await self._run(candidate)
+                self._idle_since = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Speculative worker error: {e}")
+
+    async def _run(self, candidate: Dict):
+        name = f"speculative:{candidate['topic_key']}"
+        self.current = dict(candidate, started_at=time.time())
+        self.stats["started"] += 1
+        job = asyncio.create_task(self._speculate(candidate, name))
+        try:
+            while not job.done():
+                if not admission.idle():
+                    # A real workflow was admitted: give it the providers now
+                    self.stats["preempted"] += 1
+                    metrics.speculative_runs.inc(outcome="preempted")
+                    await cancellation.cancel(name, reason="real work arrived")
+                    break
+                await asyncio.sleep(self.poll_seconds)
+            await asyncio.wait([job])
+        finally:
+            self.current = None
+        if job.cancelled() or isinstance(job.exception(), WorkflowCancelled):
+            return
+        if job.exception():
+            self.stats["failed"] += 1
+            metrics.speculative_runs.inc(outcome="failed")
+            print(f"Speculative pre-generation failed for {candidate['topic']}: {job.exception()}")
+        elif job.result():
+            self.stats["ready"] += 1
+            metrics.speculative_runs.inc(outcome="ready")
+
+    async def _speculate(self, candidate: Dict, name: str) -> bool:
+        from tools.content_gen import generator
+        from tools.video_gen import video_generator
+        from tools.artifacts import artifact_store
+        from tools.gemini_director import styled_prompt
+
+        # Its own cancel token, so a preemption stops exactly this work
+        token = cancellation.start(name)
+        entry = dict(candidate, status="ABORTED", images=0, cost_usd=0.0)
+        usage: Dict = {}
+        topic, settings = candidate["topic"], {"tone": candidate["tone"], "platform": candidate["platform"]}
+        print(f"--- Speculative pre-generation: {topic} ({candidate['source']}) ---")
+        try:
+            if generator.script_mode == "fused":
+                analysis, draft = await asyncio.to_thread(generator.generate_strategy_and_draft, topic, usage, duration=candidate["duration"], **settings)
+            else:
+                analysis = await asyncio.to_thread(generator.analyze_trend, topic, usage, **settings)
+                draft = await asyncio.to_thread(generator.generate_content, topic, analysis, usage, duration=candidate["duration"], **settings)
+            entry.update(analysis=analysis, draft=draft)
+
+            style = draft.visual_style_description
+            spent = self.spent_today()
+            for index, scene in enumerate(draft.visual_scenes[:self.max_images]):
+                # Same content key the animation node computes for this scene
+                artifact = artifact_store.scene(index, scene.prompt, style, scene.duration, scene.aspect_ratio)
+                if os.path.exists(artifact["image_path"]):
+                    continue
+                if spent + self._cost(usage, entry["images"] + 1) > self.daily_budget:
+                    print(f"Speculative budget reached after {entry['images']} image(s) for {topic}")
+                    break
+                # Charged on request: a preempted call still completes (into the cache) and is billed
+                entry["images"] += 1
+                # Under its own post id, so image reuse is capped and recorded like a real run's
+                await asyncio.to_thread(video_generator.generate_base_image, styled_prompt(scene.prompt, style), artifact["image_path"], name, index)
+            entry["status"] = "READY"
+            print(f"--- Speculative draft ready: {topic} ({entry['images']} image(s)) ---")
+            return True
+        finally:
+            entry["cost_usd"] = round(self._cost(usage, entry["images"]), 4)
+            db.save_speculative_draft(entry)
+            cancellation.finish(token)
+
+    def _cost(self, usage: Dict, images: int) -> float:
+        tokens = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        return tokens / 1000 * self.token_cost + images * self.image_cost
+
+    def take(self, topic: str, tone: Optional[str], duration: Optional[int], platform: Optional[str], post_id: str) -> Optional[Tuple[ScriptAnalysis, ContentDraft]]:
+        """Claims a fresh speculative analysis and draft matching the run's settings, if there is one."""
+        entry = db.take_speculative_draft(topic_key(topic), tone, duration, platform, time.time() - self.ttl, post_id)
+        metrics.cache_lookup("speculative_draft", hit=bool(entry))
+        self.stats["hits" if entry else "misses"] += 1
+        if not entry:
+            return None
+        print(f"Using speculative draft for {topic} (made {time.time() - entry['created_at']:.0f}s ago)")
+        return ScriptAnalysis(**entry["analysis"]), ContentDraft(**entry["draft"])
+
+    def snapshot(self) -> Dict:
+        today = db.get_speculative_summary(self._today())
+        return {
+            "enabled": self.enabled,
+            "daily_budget_usd": self.daily_budget,
+            "spent_today_usd": today["spent_usd"],
+            "today": today,
+            "settings": {"tone": self.tone, "duration": self.duration, "platform": self.platform},
+            "running": self.current,
+            "stats": dict(self.stats),
+            "next_candidate": self.next_candidate() if self.enabled else None,
+        }
+
+speculative_worker = SpeculativeWorker()
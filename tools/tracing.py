@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("asm_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("asm_span", default=None)
+
+class Span:
+    """One timed operation inside a post's trace."""
+    def __init__(self, trace_id: str, name: str, parent_id: Optional[str] = None, attributes: Optional[Dict] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.status = "OK"
+        self.attributes = dict(attributes or {})
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status = "ERROR"
+        self.attributes["error"] = message
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+class Trace:
+    """All spans recorded for one workflow run of a post."""
+    def __init__(self, post_id: str):
+        self.post_id = post_id
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+class Tracer:
+    """
+    Span-based tracing keyed by post id. Context travels through contextvars,
+    so asyncio tasks and asyncio.to_thread calls pick up their parent span
+    automatically; plain executors need `bind()`. Finished traces are stored in
+    SQLite and optionally exported as OTLP/JSON to OTEL_EXPORTER_OTLP_ENDPOINT.
+    """
+    def __init__(self):
+        self.service_name = os.environ.get("OTEL_SERVICE_NAME", "asm-agent")
+        self.export_endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+    @contextmanager
+    def start_trace(self, post_id: str, name: str = "workflow", **attributes):
+        trace = Trace(str(post_id))
+        trace_token = _current_trace.set(trace)
+        try:
+            with self.span(name, post_id=str(post_id), **attributes) as root:
+                yield root
+        finally:
+            _current_trace.reset(trace_token)
+            self._persist(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Child span of the current one; a no-op outside a trace."""
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        parent = _current_span.get()
+        span = Span(trace.trace_id, name, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(str(e) or type(e).__name__)
+            raise
+        finally:
+            span.end_time = time.time()
+            _current_span.reset(token)
+            trace.add(span)
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def bind(self, fn):
+        """Carries the caller's trace context into a thread pool submission."""
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def _persist(self, trace: Trace):
+        from database import db
+        spans = [span.to_dict() for span in trace.spans]
+        try:
+            db.save_trace_spans(trace.post_id, spans)
+        except Exception as e:
+            print(f"Trace Persist Error (post {trace.post_id}): {e}")
+        if self.export_endpoint:
+            threading.Thread(target=self.export, args=(spans,), daemon=True).start()
+
+    # --- OpenTelemetry-compatible export ---
+
+    def to_otlp(self, spans: List[Dict]) -> Dict:
+        def _attr(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        otlp_spans = []
+        for span in spans:
+            entry = {
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(int(span["start_time"] * 1e9)),
+                "endTimeUnixNano": str(int((span["end_time"] or span["start_time"]) * 1e9)),
+                "attributes": [_attr(k, v) for k, v in (span.get("attributes") or {}).items()],
+                "status": {"code": 2 if span["status"] == "ERROR" else 1},
+            }
+            if span.get("parent_id"):
+                entry["parentSpanId"] = span["parent_id"]
+            otlp_spans.append(entry)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attr("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "asm_agent.tracing"}, "spans": otlp_spans}],
+            }]
+        }
+
+    def export(self, spans: List[Dict]) -> bool:
+        """POSTs OTLP/JSON to {OTEL_EXPORTER_OTLP_ENDPOINT}/v1/traces."""
+        import requests
+        try:
+            response = requests.post(
+                f"{self.export_endpoint.rstrip('/')}/v1/traces",
+                data=json.dumps(self.to_otlp(spans)),
+                headers={"Content-Type": "application/json"},
+                timeout=5,
+            )
+            return response.status_code < 300
+        except Exception as e:
+            print(f"OTLP Export Error: {e}")
+            return False
+
+tracer = Tracer()
@@ -1,44 +1,87 @@
 import os
 import time
+import threading
+from contextlib import nullcontext
 import requests
 from typing import Optional
-from openai import OpenAI
 from dotenv import load_dotenv
-from moviepy import ImageClip, vfx
+from tools.rate_limiter import rate_limiter
+from tools.hedging import hedger, provider_timeout
+from tools.artifacts import temp_path
+from tools.render_scheduler import render_scheduler
 
 load_dotenv()
 
 class CinematicVideoGenerator:
     def __init__(self):
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
-        self.openai_client = OpenAI(api_key=self.openai_api_key) if self.openai_api_key else None
+        # openai and moviepy are imported on first use so importing this module stays cheap
+        self.openai_client = None
+        self._ready = False
+        self._init_lock = threading.Lock()
 
-    def generate_base_image(self, prompt: str, output_path: str, retry_count: int = 0) -> Optional[str]:
+    def warm_up(self):
         """
-        Generates a high-quality base image using DALL-E 3 (via OpenAI).
-        Includes a Gemini-powered prompt sanitizer to avoid safety violations.
+        Builds the OpenAI client once.
         """
-        if not self.openai_client:
-            print("OPENAI_API_KEY not found.")
-            return None
+        if self._ready:
+            return
+        with self._init_lock:
+            if not self._ready:
+                if self.openai_api_key:
+                    from openai import OpenAI
+                    self.openai_client = OpenAI(api_key=self.openai_api_key)
+                self._ready = True
 
+    def generate_base_image(self, prompt: str, output_path: str, post_id: Optional[str] = None, scene_index: Optional[int] = None, sanitize: bool = True) -> Optional[str]:
+        """
+        Generates a high-quality base image using DALL-E 3 (via OpenAI),
+        falling back to Gemini Imagen. The provider router skips a provider
+        whose circuit breaker is open instead of paying its failure latency,
+        and a slow DALL-E call is hedged with Imagen.
+        Includes a Gemini-powered prompt sanitizer to avoid safety violations.
+        When the post is known, a close enough image from an earlier post is
+        reused from the local index instead (see tools/image_index.py).
+        sanitize=False skips the Gemini rewrite (deadline degradation).
+        """
+        self.warm_up()
         # Sanitize prompt using Gemini if available
         from tools.gemini_director import gemini_director
-        clean_prompt = gemini_director.sanitize_visual_prompt(prompt) if retry_count == 0 else prompt
+        from tools.image_index import image_index
+        clean_prompt = gemini_director.sanitize_visual_prompt(prompt) if sanitize else prompt
 
+        if image_index.reuse(clean_prompt, output_path, post_id, scene_index):
+            return output_path
+
+        providers = {}
+        if self.openai_client:
+            providers["dalle"] = lambda path: self._generate_dalle_image(clean_prompt, path)
+        else:
+            print("OPENAI_API_KEY not found.")
+        if os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY"):
+            providers["imagen"] = lambda path: self.generate_gemini_image(clean_prompt, path)
+
+        result = hedger.run_chain_sync("image", providers, output_path)
+        if result:
+            image_index.add(clean_prompt, result, post_id)
+        return result
+
+    def _generate_dalle_image(self, clean_prompt: str, output_path: str, retry_count: int = 0) -> Optional[str]:
         try:
             print(f"--- Generating Base Image (DALL-E 3) [Attempt {retry_count+1}]: {clean_prompt[:50]}... ---")
-            response = self.openai_client.images.generate(
-                model="dall-e-3",
-                prompt=f"Cinematic wide shot, photorealistic, 8k: {clean_prompt}",
-                size="1024x1024",
-                quality="hd",
-                n=1,
-            )
+            with rate_limiter.limit("openai_images"):
+                response = self.openai_client.images.generate(
+                    model="dall-e-3",
+                    prompt=f"Cinematic wide shot, photorealistic, 8k: {clean_prompt}",
+                    size="1024x1024",
+                    quality="hd",
+                    n=1,
+                    timeout=provider_timeout("openai_images"),
+                )
             image_url = response.data[0].url
             
             # Download and save the image
-            img_data = requests.get(image_url).content
+            img_data = requests.get(image_url, timeout=provider_timeout("image_download")).content
             with open(output_path, 'wb') as handler:
                 handler.write(img_data)
             
@@ -50,11 +93,10 @@ class CinematicVideoGenerator:
                 # Immediate fallback: Remove potentially sensitive verbs
                 import re
                 safe_prompt = re.sub(r'(blinded|blood|gory|dead|kill|exploding|explosion|violent|destruction|crumbling)', 'dramatic', clean_prompt, flags=re.IGNORECASE)
-                return self.generate_base_image(safe_prompt, output_path, retry_count=1)
+                return self._generate_dalle_image(safe_prompt, output_path, retry_count=1)
             
-            print(f"Error generating base image: {e}")
-            print("--- DALL-E failed. Attempting Gemini Imagen Fallback... ---")
-            return self.generate_gemini_image(clean_prompt, output_path)
+            print(f"Error generating base image (DALL-E): {e}")
+            return None
 
     def generate_gemini_image(self, prompt: str, output_path: str) -> Optional[str]:
         """
@@ -72,7 +114,8 @@ class CinematicVideoGenerator:
             genai.configure(api_key=api_key)
             # Try Imagen 3 Fast
             model = genai.GenerativeModel("imagen-3.0-generate-001")
-            result = model.generate_content(prompt)
+            with rate_limiter.limit("gemini"):
+                result = model.generate_content(prompt, request_options={"timeout": provider_timeout("gemini")})
             # Note: The result handling for Imagen in genai might vary depending on version
             # If it's the newer API that returns bytes
             if hasattr(result, 'images') and result.images:
@@ -83,23 +126,28 @@ class CinematicVideoGenerator:
             print(f"Gemini Imagen Fallback failed: {e}")
             return None
 
-    def generate_video(self, image_path: str, output_path: str, duration: float = 6.0, aspect_ratio: str = "16:9") -> Optional[str]:
+    def generate_video(self, image_path: str, output_path: str, duration: float = 6.0, aspect_ratio: str = "16:9", seed: Optional[int] = None, threads: Optional[int] = None, preset: str = "medium") -> Optional[str]:
         """
         Primary entry point for video generation. 
         Uses the Advanced Cinematic Clip engine (Ken Burns 2.0).
+        Zoom and pan are drawn from `seed`, so the same inputs render the same clip.
+        `threads` is the encoder thread grant from the caller's render
+        scheduler (worker processes); without it a slot is taken here.
         """
         import random
+        from moviepy import ImageClip, vfx
         try:
             print(f"--- Creating Cinematic Video (Ken Burns 2.0): {image_path} ---")
             clip = ImageClip(image_path).with_duration(duration)
             
             # Randomized motion parameters
             zoom_start = 1.0
-            zoom_end = random.choice([1.1, 1.15, 1.2]) # Randomized zoom depth
+            rng = random.Random(seed)
+            zoom_end = rng.choice([1.1, 1.15, 1.2]) # Randomized zoom depth
             
             # Randomized pan directions
-            pan_x = random.choice(["left", "right", "center"])
-            pan_y = random.choice(["up", "down", "center"])
+            pan_x = rng.choice(["left", "right", "center"])
+            pan_y = rng.choice(["up", "down", "center"])
             
             w, h = clip.size
             if aspect_ratio == "9:16":
@@ -132,18 +180,25 @@ class CinematicVideoGenerator:
                 elif pan_x == "right": x_center = curr_w - (1920 / 2)
                 final_clip = clip_animated.cropped(x_center=x_center, y_center=1080/2, width=1920, height=1080)
             
-            final_clip.write_videofile(
-                output_path, 
-                fps=24, 
-                codec="libx264", 
-                preset="medium", 
-                threads=4,
-                ffmpeg_params=["-pix_fmt", "yuv420p", "-r", "24"]
-            )
+            grant = render_scheduler.slot("scene", label=os.path.basename(output_path)) if threads is None else nullcontext(threads)
+            # Encoded next to the keyed path and moved in whole, so a killed encode is never a cache hit
+            partial = temp_path(output_path)
+            with grant as encoder_threads:
+                final_clip.write_videofile(
+                    partial, 
+                    fps=24, 
+                    codec="libx264", 
+                    preset=preset, 
+                    threads=encoder_threads,
+                    ffmpeg_params=["-pix_fmt", "yuv420p", "-r", "24"]
+                )
+            os.replace(partial, output_path)
             return output_path
 
         except Exception as e:
             print(f"Cinematic Animation Error: {e}")
+            if os.path.exists(temp_path(output_path)):
+                os.remove(temp_path(output_path))
             return None
 
 video_generator = CinematicVideoGenerator()
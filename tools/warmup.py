@@ -0,0 +1,60 @@
+import time
+import threading
+import importlib
+from typing import Callable, Dict, List, Tuple
+
+def _import(*modules: str) -> Callable:
+    return lambda: [importlib.import_module(module) for module in modules]
+
+def _warm(module: str, singleton: str) -> Callable:
+    return lambda: getattr(importlib.import_module(module), singleton).warm_up()
+
+# Ordered so each step's time is its own cost, not a re-import of an earlier one
+STEPS: List[Tuple[str, Callable]] = [
+    ("agents", _import("agents")),
+    ("content_generator", _warm("tools.content_gen", "generator")),
+    ("gemini_director", _warm("tools.gemini_director", "gemini_director")),
+    ("audio_generator", _warm("tools.audio_gen", "audio_generator")),
+    ("edge_tts", _import("edge_tts")),
+    ("video_generator", _warm("tools.video_gen", "video_generator")),
+    ("moviepy", _import("moviepy", "moviepy.video.fx", "moviepy.audio.fx")),
+]
+
+class WarmUp:
+    """
+    Pays the deferred import and client construction costs on demand, so a
+    serverless cold start only has to import what /api/health needs and the
+    first workflow does not absorb the rest.
+    """
+    def __init__(self):
+        self.warm = False
+        self.seconds = None
+        self.steps: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def run(self) -> Dict:
+        """Runs every step once; later calls return the recorded timings."""
+        with self._lock:
+            if self.warm:
+                return self.snapshot()
+            started = time.perf_counter()
+            for name, step in STEPS:
+                t0 = time.perf_counter()
+                try:
+                    step()
+                    self.steps[name] = {"ok": True, "seconds": round(time.perf_counter() - t0, 3)}
+                except Exception as e:
+                    print(f"Warm-up step {name} failed: {e}")
+                    self.steps[name] = {"ok": False, "seconds": round(time.perf_counter() - t0, 3), "error": str(e)}
+            self.seconds = round(time.perf_counter() - started, 3)
+            self.warm = True
+            print(f"--- Warm-up finished in {self.seconds:.2f}s ---")
+            return self.snapshot()
+
+    def start_background(self):
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def snapshot(self) -> Dict:
+        return {"warm": self.warm, "seconds": self.seconds, "steps": dict(self.steps)}
+
+warmup = WarmUp()